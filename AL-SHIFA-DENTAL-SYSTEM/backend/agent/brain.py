@@ -1,22 +1,78 @@
 
+import asyncio
 import json
 import os
-from openai import OpenAI
+import time
+from typing import AsyncIterator, List, Optional
 from sqlalchemy.orm import Session
-from agent.tools import AgentTools
 import config
+from agent.history import HistoryManager, count_tokens
+from agent.router import intent_router
+from agent.tools import AgentTools
+from database import SessionLocal
+from llm import async_client as client
+
+MODEL = "llama-3.1-8b-instant"
+
+# Data domains each tool reads/writes; replies are cache-tagged with these
+# so a commit to any of them (see cache.py) drops the stale answer.
+TOOL_DOMAINS = {
+    "get_todays_appointments": {"appointments", "patients"},
+    "get_schedule_analysis": {"appointments"},
+    "block_schedule_slot": {"appointments"},
+    "update_schedule_config": {"appointments"},
+    "check_inventory_stock": {"inventory", "appointments", "treatments"},
+    "manage_inventory": {"inventory"},
+    "get_financial_analysis": {"invoices", "appointments", "treatments"},
+    "get_revenue_comparison": {"invoices", "appointments"},
+    "get_weekly_clinical_stats": {"appointments", "treatments"},
+    "list_treatments": {"treatments"},
+    "create_treatment": {"treatments"},
+    "manage_treatments": {"treatments", "inventory"},
+    "manage_patients": {"patients"},
+}
 
-# Initialize Groq Client (using OpenAI SDK)
-client = OpenAI(
-    base_url="https://api.groq.com/openai/v1",
-    api_key=config.GROQ_API_KEY
-)
+# Tool name (as exposed to the model) -> AgentTools method
+TOOL_METHODS = {
+    "get_todays_appointments": "get_todays_appointments",
+    "check_inventory_stock": "check_inventory_stock",
+    "get_financial_analysis": "get_financial_analysis",
+    "list_treatments": "list_treatments",
+    "create_treatment": "create_treatment",
+    "consult_clinical_knowledge": "consult_knowledge_base",
+    "get_schedule_analysis": "get_schedule_analysis",
+    "block_schedule_slot": "block_schedule_slot",
+    "get_weekly_clinical_stats": "get_weekly_clinical_stats",
+    "get_revenue_comparison": "get_revenue_comparison",
+    "manage_inventory": "manage_inventory",
+    "manage_patients": "manage_patients",
+    "manage_treatments": "manage_treatments",
+    "update_schedule_config": "update_schedule_config",
+}
+
+# Safe to run side by side, each on its own pooled session.
+# Anything else may write and runs alone on the request session.
+READ_ONLY_TOOLS = {
+    "get_todays_appointments",
+    "check_inventory_stock",
+    "get_financial_analysis",
+    "list_treatments",
+    "consult_clinical_knowledge",
+    "get_schedule_analysis",
+    "get_weekly_clinical_stats",
+    "get_revenue_comparison",
+}
 
 class ClinicAgent:
     def __init__(self, doctor_id: int, history: list = None):
         self.doc_id = doctor_id
         # We don't store DB in self anymore, we get it per request
         self.tool_engine = None 
+        self.touched_domains = set()
+        # For the response cache: which tools ran, and whether anything failed
+        self.tools_run = set()
+        self.failed = False
+        self.history = HistoryManager()
         
         self.system_prompt = """
             You are the AI Clinical Manager for Al-Shifa Dental Clinic. 
@@ -72,10 +128,9 @@ class ClinicAgent:
             - "Protocol for extraction?" -> consult_clinical_knowledge(query="extraction protocol")
         """
         
+        self.messages = [{"role": "system", "content": self.system_prompt}]
         if history:
-             self.messages = history
-        else:
-             self.messages = [{"role": "system", "content": self.system_prompt}]
+             self.messages += [m for m in history if m.get("role") != "system"]
              
         # Tools Schema
         self.tools_schema = [
@@ -296,115 +351,216 @@ class ClinicAgent:
         
 
 
-    def process(self, query: str, db: Session) -> str:
+    def _bind_tools(self, db: Session):
         # Initialize tools with current DB session
         self.tool_engine = AgentTools(db, self.doc_id)
         
         # Tool Implementations Map (Need to bind to new tool_engine instance)
-        self.tools_map = {
-            "get_todays_appointments": self.tool_engine.get_todays_appointments,
-            "check_inventory_stock": self.tool_engine.check_inventory_stock,
-            "get_financial_analysis": self.tool_engine.get_financial_analysis,
-            "list_treatments": self.tool_engine.list_treatments,
-            "create_treatment": self.tool_engine.create_treatment,
-            "consult_clinical_knowledge": self.tool_engine.consult_knowledge_base,
-            "get_schedule_analysis": self.tool_engine.get_schedule_analysis,
-            "block_schedule_slot": self.tool_engine.block_schedule_slot,
-            "get_weekly_clinical_stats": self.tool_engine.get_weekly_clinical_stats,
-            "get_revenue_comparison": self.tool_engine.get_revenue_comparison,
-            # New Tools
-            "manage_inventory": self.tool_engine.manage_inventory,
-            "manage_patients": self.tool_engine.manage_patients,
-            "manage_treatments": self.tool_engine.manage_treatments,
-            "update_schedule_config": self.tool_engine.update_schedule_config,
-        }
+        self.tools_map = {name: getattr(self.tool_engine, method) for name, method in TOOL_METHODS.items()}
+
+    def _run_tool(self, func_name: str, args: dict, engine: AgentTools = None) -> str:
+        """Run one tool (sync; called from a worker thread) and log how long it took."""
+        started = time.perf_counter()
+        try:
+            result = getattr(engine or self.tool_engine, TOOL_METHODS[func_name])(**args)
+        except Exception as e:
+            self.failed = True
+            result = f"Error executing tool: {str(e)}"
+        print(f"DEBUG: Tool {func_name} took {(time.perf_counter() - started) * 1000:.1f} ms")
+        return str(result)
+
+    def _run_read_tool(self, func_name: str, args: dict) -> str:
+        db = SessionLocal()
+        try:
+            return self._run_tool(func_name, args, self.tool_engine.for_session(db))
+        finally:
+            db.close()
+
+    async def _execute_tools(self, calls: List[tuple]) -> List[str]:
+        """
+        Run [(func_name, args), ...] and return results in the same order.
+        Consecutive read-only tools run concurrently on their own sessions;
+        a write tool waits for them, then runs alone on the request session.
+        """
+        results = [None] * len(calls)
+        batch = []
 
+        async def run_batch():
+            if len(batch) == 1:
+                i = batch[0]
+                results[i] = await asyncio.to_thread(self._run_tool, *calls[i])
+            else:
+                outputs = await asyncio.gather(*(asyncio.to_thread(self._run_read_tool, *calls[i]) for i in batch))
+                for i, output in zip(batch, outputs):
+                    results[i] = output
+            batch.clear()
+
+        for i, (func_name, args) in enumerate(calls):
+            if func_name in READ_ONLY_TOOLS:
+                batch.append(i)
+                continue
+            if batch: await run_batch()
+            results[i] = await asyncio.to_thread(self._run_tool, func_name, args)
+        if batch: await run_batch()
+        return results
+
+    def _prompt_messages(self) -> list:
+        """Compact self.messages to the token budget and log what gets sent."""
+        self.messages = self.history.compact(self.messages)
+        print(f"DEBUG: Prompt ~{count_tokens(self.messages)} tokens ({len(self.messages)} messages)")
+        return self.messages
+
+    async def _fallback_without_tools(self) -> str:
+        fallback_response = await client.chat.completions.create(
+            model=MODEL,
+            messages=self._prompt_messages()
+            # Intentionally omitting tools to force text response
+        )
+        fallback_text = fallback_response.choices[0].message.content
+        self.messages.append({"role": "assistant", "content": fallback_text})
+        return fallback_text
+
+    async def _prepare(self, query: str, db: Session) -> Optional[str]:
+        """
+        Tool-selection round: first LLM call + tool execution.
+        Returns the answer if no resolution call is needed, else None
+        (self.messages then ends with the tool results).
+        """
+        self._bind_tools(db)
         self.messages.append({"role": "user", "content": query})
+
+        # Simple read intents: answer locally, no LLM round-trips
+        intent = intent_router.route(query) if config.AGENT_ROUTER_ENABLED else None
+        if intent:
+            answer = await asyncio.to_thread(intent_router.answer, intent, self.tool_engine)
+            self.tools_run.add(intent_router.tool_for(intent))
+            self.touched_domains.update(TOOL_DOMAINS.get(intent_router.tool_for(intent), ()))
+            self.messages.append({"role": "assistant", "content": answer})
+            return answer
+
+        # First API Call
+        response = await client.chat.completions.create(
+            model=MODEL, 
+            messages=self._prompt_messages(),
+            tools=self.tools_schema,
+            tool_choice="auto"
+        )
         
-        try:
-            # First API Call
-            response = client.chat.completions.create(
-                model="llama-3.1-8b-instant", 
-                messages=self.messages,
-                tools=self.tools_schema,
-                tool_choice="auto"
-            )
-            
-            message = response.choices[0].message
-            
-            # Check for finish_reason indicating tool use issues
-            if response.choices[0].finish_reason == "tool_use_failed":
-                print(f"DEBUG: Groq tool_use_failed. Retrying without tools...")
-                # Retry without tools
-                fallback_response = client.chat.completions.create(
-                    model="llama-3.1-8b-instant",
-                    messages=self.messages
-                )
-                fallback_text = fallback_response.choices[0].message.content
-                self.messages.append({"role": "assistant", "content": fallback_text})
-                return fallback_text
-            
-            # Append initial response
-            self.messages.append(message)
+        message = response.choices[0].message
+        
+        # Check for finish_reason indicating tool use issues
+        if response.choices[0].finish_reason == "tool_use_failed":
+            print(f"DEBUG: Groq tool_use_failed. Retrying without tools...")
+            self.failed = True
+            return await self._fallback_without_tools()
+        
+        # Append initial response
+        self.messages.append(message)
+
+        if not message.tool_calls:
+            return message.content
 
-            if message.tool_calls:
-                print(f"DEBUG: Agent requested {len(message.tool_calls)} tools.")
+        print(f"DEBUG: Agent requested {len(message.tool_calls)} tools.")
+        
+        calls, call_ids = [], []
+        for tool_call in message.tool_calls:
+            func_name = tool_call.function.name
+            try:
+                args = json.loads(tool_call.function.arguments)
+            except json.JSONDecodeError as e:
+                print(f"DEBUG: Failed to parse tool arguments: {e}")
+                self.failed = True
+                continue
+            if func_name not in TOOL_METHODS:
+                print(f"DEBUG: Tool {func_name} not found.")
+                self.failed = True
+                continue
                 
-                for tool_call in message.tool_calls:
-                    func_name = tool_call.function.name
-                    try:
-                        args = json.loads(tool_call.function.arguments)
-                    except json.JSONDecodeError as e:
-                        print(f"DEBUG: Failed to parse tool arguments: {e}")
-                        continue
-                        
-                    print(f"DEBUG: Executing {func_name} with {args}")
-                    
-                    if func_name in self.tools_map:
-                        try:
-                            result = self.tools_map[func_name](**args)
-                        except Exception as e:
-                            result = f"Error executing tool: {str(e)}"
-                        
-                        self.messages.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "content": str(result)
-                        })
-                    else:
-                        print(f"DEBUG: Tool {func_name} not found.")
+            print(f"DEBUG: Executing {func_name} with {args}")
+            self.tools_run.add(func_name)
+            self.touched_domains.update(TOOL_DOMAINS.get(func_name, ()))
+            calls.append((func_name, args))
+            call_ids.append(tool_call.id)
 
-                # Second API Call (Resolution)
-                final_response = client.chat.completions.create(
-                    model="llama-3.1-8b-instant",
-                    messages=self.messages
-                )
-                final_text = final_response.choices[0].message.content
-                self.messages.append({"role": "assistant", "content": final_text})
-                return final_text
-            
-            return message.content
+        started = time.perf_counter()
+        results = await self._execute_tools(calls)
+        if calls:
+            print(f"DEBUG: {len(calls)} tools finished in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        for call_id, result in zip(call_ids, results):
+            self.messages.append({
+                "role": "tool",
+                "tool_call_id": call_id,
+                "content": result
+            })
+        return None
+
+    async def _handle_error(self, e: Exception) -> str:
+        print(f"DEBUG: Groq Error Details: {type(e).__name__}: {e}")
+        self.failed = True
+        
+        # FALLBACK: If tool use failed (API Exception), retry without tools
+        if "tool_use_failed" in str(e):
+            print("DEBUG: Catching tool_use_failed exception. Retrying without tools...")
+            try:
+                return await self._fallback_without_tools()
+            except Exception as fallback_error:
+                print(f"DEBUG: Fallback failed too: {fallback_error}")
+                return "⚠️ I encountered an issue processing that with my tools. Please try again or ask a simpler question."
+
+        return f"❌ AI Error: {str(e)}"
+
+    @property
+    def cacheable(self) -> bool:
+        """
+        Safe to serve the last reply from the response cache: nothing failed,
+        only read-only tools ran (a cached write confirmation would skip the
+        write), and it is tagged so a later write can invalidate it.
+        """
+        return not self.failed and self.tools_run <= READ_ONLY_TOOLS and bool(self.touched_domains)
+
+    async def process(self, query: str, db: Session) -> str:
+        try:
+            answer = await self._prepare(query, db)
+            if answer is not None:
+                return answer
+
+            # Second API Call (Resolution)
+            final_response = await client.chat.completions.create(
+                model=MODEL,
+                messages=self._prompt_messages()
+            )
+            final_text = final_response.choices[0].message.content
+            self.messages.append({"role": "assistant", "content": final_text})
+            return final_text
             
         except Exception as e:
-            print(f"DEBUG: Groq Error Details: {type(e).__name__}: {e}")
-            error_str = str(e)
-            
-            # FALLBACK: If tool use failed (API Exception), retry without tools
-            if "tool_use_failed" in error_str:
-                print("DEBUG: Catching tool_use_failed exception. Retrying without tools...")
-                try:
-                    # Remove the last user message to avoid duplication if we were to re-append, 
-                    # but here we just re-send the same history.
-                    fallback_response = client.chat.completions.create(
-                        model="llama-3.1-8b-instant",
-                        messages=self.messages
-                        # Intentionally omitting tools to force text response
-                    )
-                    fallback_text = fallback_response.choices[0].message.content
-                    self.messages.append({"role": "assistant", "content": fallback_text})
-                    return fallback_text
-                except Exception as fallback_error:
-                    print(f"DEBUG: Fallback failed too: {fallback_error}")
-                    return "⚠️ I encountered an issue processing that with my tools. Please try again or ask a simpler question."
+            return await self._handle_error(e)
 
-            return f"❌ AI Error: {str(e)}"
+    async def stream(self, query: str, db: Session) -> AsyncIterator[str]:
+        """
+        Same flow as process(), but yields the resolution answer token by token.
+        The tool-selection round is not streamed (its output is tool calls).
+        """
+        try:
+            answer = await self._prepare(query, db)
+            if answer is not None:
+                yield answer
+                return
+
+            stream = await client.chat.completions.create(
+                model=MODEL,
+                messages=self._prompt_messages(),
+                stream=True
+            )
+            parts = []
+            async for chunk in stream:
+                if not chunk.choices: continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            self.messages.append({"role": "assistant", "content": "".join(parts)})
+
+        except Exception as e:
+            yield await self._handle_error(e)
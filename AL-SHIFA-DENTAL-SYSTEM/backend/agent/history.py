@@ -0,0 +1,93 @@
+"""
+Token-budgeted conversation history for the agents.
+
+Keeps the system prompt plus the last N user exchanges, shrinks tool
+outputs (hard for older turns, softer for the current one) and drops the
+oldest exchanges until the prompt fits the budget. Exchanges are dropped
+whole so assistant tool_calls never lose their matching tool messages.
+"""
+
+from typing import List
+
+import config
+from agent.session_store import serialize_messages
+
+# Rough chat-template cost per message (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English/JSON on Llama-family tokenizers
+    return (len(text) + 3) // 4 if text else 0
+
+
+def message_tokens(message: dict) -> int:
+    tokens = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.get("content") or "")
+    for call in message.get("tool_calls") or ():
+        tokens += estimate_tokens(call["function"]["name"]) + estimate_tokens(call["function"]["arguments"])
+    return tokens
+
+
+def count_tokens(messages: List[dict]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    if not text or len(text) <= max_chars: return text
+    return f"{text[:max_chars]}… [truncated {len(text) - max_chars} chars]"
+
+
+class HistoryManager:
+    def __init__(self, token_budget: int = config.AGENT_HISTORY_TOKEN_BUDGET,
+                 keep_exchanges: int = config.AGENT_HISTORY_KEEP_EXCHANGES,
+                 tool_output_chars: int = config.AGENT_TOOL_OUTPUT_MAX_CHARS,
+                 old_tool_output_chars: int = config.AGENT_OLD_TOOL_OUTPUT_MAX_CHARS):
+        self.token_budget = token_budget
+        self.keep_exchanges = max(1, keep_exchanges)
+        self.tool_output_chars = tool_output_chars
+        self.old_tool_output_chars = old_tool_output_chars
+
+    @staticmethod
+    def _split_exchanges(messages: List[dict]) -> List[List[dict]]:
+        """Group messages into exchanges, each starting at a user message."""
+        exchanges = []
+        for message in messages:
+            if message["role"] == "user" or not exchanges:
+                exchanges.append([])
+            exchanges[-1].append(message)
+        # A leading fragment without its user turn (old trimming) can't be replayed safely
+        if exchanges and exchanges[0][0]["role"] != "user":
+            exchanges.pop(0)
+        return exchanges
+
+    @staticmethod
+    def _shrink_tools(exchange: List[dict], max_chars: int) -> List[dict]:
+        return [
+            dict(m, content=truncate_text(m.get("content") or "", max_chars)) if m["role"] == "tool" else m
+            for m in exchange
+        ]
+
+    def compact(self, messages: list) -> List[dict]:
+        """Return a budget-fitting copy of `messages` (system prompt first)."""
+        # Brains keep their system prompt as a plain dict at index 0
+        system = [m for m in messages[:1] if isinstance(m, dict) and m.get("role") == "system"]
+        exchanges = self._split_exchanges(serialize_messages(messages[len(system):]))
+        exchanges = exchanges[-self.keep_exchanges:]
+        if not exchanges:
+            return system
+
+        *older, current = exchanges
+        older = [self._shrink_tools(e, self.old_tool_output_chars) for e in older]
+        current = self._shrink_tools(current, self.tool_output_chars)
+
+        fixed = count_tokens(system)
+        while older and fixed + sum(count_tokens(e) for e in older) + count_tokens(current) > self.token_budget:
+            older.pop(0)
+
+        # Current turn alone is still too big: keep halving its tool outputs
+        limit = self.tool_output_chars
+        while fixed + count_tokens(current) > self.token_budget and limit > 200:
+            limit //= 2
+            current = self._shrink_tools(current, limit)
+
+        return system + [m for e in older for m in e] + current
@@ -1,22 +1,27 @@
 
+import asyncio
 import json
 import os
 import re
-from openai import OpenAI
+from typing import AsyncIterator, Optional
 from sqlalchemy.orm import Session
+from agent.history import HistoryManager, count_tokens
+from agent.tool_parser import ToolCallGrammar
 from agent.tools import PatientAgentTools
 from models import User, Doctor, Appointment
-import config
+from llm import async_client as client
 from datetime import datetime
 
-# Initialize Groq Client (using OpenAI SDK)
-client = OpenAI(
-    base_url="https://api.groq.com/openai/v1",
-    api_key=config.GROQ_API_KEY
-)
+MODEL = "llama-3.1-8b-instant"
+
+# [Action] buttons the model appends to its reply
+_ACTION_RE = re.compile(r'\[(.*?)\]')
 
 class PatientBrain:
-    def __init__(self, db: Session, patient_id: int):
+    # Built once from the tool schema on first instantiation
+    _tool_grammar: Optional[ToolCallGrammar] = None
+
+    def __init__(self, db: Session, patient_id: int, history: list = None):
         self.db = db
         self.patient_id = patient_id
         
@@ -31,6 +36,7 @@ class PatientBrain:
             "cancel_appointment": self.tool_engine.cancel_appointment,
             "book_appointment": self.tool_engine.book_appointment,
             "check_availability": self.tool_engine.check_availability,
+            "search_availability": self.tool_engine.search_availability,
             "reschedule_appointment": self.tool_engine.reschedule_appointment,
             "book_followup": self.tool_engine.book_followup,
         }
@@ -63,17 +69,36 @@ class PatientBrain:
                 "type": "function",
                 "function": {
                     "name": "check_availability",
-                    "description": "Get available time slots for a doctor on a specific date.",
+                    "description": "Get available time slots for a doctor on a specific date, or for several days starting from it.",
                     "parameters": {
                         "type": "object", 
                         "properties": {
                             "doctor_id": {"type": "string"},
-                            "date": {"type": "string", "description": "YYYY-MM-DD"}
+                            "date": {"type": "string", "description": "YYYY-MM-DD"},
+                            "days": {"type": "integer", "description": "Number of days to check starting from date (default 1, max 14)."}
                         }, 
                         "required": ["doctor_id", "date"]
                     }
                 }
             },
+            {
+                "type": "function",
+                "function": {
+                    "name": "search_availability",
+                    "description": "Find the earliest free slots for a treatment across ALL doctors in a date range (e.g. 'anyone free this week for a cleaning?').",
+                    "parameters": {
+                        "type": "object",
+                        "properties": {
+                            "treatment": {"type": "string", "description": "Treatment name, e.g. 'Cleaning'."},
+                            "start_date": {"type": "string", "description": "YYYY-MM-DD (defaults to today)."},
+                            "end_date": {"type": "string", "description": "YYYY-MM-DD (defaults to 6 days after start_date)."},
+                            "hospital_id": {"type": "string", "description": "Optional hospital ID to search within."},
+                            "limit": {"type": "integer", "description": "How many slots to return (default 5)."}
+                        },
+                        "required": ["treatment"]
+                    }
+                }
+            },
             {
                 "type": "function",
                 "function": {
@@ -174,166 +199,185 @@ class PatientBrain:
             Use tools for every query involved with data.
         """
         
+        # Restored history keeps its turns but gets today's system prompt (date changes)
         self.messages = [{"role": "system", "content": self.system_prompt}]
+        if history:
+            self.messages += [m for m in history if m.get("role") != "system"]
+        self.history = HistoryManager()
+        if PatientBrain._tool_grammar is None:
+            PatientBrain._tool_grammar = ToolCallGrammar(t["function"]["name"] for t in self.tools_schema)
 
-    def process(self, query: str) -> dict:
-        self.messages.append({"role": "user", "content": query})
-        
-        # Keep context lean
-        if len(self.messages) > 11: 
-            self.messages = [self.messages[0]] + self.messages[-10:]
-            
+    def _parse_text_tool_calls(self, content: str) -> list:
+        # Model wrote <function=name>{args}</function> style tags instead of native tool_calls
+        result = self._tool_grammar.parse(content)
+        for name, reason in result.rejected:
+            print(f"DEBUG: Ignoring text tool call {name}: {reason}")
+        for call in result.calls:
+            print(f"DEBUG: Parsed text tool call: {call.function.name} with {call.function.arguments}")
+        return result.calls
+
+    def _execute_tool_call(self, func_name: str, raw_args: str):
+        """Resolve fuzzy doctor/appointment references, then run the tool (sync, DB-bound)."""
         try:
-            # 1. First Call (Intent detection)
-            response = client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=self.messages,
-                tools=self.tools_schema,
-                tool_choice="auto"
-            )
+            args = json.loads(raw_args)
             
-            message = response.choices[0].message
-            content = message.content or ""
-            tool_calls = message.tool_calls or []
-
-            # FALLBACK: If model outputs text-based function tags instead of native tool_calls
-            if not tool_calls:
-                # Robust Regex to catch malformed tags like:
-                # <function=name>args</function>
-                # name>args</function>
-                # <function="name">args</function>
-                print("DEBUG: Checking for text-based function tags...")
-                pattern = r'(?:<function=)?([\w_]+)(?:>|=")(.*?)(?:</function>|")?'
-                matches = re.finditer(pattern, content, re.DOTALL)
+            # --- DOCTOR RESOLUTION ---
+            if "doctor_id" in args:
+                val = str(args["doctor_id"])
+                doctor = None
                 
-                for i, match in enumerate(matches):
-                    name = match.group(1).strip()
-                    args_str = match.group(2).strip()
+                # Try direct ID lookup first if numeric
+                if val.isdigit():
+                    doctor = self.db.query(Doctor).filter(Doctor.id == int(val)).first()
+                
+                # If not found, try name/email search
+                if not doctor:
+                    if "@" in val:
+                        user = self.db.query(User).filter(User.email.ilike(val)).first()
+                        if user: doctor = self.db.query(Doctor).filter(Doctor.user_id == user.id).first()
+                    else:
+                        doctor = self.db.query(Doctor).join(Doctor.user).filter(
+                            Doctor.user.has(User.full_name.ilike(f"%{val}%"))
+                        ).first()
                     
-                    # Cleanup args string (remove trailing ) or }) if needed)
-                    if args_str.endswith(")") and not args_str.endswith("})"):
-                        args_str = args_str[:-1]
-                        
-                    # Retrieve existing tools to validate name
-                    valid_tools = [t["function"]["name"] for t in self.tools_schema]
-                    if name not in valid_tools: continue
+                    # Fallback: search for digit in name
+                    if not doctor and val.isdigit():
+                        doctor = self.db.query(Doctor).join(Doctor.user).filter(
+                            Doctor.user.has(User.full_name.ilike(f"%{val}%"))
+                        ).first()
 
-                    try:
-                        # Try parsing args
-                        # If empty, use {}
-                        if not args_str: args_str = "{}"
-                        args = json.loads(args_str)
-                        
-                        # Create a mock tool call object
-                        from types import SimpleNamespace
-                        mock_call = SimpleNamespace(
-                            id=f"text_call_{i}_{datetime.now().timestamp()}",
-                            function=SimpleNamespace(name=name, arguments=json.dumps(args))
-                        )
-                        tool_calls.append(mock_call)
-                        print(f"DEBUG: Parsed text tool call: {name} with {args}")
-                    except Exception as e:
-                         print(f"DEBUG: Failed to parse args for {name}: {e}")
-                         continue
+                    if doctor:
+                        args["doctor_id"] = doctor.id
+                        print(f"DEBUG: Resolved '{val}' to ID {doctor.id}")
+            
+            # --- APPOINTMENT RESOLUTION ---
+            if "appointment_id" in args:
+                val = str(args["appointment_id"]).lower()
+                if val in ["current", "latest", "next", "upcoming"]:
+                    next_appt = self.db.query(Appointment).filter(
+                        Appointment.patient_id == self.patient_id,
+                        Appointment.start_time > datetime.now(),
+                        Appointment.status != 'cancelled'
+                    ).order_by(Appointment.start_time.asc()).first()
+                    if next_appt: args["appointment_id"] = next_appt.id
+                elif val.isdigit():
+                    args["appointment_id"] = int(val)
 
-            if tool_calls:
-                print(f"DEBUG: Agent requested {len(tool_calls)} tools.")
-                if message.role: # Only append if it's a real assistant message
-                    self.messages.append(message)
-                else:
-                    self.messages.append({"role": "assistant", "content": content, "tool_calls": tool_calls})
+            # Execution
+            print(f"DEBUG: Executing {func_name} with {args}")
+            if func_name in self.tools_map:
+                return self.tools_map[func_name](**args)
+            return f"Error: Tool {func_name} not found."
+                
+        except Exception as e:
+            return f"Error: {str(e)}"
 
-                for tool_call in tool_calls:
-                    func_name = tool_call.function.name
-                    try:
-                        args = json.loads(tool_call.function.arguments)
-                        
-                        # --- DOCTOR RESOLUTION ---
-                        if "doctor_id" in args:
-                            val = str(args["doctor_id"])
-                            doctor = None
-                            
-                            # Try direct ID lookup first if numeric
-                            if val.isdigit():
-                                doctor = self.db.query(Doctor).filter(Doctor.id == int(val)).first()
-                            
-                            # If not found, try name/email search
-                            if not doctor:
-                                if "@" in val:
-                                    user = self.db.query(User).filter(User.email.ilike(val)).first()
-                                    if user: doctor = self.db.query(Doctor).filter(Doctor.user_id == user.id).first()
-                                else:
-                                    doctor = self.db.query(Doctor).join(Doctor.user).filter(
-                                        Doctor.user.has(User.full_name.ilike(f"%{val}%"))
-                                    ).first()
-                                
-                                # Fallback: search for digit in name
-                                if not doctor and val.isdigit():
-                                    doctor = self.db.query(Doctor).join(Doctor.user).filter(
-                                        Doctor.user.has(User.full_name.ilike(f"%{val}%"))
-                                    ).first()
+    def _prompt_messages(self) -> list:
+        """Compact self.messages to the token budget and log what gets sent."""
+        self.messages = self.history.compact(self.messages)
+        print(f"DEBUG: Prompt ~{count_tokens(self.messages)} tokens ({len(self.messages)} messages)")
+        return self.messages
 
-                                if doctor:
-                                    args["doctor_id"] = doctor.id
-                                    print(f"DEBUG: Resolved '{val}' to ID {doctor.id}")
-                        
-                        # --- APPOINTMENT RESOLUTION ---
-                        if "appointment_id" in args:
-                            val = str(args["appointment_id"]).lower()
-                            if val in ["current", "latest", "next", "upcoming"]:
-                                next_appt = self.db.query(Appointment).filter(
-                                    Appointment.patient_id == self.patient_id,
-                                    Appointment.start_time > datetime.now(),
-                                    Appointment.status != 'cancelled'
-                                ).order_by(Appointment.start_time.asc()).first()
-                                if next_appt: args["appointment_id"] = next_appt.id
-                            elif val.isdigit():
-                                args["appointment_id"] = int(val)
+    async def _prepare(self, query: str) -> Optional[str]:
+        """
+        Intent-detection round: first LLM call + tool execution.
+        Returns the raw answer if no tools were called, else None
+        (self.messages then ends with the tool results).
+        """
+        self.messages.append({"role": "user", "content": query})
+            
+        # 1. First Call (Intent detection)
+        response = await client.chat.completions.create(
+            model=MODEL,
+            messages=self._prompt_messages(),
+            tools=self.tools_schema,
+            tool_choice="auto"
+        )
+        
+        message = response.choices[0].message
+        content = message.content or ""
+        tool_calls = message.tool_calls or []
 
-                        # Execution
-                        print(f"DEBUG: Executing {func_name} with {args}")
-                        if func_name in self.tools_map:
-                            result = self.tools_map[func_name](**args)
-                        else:
-                            result = f"Error: Tool {func_name} not found."
-                            
-                    except Exception as e:
-                        result = f"Error: {str(e)}"
-                    
-                    self.messages.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": str(result)
-                    })
+        # FALLBACK: If model outputs text-based function tags instead of native tool_calls
+        if not tool_calls:
+            tool_calls = self._parse_text_tool_calls(content)
 
-                # 2. Second Call (Resolution)
-                final_response = client.chat.completions.create(
-                    model="llama-3.1-8b-instant",
-                    messages=self.messages
-                )
-                final_text = final_response.choices[0].message.content
-                self.messages.append({"role": "assistant", "content": final_text})
-                
-                # Cleanup: Ensure no raw tags reach the user
-                # Remove <function...>...</function> blocks completely
-                final_text = re.sub(r'<function=.*?>.*?</function>', '', final_text, flags=re.DOTALL)
-                # Remove malformed tags like name>args</function>
-                final_text = re.sub(r'[\w_]+>.*?<\/function>', '', final_text, flags=re.DOTALL)
-                # Remove just the opening tags if leftovers
-                final_text = re.sub(r'<function=.*?>', '', final_text)
+        if not tool_calls:
+            return content
 
-                actions = re.findall(r'\[(.*?)\]', final_text)
-                clean_text = re.sub(r'\[.*?\]', '', final_text).strip()
-                return {"response": clean_text, "actions": actions}
-            
-            # No tools called
-            final_text = content
-            # Cleanup here too just in case
-            final_text = re.sub(r'<function=.*?>.*?</function>', '', final_text, flags=re.DOTALL) 
-            actions = re.findall(r'\[(.*?)\]', final_text)
-            clean_text = re.sub(r'\[.*?\]', '', final_text).strip()
-            return {"response": clean_text, "actions": actions}
+        print(f"DEBUG: Agent requested {len(tool_calls)} tools.")
+        if message.role: # Only append if it's a real assistant message
+            self.messages.append(message)
+        else:
+            self.messages.append({"role": "assistant", "content": content, "tool_calls": tool_calls})
+
+        for tool_call in tool_calls:
+            # Tools hit the DB synchronously; keep them off the event loop
+            result = await asyncio.to_thread(self._execute_tool_call, tool_call.function.name, tool_call.function.arguments)
+            self.messages.append({
+                "role": "tool",
+                "tool_call_id": tool_call.id,
+                "content": str(result)
+            })
+        return None
+
+    def _finalize(self, final_text: str) -> dict:
+        # Cleanup: Ensure no raw tags reach the user
+        final_text = self._tool_grammar.strip(final_text or "")
+        actions = _ACTION_RE.findall(final_text)
+        clean_text = _ACTION_RE.sub('', final_text).strip()
+        return {"response": clean_text, "actions": actions}
+
+    async def process(self, query: str) -> dict:
+        try:
+            answer = await self._prepare(query)
+            if answer is not None:
+                return self._finalize(answer)
+
+            # 2. Second Call (Resolution)
+            final_response = await client.chat.completions.create(
+                model=MODEL,
+                messages=self._prompt_messages()
+            )
+            final_text = final_response.choices[0].message.content
+            self.messages.append({"role": "assistant", "content": final_text})
+            return self._finalize(final_text)
             
         except Exception as e:
             print(f"DEBUG: Agent Error: {e}")
             return {"response": f"Error: {str(e)}", "actions": []}
+
+    async def stream(self, query: str) -> AsyncIterator[dict]:
+        """
+        Yields {"token": ...} events while the resolution answer streams, then
+        one {"done": True, "response": ..., "actions": [...]} with the cleaned text.
+        """
+        try:
+            answer = await self._prepare(query)
+            if answer is None:
+                stream = await client.chat.completions.create(
+                    model=MODEL,
+                    messages=self._prompt_messages(),
+                    stream=True
+                )
+                # Tag fragments are held back so they never reach the client
+                tags = self._tool_grammar.parser()
+                parts = []
+                async for chunk in stream:
+                    if not chunk.choices: continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        visible = tags.feed(delta)
+                        if visible: yield {"token": visible}
+                visible = tags.close()
+                if visible: yield {"token": visible}
+                answer = "".join(parts)
+                self.messages.append({"role": "assistant", "content": answer})
+            else:
+                yield {"token": self._tool_grammar.strip(answer)}
+            yield {"done": True, **self._finalize(answer)}
+
+        except Exception as e:
+            print(f"DEBUG: Agent Error: {e}")
+            yield {"done": True, "response": f"Error: {str(e)}", "actions": []}
@@ -0,0 +1,188 @@
+"""
+Deterministic fast path in front of ClinicAgent.
+
+A nearest-phrase classifier (rapidfuzz, as in utils/smart_parser.py) over
+the existing intent vocabularies (agent/intents.py, brain_data.py). When a
+query confidently matches one of the simple read intents below, the tool is
+called directly and rendered with ResponseGenerator, skipping both LLM
+round-trips. Anything with a date, a write verb, a specific patient/item or
+an analysis keyword falls through to the LLM.
+"""
+
+import re
+from datetime import datetime
+from threading import Lock
+from typing import Optional, Tuple
+
+from rapidfuzz import fuzz, process
+
+import config
+from agent.analyst import AnalystEngine
+from agent.intents import INTENT_TRAINING_DATA
+from brain_data import TRAINING_DATA, VOCAB
+from infra.metrics import request_metrics
+from services.response_generator import ResponseGenerator
+
+
+# --- FAST-PATH HANDLERS (tools = AgentTools bound to the request session) ---
+def _todays_schedule(tools) -> str:
+    date_str = datetime.now().strftime("%Y-%m-%d")
+    appts = tools.appt_service.get_schedule(date_str)
+    return ResponseGenerator.as_text(ResponseGenerator.success_schedule(appts, date_str))
+
+
+def _low_stock(tools) -> str:
+    return ResponseGenerator.low_stock(tools.get_stock_alerts())["text"]
+
+
+def _price_list(tools) -> str:
+    return ResponseGenerator.list_treatments(tools.treat_service.get_all_treatments())["text"]
+
+
+# intent -> training labels it absorbs, extra phrases, words the query must
+# contain (optional), equivalent LLM tool (for cache tags) and handler
+FAST_PATHS = {
+    "todays_schedule": {
+        "labels": {"schedule_view", "APPT_TODAY"},
+        "phrases": [
+            "who is coming today", "todays appointments", "show todays schedule",
+            "my schedule today", "appointments for today", "who do i have today",
+        ],
+        "require": None,
+        "tool": "get_todays_appointments",
+        "handler": _todays_schedule,
+    },
+    "low_stock": {
+        "labels": {"inventory_check"},
+        "phrases": [
+            "what is running low", "which items are low", "low stock items", "low stock alerts",
+            "anything low in stock", "what should i order", "show low stock",
+        ],
+        "require": re.compile(r"\b(low|order|short|running out)"),
+        "tool": "check_inventory_stock",
+        "handler": _low_stock,
+    },
+    "price_list": {
+        "labels": {"treatment_list", "TREAT_LIST"},
+        "phrases": [
+            "show price list", "treatment price list", "what are my prices", "list all treatments",
+            "show all treatments with prices", "what treatments do i offer",
+        ],
+        "require": None,
+        "tool": "list_treatments",
+        "handler": _price_list,
+    },
+}
+
+# Generic words that may appear in fast-path queries despite being in VOCAB
+_GENERIC = {"stock", "inventory", "item", "treatment", "procedure", "patient", "history"}
+
+# Queries mentioning any of these need arguments or a write -> leave to the LLM
+_BLOCK_WORDS = sorted({
+    *VOCAB["CMD_UPDATE"], *VOCAB["CMD_ADD"], *VOCAB["CMD_CANCEL"], *VOCAB["TIME_FUTURE"],
+    *VOCAB["ENT_PATIENT"], *VOCAB["ENT_STOCK"], *VOCAB["ENT_TREAT"],
+    "yesterday", "last", "month", "year", "monday", "tuesday", "wednesday",
+    "thursday", "friday", "saturday", "sunday",
+} - _GENERIC)
+# Negated/excluding queries ("who is not coming today") mean the opposite of the
+# nearest phrase. Matched as whole words (after normalize) so "now" still routes.
+_NEGATIONS = sorted({
+    "not", "no", "never", "without", "except", "nobody", "none", "nothing",
+    "isnt", "arent", "dont", "doesnt", "wont", "cant", "hasnt", "havent", "didnt",
+})
+_BLOCK_RE = re.compile(
+    r"\b(" + "|".join(re.escape(w) for w in _BLOCK_WORDS) + r")"
+    r"|\b(" + "|".join(_NEGATIONS) + r")\b|\d"
+)
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"[^a-z0-9 ]+", "", text.lower().replace("'", "")).strip()
+
+
+class IntentRouter:
+    def __init__(self, min_score: float = config.AGENT_ROUTER_MIN_SCORE,
+                 min_margin: float = config.AGENT_ROUTER_MIN_MARGIN):
+        self.min_score = min_score
+        self.min_margin = min_margin
+        # is_analysis_query only looks at the text
+        self._analyst = AnalystEngine(db=None, doctor_id=None)
+
+        label_to_intent = {label: intent for intent, spec in FAST_PATHS.items() for label in spec["labels"]}
+        samples = [(p, label) for label, phrases in INTENT_TRAINING_DATA.items() for p in phrases]
+        samples += TRAINING_DATA
+        samples += [(p, intent) for intent, spec in FAST_PATHS.items() for p in spec["phrases"]]
+
+        # Built once: every labelled phrase; fast-path ones only if the router would accept them
+        self.phrases, self.labels = [], []
+        for phrase, label in samples:
+            phrase = normalize(phrase)
+            intent = label_to_intent.get(label, label)
+            if intent in FAST_PATHS and not self._eligible(phrase, intent):
+                intent = label
+            self.phrases.append(phrase)
+            self.labels.append(intent)
+
+        self.lock = Lock()
+        self.lookups = 0
+        self.hits = {intent: 0 for intent in FAST_PATHS}
+
+    def _eligible(self, text: str, intent: str) -> bool:
+        require = FAST_PATHS[intent]["require"]
+        return not _BLOCK_RE.search(text) and (require is None or bool(require.search(text)))
+
+    def classify(self, query: str) -> Tuple[Optional[str], float]:
+        """(fast-path intent or None, best score)."""
+        text = normalize(query)
+        if not text or _BLOCK_RE.search(text) or self._analyst.is_analysis_query(text):
+            return None, 0.0
+
+        best = {}
+        for _, score, index in process.extract(text, self.phrases, scorer=fuzz.WRatio, limit=15):
+            label = self.labels[index]
+            best[label] = max(best.get(label, 0.0), score)
+        if not best:
+            return None, 0.0
+
+        ranked = sorted(best.items(), key=lambda kv: kv[1], reverse=True)
+        intent, score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+        if (intent in FAST_PATHS and self._eligible(text, intent)
+                and score >= self.min_score and score - runner_up >= self.min_margin):
+            return intent, score
+        return None, score
+
+    def route(self, query: str) -> Optional[str]:
+        """Fast-path intent for `query`, counting the lookup for hit-rate stats."""
+        intent, score = self.classify(query)
+        with self.lock:
+            self.lookups += 1
+            if intent:
+                self.hits[intent] += 1
+        if intent:
+            print(f"DEBUG: Router fast path '{intent}' (score {score:.0f})")
+        return intent
+
+    @staticmethod
+    def answer(intent: str, tools) -> str:
+        return FAST_PATHS[intent]["handler"](tools)
+
+    @staticmethod
+    def tool_for(intent: str) -> str:
+        return FAST_PATHS[intent]["tool"]
+
+    def stats(self) -> dict:
+        with self.lock:
+            total_hits = sum(self.hits.values())
+            stats = {
+                "lookups": self.lookups,
+                "hits": total_hits,
+                "hit_rate": round(total_hits / self.lookups, 4) if self.lookups else 0.0,
+            }
+            stats.update({f"hits_{intent}": count for intent, count in self.hits.items()})
+            return stats
+
+
+# Global router instance
+intent_router = IntentRouter()
+request_metrics.register_collector("agent_intent_router", intent_router.stats)
@@ -1,9 +1,10 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy.orm import Session
 from services.inventory_service import InventoryService
-from services.appointment_service import AppointmentService
+from notifications.alert_digest import alert_aggregator
 from database import SessionLocal
 import datetime
+import config
 
 class AgentScheduler:
     def __init__(self):
@@ -16,18 +17,22 @@ class AgentScheduler:
             # Run inventory check every 30 minutes
             self.scheduler.add_job(self.check_low_stock, 'interval', minutes=30)
             
-            # Run upcoming appointments check every 15 minutes
+            # Queue reminders for upcoming appointments every 15 minutes
             self.scheduler.add_job(self.check_upcoming_appointments, 'interval', minutes=15)
             
             # Run auto-cancellation at midnight daily
             self.scheduler.add_job(self.auto_cancel_no_shows, 'cron', hour=0, minute=1)
+
+            # Send inventory alert digests whose batching window has closed
+            self.scheduler.add_job(alert_aggregator.flush_due, 'interval', seconds=30)
             
             self.scheduler.start()
             self.started = True
             print("⏰ Proactive Agent Scheduler Started.")
             print("   - Low stock alerts: Every 30 min")
-            print("   - Upcoming appointments: Every 15 min")
+            print(f"   - Appointment reminders: Every 15 min ({config.APPOINTMENT_REMINDER_HOURS:.0f}h ahead)")
             print("   - Auto-cancel no-shows: Daily at 12:01 AM")
+            print(f"   - Inventory alert digests: {alert_aggregator.window_seconds:.0f}s window")
 
     def auto_cancel_no_shows(self):
         """Auto-cancel appointments from yesterday that were never started"""
@@ -88,13 +93,41 @@ class AgentScheduler:
             db.close()
 
     def check_upcoming_appointments(self):
-        """Check for appointments in the next hour"""
+        """Queue reminder emails for appointments in the next APPOINTMENT_REMINDER_HOURS"""
         db: Session = SessionLocal()
         try:
-            svc = AppointmentService(db, 1)
-            # Logic to find appts in next 1 hour (simplified)
-            # In a real app, we'd query specifically for range [now, now+1hr]
-            pass 
+            from sqlalchemy.orm import joinedload
+            from models import Appointment, Doctor, Patient
+            from notifications.service import NotificationService
+
+            now = datetime.datetime.now()
+            upcoming = db.query(Appointment).options(
+                joinedload(Appointment.patient).joinedload(Patient.user),
+                joinedload(Appointment.doctor).joinedload(Doctor.user),
+                joinedload(Appointment.doctor).joinedload(Doctor.hospital),
+            ).filter(
+                Appointment.start_time > now,
+                Appointment.start_time <= now + datetime.timedelta(hours=config.APPOINTMENT_REMINDER_HOURS),
+                Appointment.status.in_(['confirmed', 'pending']),
+                Appointment.patient_id.isnot(None)
+            ).all()
+
+            # Every run sees the whole window; the per-appointment idempotency key sends each reminder once
+            reminders = [{
+                "appointment_id": appt.id,
+                "patient_email": appt.patient.user.email,
+                "patient_name": appt.patient.user.full_name,
+                "doctor_name": appt.doctor.user.full_name if appt.doctor and appt.doctor.user else "",
+                "treatment": appt.treatment_type or "",
+                "start_time": appt.start_time.isoformat(),
+                "location": appt.doctor.hospital.name if appt.doctor and appt.doctor.hospital else "Al-Shifa Dental Clinic",
+            } for appt in upcoming if appt.patient and appt.patient.user and appt.patient.user.email]
+
+            if reminders:
+                NotificationService().send_appointment_reminders(reminders)
+                print(f"⏰ Reminders checked for {len(reminders)} upcoming appointments")
+        except Exception as e:
+            print(f"Reminder job error: {e}")
         finally:
             db.close()
 
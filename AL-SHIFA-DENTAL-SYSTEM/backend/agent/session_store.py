@@ -0,0 +1,205 @@
+"""
+Chat-session storage for the doctor and patient agents.
+
+Sessions hold only the compact message history (plain dicts), never brain
+objects, so they can be evicted, persisted and served by any worker.
+- MemorySessionStore: per-process LRU + TTL (single worker / dev).
+- SQLiteSessionStore: shared file, safe across uvicorn workers (default).
+"""
+
+import json
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional
+
+import config
+from infra.metrics import request_metrics
+
+
+def _get(obj, name, default=None):
+    if isinstance(obj, dict): return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def serialize_messages(messages: list) -> List[dict]:
+    """
+    Convert SDK message objects / dicts into minimal JSON-safe dicts
+    (role, content, tool_calls, tool_call_id), dropping empty fields.
+    System prompts are skipped: brains rebuild them on load.
+    """
+    compact = []
+    for message in messages:
+        role = _get(message, "role") or "assistant"
+        if role == "system": continue
+        item = {"role": role}
+        content = _get(message, "content")
+        if content is not None:
+            item["content"] = content
+        tool_calls = _get(message, "tool_calls")
+        if tool_calls:
+            item["tool_calls"] = [{
+                "id": _get(call, "id"),
+                "type": "function",
+                "function": {
+                    "name": _get(_get(call, "function"), "name"),
+                    "arguments": _get(_get(call, "function"), "arguments") or "{}",
+                },
+            } for call in tool_calls]
+            item.setdefault("content", None)
+        tool_call_id = _get(message, "tool_call_id")
+        if tool_call_id:
+            item["tool_call_id"] = tool_call_id
+        compact.append(item)
+    return compact
+
+
+class SessionStore(ABC):
+    """Interface: key -> message history (list of dicts)."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[List[dict]]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, messages: list):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, max_sessions: int = 1000, ttl_minutes: int = 60):
+        self.sessions: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, messages)
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_minutes * 60
+        self.lock = Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        with self.lock:
+            entry = self.sessions.get(key)
+            if entry is None: return None
+            if entry[0] <= time.monotonic():
+                del self.sessions[key]
+                self.expirations += 1
+                return None
+            self.sessions.move_to_end(key)
+            return list(entry[1])
+
+    def set(self, key: str, messages: list):
+        compact = serialize_messages(messages)
+        with self.lock:
+            self.sessions[key] = (time.monotonic() + self.ttl_seconds, compact)
+            self.sessions.move_to_end(key)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self.lock:
+            self.sessions.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class SQLiteSessionStore(SessionStore):
+    # Expired rows are purged every N writes
+    PURGE_EVERY = 200
+
+    def __init__(self, path: str, max_sessions: int = 1000, ttl_minutes: int = 60):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_minutes * 60
+        self.lock = Lock()
+        self.writes = 0
+        # Opened on first use, so importing the module never touches the session file
+        self._conn = None
+        self._conn_lock = Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self._conn_lock:
+                if self._conn is None:
+                    self._conn = self._open()
+        return self._conn
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        # WAL: workers read each other's sessions without blocking writers
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS agent_sessions ("
+            " key TEXT PRIMARY KEY, messages TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_agent_sessions_updated ON agent_sessions (updated_at)")
+        return conn
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT messages FROM agent_sessions WHERE key = ? AND updated_at > ?",
+                (key, time.time() - self.ttl_seconds)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, messages: list):
+        payload = json.dumps(serialize_messages(messages), separators=(",", ":"))
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO agent_sessions (key, messages, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET messages = excluded.messages, updated_at = excluded.updated_at",
+                (key, payload, time.time())
+            )
+            self.writes += 1
+            if self.writes % self.PURGE_EVERY == 0:
+                self._purge()
+
+    def _purge(self):
+        self.conn.execute("DELETE FROM agent_sessions WHERE updated_at <= ?", (time.time() - self.ttl_seconds,))
+        # Cap row count: drop least recently updated beyond max_sessions
+        self.conn.execute(
+            "DELETE FROM agent_sessions WHERE key IN ("
+            " SELECT key FROM agent_sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+    def delete(self, key: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM agent_sessions WHERE key = ?", (key,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            # Never opened: don't create the file just to report zero sessions
+            count = self._conn.execute("SELECT COUNT(*) FROM agent_sessions").fetchone()[0] if self._conn else 0
+        return {"sessions": count, "max_sessions": self.max_sessions, "writes": self.writes}
+
+
+def create_session_store(backend: str = config.AGENT_SESSION_BACKEND) -> SessionStore:
+    if backend == "memory":
+        return MemorySessionStore(config.AGENT_SESSION_MAX, config.AGENT_SESSION_TTL_MINUTES)
+    return SQLiteSessionStore(config.AGENT_SESSION_DB, config.AGENT_SESSION_MAX, config.AGENT_SESSION_TTL_MINUTES)
+
+
+# Global session store (keys: "doctor:<user_id>", "patient:<patient_id>")
+session_store = create_session_store()
+request_metrics.register_collector("agent_sessions", session_store.stats)
@@ -0,0 +1,9 @@
+import json
+
+# Stop proxies (nginx) from buffering the event stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(payload: dict) -> str:
+    """Format one Server-Sent Events message: `data: {...}` + blank line."""
+    return f"data: {json.dumps(payload)}\n\n"
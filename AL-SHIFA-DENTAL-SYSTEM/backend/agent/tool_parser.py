@@ -0,0 +1,163 @@
+"""
+Parser for text-based tool calls (Groq/Llama fallback when native tool_calls fail).
+
+Accepted forms (args are a JSON object, may be empty):
+    <function=name>{...}</function>
+    <function="name">{...}</function>
+    <function=name{...}</function>
+    name>{...}</function>          (opening "<function=" dropped)
+    <function=name>{...} more text (unterminated: args are the first JSON object)
+
+ToolCallGrammar compiles the patterns once for a set of tool names.
+ToolCallParser consumes text incrementally (feed() per streamed chunk),
+returns only the user-visible text and collects validated calls: unknown
+names or non-object arguments are stripped from the text but never called.
+"""
+
+import json
+import re
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Iterable, List, Tuple
+
+_END_RE = re.compile(r"</function\s*>")
+_PARTIAL_OPEN_RE = re.compile(r'<function\s*=\s*"?[\w-]*"?\s*')
+_TRAILING_WORD_RE = re.compile(r"\w+$")
+_DECODER = json.JSONDecoder()
+_TAG_PREFIXES = ("<function", "</function>")
+
+
+class ToolCallGrammar:
+    def __init__(self, names: Iterable[str]):
+        self.names = frozenset(names)
+        bare = "|".join(re.escape(n) for n in sorted(self.names, key=len, reverse=True))
+        # group 1: <function=name> variants, group 2: bare "name>" (known names only)
+        self.start_re = re.compile(r'<function\s*=\s*"?([\w-]+)"?\s*>?' + (rf"|\b({bare})>" if bare else ""))
+
+    def parser(self) -> "ToolCallParser":
+        return ToolCallParser(self)
+
+    def parse(self, text: str) -> "ToolCallParser":
+        """Parse a complete message; read .visible, .calls and .rejected."""
+        parser = self.parser()
+        parser.visible = parser.feed(text or "") + parser.close()
+        return parser
+
+    def strip(self, text: str) -> str:
+        return self.parse(text).visible
+
+
+class ToolCallParser:
+    def __init__(self, grammar: ToolCallGrammar):
+        self.grammar = grammar
+        self.calls: List[SimpleNamespace] = []
+        self.rejected: List[Tuple[str, str]] = []  # (name, reason), for logging
+        self.visible = ""  # set by ToolCallGrammar.parse()
+        self._buffer = ""
+        self._name = None  # inside a tag when set
+        self._count = 0
+
+    def feed(self, chunk: str) -> str:
+        """Consume a chunk; return text that is now safe to show the user."""
+        self._buffer += chunk
+        return self._drain(final=False)
+
+    def close(self) -> str:
+        """Flush at end of stream (an open tag takes the rest as its arguments)."""
+        visible = self._drain(final=True)
+        if self._name is not None:
+            visible += self._finish_unterminated(self._buffer)
+        elif self._buffer:
+            visible += self._buffer
+        self._buffer = ""
+        return visible
+
+    def _drain(self, final: bool) -> str:
+        out = []
+        while self._buffer:
+            if self._name is None:
+                match = self.grammar.start_re.search(self._buffer)
+                stray = _END_RE.search(self._buffer)
+                if stray and (not match or stray.start() < match.start()):
+                    # Closing tag without an opening one: drop the tag itself
+                    out.append(self._buffer[:stray.start()])
+                    self._buffer = self._buffer[stray.end():]
+                    continue
+                # A match touching the end may still grow ("<function=get_my" + "_appointments>")
+                if match and (final or match.end() < len(self._buffer)):
+                    out.append(self._buffer[:match.start()])
+                    self._name = match.group(1) or match.group(2)
+                    self._buffer = self._buffer[match.end():]
+                    continue
+                hold = match.start() if match else self._hold_from(final)
+                out.append(self._buffer[:hold])
+                self._buffer = self._buffer[hold:]
+                break
+
+            end = _END_RE.search(self._buffer)
+            nxt = self.grammar.start_re.search(self._buffer)
+            if nxt and (not end or nxt.start() < end.start()) and (final or nxt.end() < len(self._buffer)):
+                # Next tag opens before this one closes: args stop there
+                out.append(self._finish_unterminated(self._buffer[:nxt.start()]))
+                self._buffer = self._buffer[nxt.start():]
+                continue
+            if not end:
+                break
+            self._finish_call(self._buffer[:end.start()])
+            self._buffer = self._buffer[end.end():]
+        return "".join(out)
+
+    def _hold_from(self, final: bool) -> int:
+        """Index from which the buffer might be the start of a tag (kept for the next chunk)."""
+        if final:
+            return len(self._buffer)
+        lt = self._buffer.rfind("<")
+        if lt != -1:
+            tail = self._buffer[lt:]
+            if any(p.startswith(tail) for p in _TAG_PREFIXES) or _PARTIAL_OPEN_RE.fullmatch(tail):
+                return lt
+        word = _TRAILING_WORD_RE.search(self._buffer)
+        if word and any(n.startswith(word.group()) for n in self.grammar.names):
+            return word.start()
+        return len(self._buffer)
+
+    def _finish_unterminated(self, rest: str) -> str:
+        """Tag with no </function>: args are the leading JSON object, the rest is text."""
+        stripped = rest.lstrip()
+        if stripped.startswith("{"):
+            try:
+                _, end = _DECODER.raw_decode(stripped)
+            except json.JSONDecodeError:
+                pass
+            else:
+                self._finish_call(stripped[:end])
+                return stripped[end:]
+        self._finish_call(rest)
+        return ""
+
+    def _finish_call(self, raw_args: str):
+        name, self._name = self._name, None
+        args_str = raw_args.strip()
+        # Tolerate name>(args) and a stray ")" after the object
+        if args_str.startswith("(") and args_str.endswith(")"):
+            args_str = args_str[1:-1].strip()
+        elif args_str.endswith(")") and not args_str.endswith("})"):
+            args_str = args_str[:-1].strip()
+
+        if name not in self.grammar.names:
+            self.rejected.append((name, "unknown tool"))
+            return
+        try:
+            args = json.loads(args_str) if args_str else {}
+        except json.JSONDecodeError as e:
+            self.rejected.append((name, f"bad arguments: {e}"))
+            return
+        if not isinstance(args, dict):
+            self.rejected.append((name, "arguments are not an object"))
+            return
+
+        self.calls.append(SimpleNamespace(
+            id=f"text_call_{self._count}_{datetime.now().timestamp()}",
+            function=SimpleNamespace(name=name, arguments=json.dumps(args))
+        ))
+        self._count += 1
@@ -1,6 +1,7 @@
 
 from sqlalchemy.orm import Session
 from datetime import datetime
+import copy
 import json
 
 from services.appointment_service import AppointmentService
@@ -10,30 +11,31 @@ from services.treatment_service import TreatmentService
 from services.clinical_service import ClinicalService
 from services.patient_service import PatientService
 from models import Doctor, User, Appointment, Treatment
-from rag.store import RAGStore
-from rag.loader import DocumentLoader
-import os
+from rag.store import get_rag_store
+from rag.retriever import get_retriever
 
 class AgentTools:
     def __init__(self, db: Session, doctor_id: int):
-        self.db = db
         self.doc_id = doctor_id
+        self._bind_services(db)
         
-        self.appt_service = AppointmentService(db, doctor_id)
-        self.inv_service = InventoryService(db, doctor_id)
-        self.analytics_service = AnalyticsService(db, doctor_id)
-        self.treat_service = TreatmentService(db, doctor_id)
-        self.clinical_service = ClinicalService(db, doctor_id)
-        self.pat_service = PatientService(db, doctor_id)
-        
-        # Initialize RAG
-        self.rag_store = RAGStore()
-        # Auto-load knowledge base on startup (simple approach for now)
-        kb_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "knowledge_base")
-        if self.rag_store.count() == 0:
-             print(f"Loading Knowledge Base from {kb_path}...")
-             loader = DocumentLoader(self.rag_store)
-             loader.load_directory(kb_path)
+        # Shared RAG store (built once at startup, see core.init)
+        self.rag_store = get_rag_store()
+
+    def _bind_services(self, db: Session):
+        self.db = db
+        self.appt_service = AppointmentService(db, self.doc_id)
+        self.inv_service = InventoryService(db, self.doc_id)
+        self.analytics_service = AnalyticsService(db, self.doc_id)
+        self.treat_service = TreatmentService(db, self.doc_id)
+        self.clinical_service = ClinicalService(db, self.doc_id)
+        self.pat_service = PatientService(db, self.doc_id)
+
+    def for_session(self, db: Session) -> "AgentTools":
+        """Copy bound to another DB session (shares the RAG store), for running tools concurrently."""
+        clone = copy.copy(self)
+        clone._bind_services(db)
+        return clone
 
 
     def get_todays_appointments(self):
@@ -90,50 +92,57 @@ class AgentTools:
                     return f"Found: {item.name}\nQuantity: {item.quantity} {item.unit}\nMin Threshold: {item.min_threshold}\nDaily Usage: {daily_rate:.2f}/day\n📉 Estimated Stock-out in: {days_left}"
             return f"Item '{item_name}' not found in inventory."
         else:
-            # 1. Get Low Stock (Traditional)
-            low_stock = self.inv_service.get_low_stock()
-            
-            # 2. Get Projected Usage (Next 7 Days)
-            projected = self.inv_service.get_projected_usage(days=7)
-            
-            alerts = []
-            
-            # Check for critical shortages
-            all_items = self.inv_service.get_all_items()
-            for item in all_items:
-                needed = projected.get(item.id, 0)
-                if needed > 0:
-                    if item.quantity < needed:
-                        alerts.append({
-                            "name": item.name,
-                            "qty": item.quantity,
-                            "needed": needed,
-                            "status": "CRITICAL",
-                            "message": f"Insufficient stock for upcoming appointments! Need {needed}, have {item.quantity}."
-                        })
-                    elif (item.quantity - needed) < item.min_threshold:
-                        alerts.append({
-                            "name": item.name, 
-                            "qty": item.quantity,
-                            "needed": needed,
-                            "status": "WARNING",
-                            "message": f"Stock will dip below threshold ({item.min_threshold}) after usage."
-                        })
-
-            # Merge with traditional low stock if not duplicates
-            alert_names = {a['name'] for a in alerts}
-            for item in low_stock:
-                if item.name not in alert_names:
+            alerts = self.get_stock_alerts()
+            if not alerts: return "All stock levels are healthy. No upcoming shortages predicted."
+            return json.dumps(alerts)
+
+    def get_stock_alerts(self) -> list:
+        """
+        Low-stock and projected (next 7 days) shortage alerts:
+        [{"name", "qty", "status": CRITICAL|WARNING|LOW, "message", ...}, ...]
+        """
+        # 1. Get Low Stock (Traditional)
+        low_stock = self.inv_service.get_low_stock()
+        
+        # 2. Get Projected Usage (Next 7 Days)
+        projected = self.inv_service.get_projected_usage(days=7)
+        
+        alerts = []
+        
+        # Check for critical shortages
+        all_items = self.inv_service.get_all_items()
+        for item in all_items:
+            needed = projected.get(item.id, 0)
+            if needed > 0:
+                if item.quantity < needed:
                     alerts.append({
                         "name": item.name,
-                        "qty": item.quantity, 
-                        "min": item.min_threshold,
-                        "status": "LOW",
-                        "message": f"Below minimum threshold ({item.min_threshold})."
+                        "qty": item.quantity,
+                        "needed": needed,
+                        "status": "CRITICAL",
+                        "message": f"Insufficient stock for upcoming appointments! Need {needed}, have {item.quantity}."
                     })
-            
-            if not alerts: return "All stock levels are healthy. No upcoming shortages predicted."
-            return json.dumps(alerts)
+                elif (item.quantity - needed) < item.min_threshold:
+                    alerts.append({
+                        "name": item.name, 
+                        "qty": item.quantity,
+                        "needed": needed,
+                        "status": "WARNING",
+                        "message": f"Stock will dip below threshold ({item.min_threshold}) after usage."
+                    })
+
+        # Merge with traditional low stock if not duplicates
+        alert_names = {a['name'] for a in alerts}
+        for item in low_stock:
+            if item.name not in alert_names:
+                alerts.append({
+                    "name": item.name,
+                    "qty": item.quantity, 
+                    "min": item.min_threshold,
+                    "status": "LOW",
+                    "message": f"Below minimum threshold ({item.min_threshold})."
+                })
+        return alerts
 
     def manage_inventory(self, action: str, name: str = None, quantity: int = 0, unit: str = "Pcs", threshold: int = 10):
         """
@@ -267,15 +276,17 @@ class AgentTools:
         Args:
             query: The clinical question or topic to search for (e.g. "root canal post op").
         """
-        results = self.rag_store.search(query, n_results=3)
+        results = get_retriever().retrieve(query, k=3)
         
-        if not results['documents'] or not results['documents'][0]:
+        if not results:
             return "No relevant clinical protocols found."
             
         context_parts = []
-        for i, doc in enumerate(results['documents'][0]):
-            source = results['metadatas'][0][i]['source']
-            context_parts.append(f"--- Document: {source} ---\n{doc}")
+        for doc in results:
+            pages = ""
+            if doc.get("page_start"):
+                pages = f" (p. {doc['page_start']})" if doc["page_start"] == doc["page_end"] else f" (pp. {doc['page_start']}-{doc['page_end']})"
+            context_parts.append(f"--- Document: {doc['source']}{pages} ---\n{doc['text']}")
             
         return "\n\n".join(context_parts)
 
@@ -408,27 +419,22 @@ class PatientAgentTools:
             
             # --- SEND EMAIL NOTIFICATION ---
             try:
-                from notifications.email import EmailAdapter
+                from notifications.service import NotificationService
                 from models import Patient
                 
                 # Get Patient Email
                 patient = self.db.query(Patient).filter(Patient.id == self.patient_id).first()
                 if patient and patient.user.email:
-                    email_service = EmailAdapter()
-                    subject = "Appointment Confirmation - Al-Shifa Dental"
-                    body = f"""
-Dear {patient.user.full_name},
-
-Your appointment has been successfully booked!
-
-Doctor: Dr. {appt.doctor.user.full_name}
-Time: {start_dt.strftime('%A, %d %b %Y at %I:%M %p')}
-Location: {appt.doctor.hospital.name}
-
-Thank you for choosing Al-Shifa Dental.
-"""
-                    email_service.send(patient.user.email, subject, body)
-                    print(f"DEBUG: Email sent to {patient.user.email}")
+                    # Queued on the retry queue: the chat reply doesn't wait on SMTP
+                    NotificationService().send_booking_confirmation(
+                        patient_email=patient.user.email,
+                        patient_name=patient.user.full_name,
+                        doctor_name=appt.doctor.user.full_name,
+                        start_time=start_dt,
+                        location=appt.doctor.hospital.name,
+                        appointment_id=appt.id
+                    )
+                    print(f"DEBUG: Confirmation email queued for {patient.user.email}")
             except Exception as e:
                 print(f"DEBUG: Email sending failed: {e}")
             # -------------------------------
@@ -438,23 +444,48 @@ Thank you for choosing Al-Shifa Dental.
             # Return exact service error without wrapping
             return str(e)
 
-    def check_availability(self, doctor_id: int, date: str):
+    def check_availability(self, doctor_id: int, date: str, days: int = 1):
         """
-        Get available time slots for a specific doctor and date.
+        Get available time slots for a specific doctor, for a date (or N days from it).
         """
         try:
-            # We need to temporarily set the doc_id in the service because PatientAgentTools service is init with None
-            self.appt_service.doc_id = int(doctor_id) 
-            slots = self.appt_service.get_available_slots(date)
-            
-            if not slots:
-                return f"No available time slots found for this doctor on {date}."
-                
+            days = max(1, min(int(days or 1), 14))
+            by_day = self.appt_service.get_available_slots_range(date, days, doctor_id=int(doctor_id))
+
+            if not any(by_day.values()):
+                if days == 1:
+                    return f"No available time slots found for this doctor on {date}."
+                return f"No available time slots found for this doctor in the {days} days from {date}."
+
             # Return descriptive text for slots
-            return f"Available slots for {date}: \n" + "\n".join([f"- {s}" for s in slots])
+            lines = []
+            for day, slots in by_day.items():
+                if not slots: continue
+                lines.append(f"Available slots for {day}: \n" + "\n".join([f"- {s}" for s in slots]))
+            return "\n\n".join(lines)
         except Exception as e:
             return f"Error checking slots: {str(e)}"
 
+    def search_availability(self, treatment: str, start_date: str = None, end_date: str = None, hospital_id: int = None, limit: int = 5):
+        """
+        Find the earliest free slots for a treatment across all doctors in a date range.
+        """
+        try:
+            start_date = start_date or datetime.now().strftime("%Y-%m-%d")
+            hospital_id = int(hospital_id) if hospital_id not in (None, "") else None
+            limit = max(1, min(int(limit or 5), 20))
+            slots = self.appt_service.search_availability(treatment, start_date, end_date, hospital_id, limit)
+
+            if not slots:
+                return f"No free slots found for '{treatment}' in that date range."
+
+            lines = [f"Earliest available slots for {treatment}:"]
+            for i, s in enumerate(slots, 1):
+                lines.append(f"{i}. {s['date']} {s['time']} - {s['doctor_name']} (Doctor ID {s['doctor_id']}) at {s['hospital_name']} - {s['treatment']}")
+            return "\n".join(lines)
+        except Exception as e:
+            return f"Error searching availability: {str(e)}"
+
     def reschedule_appointment(self, appointment_id: int, new_date: str, new_time: str):
         """
         Reschedule an existing appointment to a new date and time.
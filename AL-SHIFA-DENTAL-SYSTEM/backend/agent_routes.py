@@ -1,53 +1,102 @@
+import asyncio
 import models
-from fastapi import APIRouter, Depends, Body, UploadFile, File
+from fastapi import APIRouter, Depends, Body, UploadFile, File, HTTPException
+from fastapi.responses import StreamingResponse
 import shutil
 import os
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, SessionLocal
 from models import User, Doctor
 from agent.brain import ClinicAgent # Import the new brain
 from dependencies import get_current_user
+from cache import response_cache
+from agent.streaming import SSE_HEADERS, sse_event
+from agent.session_store import session_store
+from rag.jobs import ingestion_jobs
+from rag.loader import SUPPORTED_EXTENSIONS
 
 router = APIRouter(prefix="/doctor/agent", tags=["Agent"])
-OBJECT_MEMORY = {} # Simple in-memory storage {user_id: [messages]}
+
+def _get_doctor(db: Session, user_id: int):
+    return db.query(Doctor).filter(Doctor.user_id == user_id).first()
 
 @router.post("/chat")
-def chat_with_agent(query: str = Body(..., embed=True), user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def chat_with_agent(query: str = Body(..., embed=True), user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     # 1. Security Check
     if user.role != "doctor":
         return {"response": "Access Denied: Only doctors can use the Agent."}
     
-    doctor = db.query(Doctor).filter(Doctor.user_id == user.id).first()
+    # Sync DB / session-store calls run off the event loop
+    doctor = await asyncio.to_thread(_get_doctor, db, user.id)
     if not doctor:
         return {"response": "Doctor profile not found."}
 
     # 2. Check Cache First
-    from cache import response_cache
     cached = response_cache.get(query, user.id)
     if cached:
         return {"response": cached}
 
     # 3. Retrieve History
-    history = OBJECT_MEMORY.get(user.id, None)
+    history = await asyncio.to_thread(session_store.get, f"doctor:{user.id}")
 
     # 4. Instantiate the Agent with History
     agent = ClinicAgent(doctor.id, history=history)
     
     # 5. Process with fresh DB
     try:
-        response_text = agent.process(query, db)
+        response_text = await agent.process(query, db)
         
-        # 6. Cache successful response
-        response_cache.set(query, user.id, response_text)
+        # 6. Cache successful read-only responses, tagged with the data they were built from
+        if agent.cacheable:
+            response_cache.set(query, user.id, response_text, namespace=f"doctor:{doctor.id}", tags=agent.touched_domains)
         
         # 7. Save History
-        OBJECT_MEMORY[user.id] = agent.messages
+        await asyncio.to_thread(session_store.set, f"doctor:{user.id}", agent.messages)
         
         return {"response": response_text}
 
     except Exception as e:
         return {"response": f"❌ Agent Error: {str(e)}"}
 
+@router.post("/chat/stream")
+async def chat_with_agent_stream(query: str = Body(..., embed=True), user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """SSE variant of /chat: `data: {"token": ...}` events, then `data: {"done": true, "response": ...}`."""
+    if user.role != "doctor":
+        return {"response": "Access Denied: Only doctors can use the Agent."}
+    
+    doctor = await asyncio.to_thread(_get_doctor, db, user.id)
+    if not doctor:
+        return {"response": "Doctor profile not found."}
+    doctor_id, user_id = doctor.id, user.id
+
+    async def events():
+        cached = response_cache.get(query, user_id)
+        if cached:
+            yield sse_event({"token": cached})
+            yield sse_event({"done": True, "response": cached, "cached": True})
+            return
+
+        agent = ClinicAgent(doctor_id, history=await asyncio.to_thread(session_store.get, f"doctor:{user_id}"))
+        # The request-scoped session may be closed before the body finishes streaming
+        stream_db = SessionLocal()
+        try:
+            parts = []
+            async for token in agent.stream(query, stream_db):
+                parts.append(token)
+                yield sse_event({"token": token})
+            response_text = "".join(parts)
+
+            if agent.cacheable:
+                response_cache.set(query, user_id, response_text, namespace=f"doctor:{doctor_id}", tags=agent.touched_domains)
+            await asyncio.to_thread(session_store.set, f"doctor:{user_id}", agent.messages)
+            yield sse_event({"done": True, "response": response_text})
+        except Exception as e:
+            yield sse_event({"done": True, "response": f"❌ Agent Error: {str(e)}"})
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @router.post("/upload")
 def upload_knowledge(file: UploadFile = File(...), user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     if user.role != "doctor":
@@ -59,30 +108,40 @@ def upload_knowledge(file: UploadFile = File(...), user: models.User = Depends(g
         if not os.path.exists(kb_dir):
             os.makedirs(kb_dir)
             
-        file_path = os.path.join(kb_dir, file.filename)
+        filename = os.path.basename(file.filename or "")
+        if not filename.endswith(SUPPORTED_EXTENSIONS):
+            return {"status": "error", "message": "Unsupported file format"}
+        file_path = os.path.join(kb_dir, filename)
         
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
             
-        # 2. Trigger RAG Loader
-        # We need to instantiate loader. Since AgentTools does it, let's reuse a temp one or access via a service
-        # For simplicity, we create a fresh RAGStore/Loader instance here
-        from rag.store import RAGStore
-        from rag.loader import DocumentLoader
-        
-        store = RAGStore()
-        loader = DocumentLoader(store)
-        
-        success, msg = loader.process_file(file_path)
-        
-        if success:
-            return {"status": "success", "message": msg}
-        else:
-            return {"status": "error", "message": msg}
+        # 2. Parse/chunk/embed in the background; poll /jobs/{job_id} for progress
+        job = ingestion_jobs.submit(file_path)
+        return {
+            "status": "success",
+            "job_id": job.id,
+            "message": f"{filename} uploaded. Indexing in background (job {job.id})."
+        }
             
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+@router.get("/jobs")
+def list_ingestion_jobs(user: models.User = Depends(get_current_user)):
+    if user.role != "doctor":
+        return {"response": "Access Denied"}
+    return {"jobs": ingestion_jobs.list_jobs()}
+
+@router.get("/jobs/{job_id}")
+def get_ingestion_job(job_id: str, user: models.User = Depends(get_current_user)):
+    if user.role != "doctor":
+        return {"response": "Access Denied"}
+    job = ingestion_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @router.get("/summary/{patient_id}")
 def get_patient_summary(patient_id: int, user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     if user.role != "doctor":
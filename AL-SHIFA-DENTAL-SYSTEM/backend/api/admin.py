@@ -4,6 +4,8 @@ from sqlalchemy.orm import Session
 import models
 from database import get_db
 from core.security import get_current_user
+from notifications.outbox import outbox_dispatcher
+from infra.retry_queue import retry_queue
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -112,3 +114,26 @@ def delete_entity(type: str, id: int, db: Session = Depends(get_db)):
     except Exception as e:
         db.rollback()
         raise HTTPException(500, f"Delete failed: {str(e)}")
+
+@router.get("/notifications/outbox")
+def get_notification_outbox(user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    if user.role != "admin": raise HTTPException(403)
+    return outbox_dispatcher.status(db)
+
+@router.get("/retry-queue")
+def get_retry_queue(user: models.User = Depends(get_current_user)):
+    if user.role != "admin": raise HTTPException(403)
+    return {"stats": retry_queue.stats(), "dead_letters": retry_queue.dead_letters()}
+
+@router.post("/retry-queue/dead-letters/{dead_letter_id}/replay")
+def replay_dead_letter(dead_letter_id: int, user: models.User = Depends(get_current_user)):
+    if user.role != "admin": raise HTTPException(403)
+    job_id = retry_queue.replay(dead_letter_id)
+    if job_id is None: raise HTTPException(404, "Dead letter not found")
+    return {"message": "Requeued", "job_id": job_id}
+
+@router.post("/retry-queue/dead-letters/replay")
+def replay_all_dead_letters(user: models.User = Depends(get_current_user)):
+    if user.role != "admin": raise HTTPException(403)
+    job_ids = retry_queue.replay_all()
+    return {"message": f"Requeued {len(job_ids)} jobs", "job_ids": job_ids}
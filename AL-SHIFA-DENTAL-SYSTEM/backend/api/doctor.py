@@ -1,8 +1,8 @@
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Response
 from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, or_
 from datetime import datetime, timedelta
 import csv
 import json
@@ -33,7 +33,9 @@ def get_doctor_dashboard(user: models.User = Depends(get_current_user), db: Sess
     if not doc: return {"account_status": "no_profile"}
     
     now = datetime.now()
-    appts = db.query(models.Appointment).filter(
+    appts = db.query(models.Appointment).options(
+        joinedload(models.Appointment.patient).joinedload(models.Patient.user)
+    ).filter(
         models.Appointment.doctor_id == doc.id,
         models.Appointment.start_time >= now.replace(hour=0, minute=0, second=0),
         models.Appointment.start_time < now.replace(hour=0, minute=0, second=0) + timedelta(days=1),
@@ -51,7 +53,7 @@ def get_doctor_dashboard(user: models.User = Depends(get_current_user), db: Sess
 
     appt_list = []
     for a in appts:
-        p = db.query(models.Patient).filter(models.Patient.id == a.patient_id).first()
+        p = a.patient
         appt_list.append({
             "id": a.id, "patient_name": p.user.full_name if p else "Unknown", 
             "treatment": a.treatment_type, "time": a.start_time.strftime("%I:%M %p"), "status": a.status
@@ -254,7 +256,9 @@ def get_daily_appointments(date: str, user: models.User = Depends(get_current_us
         end_of_day = query_date.replace(hour=23, minute=59, second=59)
     except: raise HTTPException(400, "Invalid date format. Use YYYY-MM-DD")
 
-    appts = db.query(models.Appointment).filter(
+    appts = db.query(models.Appointment).options(
+        joinedload(models.Appointment.patient).joinedload(models.Patient.user)
+    ).filter(
         models.Appointment.doctor_id == doc.id,
         models.Appointment.start_time >= start_of_day,
         models.Appointment.start_time <= end_of_day,
@@ -265,7 +269,7 @@ def get_daily_appointments(date: str, user: models.User = Depends(get_current_us
     for a in appts:
         p_name = "Blocked Slot"
         if a.patient_id:
-            p = db.query(models.Patient).filter(models.Patient.id == a.patient_id).first()
+            p = a.patient
             p_name = p.user.full_name if p else "Unknown"
         elif a.status == "blocked": p_name = a.notes or "Blocked"
 
@@ -327,19 +331,27 @@ def get_fin(user: models.User = Depends(get_current_user), db: Session = Depends
 def get_doc_patients(user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     doc = db.query(models.Doctor).filter(models.Doctor.user_id == user.id).first()
     if not doc: return []
-    appts = db.query(models.Appointment).filter(models.Appointment.doctor_id == doc.id).all()
-    pids = set(a.patient_id for a in appts)
-    recs = db.query(models.MedicalRecord).filter(models.MedicalRecord.doctor_id == doc.id).all()
-    pids.update(r.patient_id for r in recs)
-    
+
+    # Last visit per patient in one grouped query
+    last_visits = dict(db.query(
+        models.Appointment.patient_id, func.max(models.Appointment.start_time)
+    ).filter(
+        models.Appointment.doctor_id == doc.id,
+        models.Appointment.patient_id != None
+    ).group_by(models.Appointment.patient_id).all())
+
+    # Patients seen via appointments OR records, with users eagerly loaded
+    appt_pids = db.query(models.Appointment.patient_id).filter(models.Appointment.doctor_id == doc.id)
+    rec_pids = db.query(models.MedicalRecord.patient_id).filter(models.MedicalRecord.doctor_id == doc.id)
+    patients = db.query(models.Patient).options(joinedload(models.Patient.user)).filter(
+        or_(models.Patient.id.in_(appt_pids), models.Patient.id.in_(rec_pids))
+    ).order_by(models.Patient.id).all()
+
     res = []
-    for pid in pids:
-        if pid is None: continue
-        p = db.query(models.Patient).filter(models.Patient.id == pid).first()
-        if p:
-             last_appt = db.query(models.Appointment).filter(models.Appointment.patient_id == p.id, models.Appointment.doctor_id == doc.id).order_by(models.Appointment.start_time.desc()).first()
-             last_visit = last_appt.start_time.strftime("%Y-%m-%d") if last_appt else "N/A"
-             res.append({"id": p.id, "name": p.user.full_name, "age": p.age, "gender": p.gender, "last_visit": last_visit, "status": "Active", "condition": "Checkup"})
+    for p in patients:
+        last_appt_time = last_visits.get(p.id)
+        last_visit = last_appt_time.strftime("%Y-%m-%d") if last_appt_time else "N/A"
+        res.append({"id": p.id, "name": p.user.full_name, "age": p.age, "gender": p.gender, "last_visit": last_visit, "status": "Active", "condition": "Checkup"})
     return res
 
 @router.post("/patients")
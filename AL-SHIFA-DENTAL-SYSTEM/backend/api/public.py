@@ -2,11 +2,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+from typing import Optional
 import json
 import models, schemas
 from database import get_db
 from core.security import get_current_user
 from core.utils import generate_otp
+from services.availability_service import AvailabilityService
+from services.appointment_service import AppointmentService
 
 router = APIRouter(tags=["Public"]) 
 
@@ -55,35 +58,24 @@ def get_public_doctor_settings(doctor_id: int, db: Session = Depends(get_db)):
 
 @router.get("/doctors/{doctor_id}/booked-slots")
 def get_booked_slots_public(doctor_id: int, date: str, db: Session = Depends(get_db)):
-    """Returns a list of ALL 30-min slots that are occupied"""
+    """Returns the doctor's grid slots (see /settings) that overlap any booking or block"""
     try:
         query_date = datetime.strptime(date, "%Y-%m-%d").date()
     except ValueError:
         raise HTTPException(400, "Invalid date format")
 
-    start_of_day = datetime.combine(query_date, datetime.min.time())
-    end_of_day = datetime.combine(query_date, datetime.max.time())
+    occupied = AvailabilityService(db, doctor_id).occupied_slots(query_date)
+    return [slot.strftime("%I:%M %p") for slot in occupied]
 
-    appts = db.query(models.Appointment).filter(
-        models.Appointment.doctor_id == doctor_id,
-        models.Appointment.start_time < end_of_day, 
-        models.Appointment.end_time > start_of_day,
-        models.Appointment.status.in_(["confirmed", "pending", "checked-in", "in_progress", "blocked"])
-    ).all()
-
-    occupied_slots = []
-    
-    for a in appts:
-        start = max(a.start_time, start_of_day)
-        end = min(a.end_time, end_of_day)
-        
-        curr = start
-        while curr < end:
-            slot_str = curr.strftime("%I:%M %p")
-            occupied_slots.append(slot_str)
-            curr += timedelta(minutes=30)
-            
-    return list(set(occupied_slots)) 
+@router.get("/availability/search")
+def search_availability(treatment: str, start_date: Optional[str] = None, end_date: Optional[str] = None, hospital_id: Optional[int] = None, limit: int = 5, db: Session = Depends(get_db)):
+    """Earliest free slots across all doctors offering a treatment"""
+    start_date = start_date or datetime.now().strftime("%Y-%m-%d")
+    try:
+        slots = AppointmentService(db, None).search_availability(treatment, start_date, end_date, hospital_id, max(1, min(limit, 50)))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"treatment": treatment, "slots": slots}
 
 @router.post("/appointments")
 def create_appointment(appt: schemas.AppointmentCreate, user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
@@ -0,0 +1,89 @@
+"""
+Chunker Benchmark
+Chunks a synthetic N-page document (default 500 pages, mostly without
+markdown headers, like a scanned manual) or a real PDF, and reports
+throughput plus chunk-size distribution. The "header-only" row disables
+the size limit to show what splitting on headers alone produces.
+
+Usage: python benchmark_chunker.py [--pages 500] [--pdf manual.pdf] [--max-tokens 200] [--overlap 40] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rag.chunker import TextChunker, estimate_tokens
+from rag.loader import extract_pages
+
+VOCAB = (
+    "patient tooth molar premolar canal root crown implant abutment gingiva periodontal pocket "
+    "irrigation sodium hypochlorite chlorhexidine lidocaine articaine epinephrine anesthesia "
+    "extraction socket gauze suture healing infection antibiotic amoxicillin ibuprofen dose "
+    "radiograph occlusion enamel dentin pulp necrosis abscess sterilization autoclave protocol"
+).split()
+
+
+def synthetic_pages(n_pages: int, seed: int = 7):
+    rng = random.Random(seed)
+    pages = []
+    for number in range(1, n_pages + 1):
+        lines = []
+        # An occasional header (about 1 page in 10), otherwise plain running text
+        if rng.random() < 0.1:
+            lines.append(f"# Chapter {number // 10 + 1}")
+        for _ in range(rng.randint(4, 8)):
+            sentences = []
+            for _ in range(rng.randint(2, 6)):
+                words = rng.choices(VOCAB, k=rng.randint(6, 28))
+                sentences.append(" ".join(words).capitalize() + ".")
+            lines.append(" ".join(sentences))
+            lines.append("")
+        pages.append((number, "\n".join(lines)))
+    return pages
+
+
+def report(name: str, chunker: TextChunker, pages, repeat: int, limit: int = None):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = chunker.chunk_pages(pages)
+        timings.append(time.perf_counter() - started)
+
+    best = min(timings)
+    sizes = [estimate_tokens(c.text) for c in chunks]
+    over = sum(1 for s in sizes if limit and s > limit)
+    print(f"  {name:<12} {len(chunks):>6} chunks  {best * 1000:>8.1f} ms  {len(pages) / best:>8.0f} pages/s  "
+          f"tokens mean={statistics.mean(sizes):.0f} p95={sorted(sizes)[int(len(sizes) * 0.95) - 1] if len(sizes) > 1 else sizes[0]} "
+          f"max={max(sizes)}" + (f"  over-limit={over}" if limit else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput / chunk-size benchmark for rag.chunker.")
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--pdf", help="Chunk a real PDF instead of synthetic pages")
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.pdf:
+        started = time.perf_counter()
+        pages = extract_pages(args.pdf)
+        print(f"Extracted {len(pages)} pages from {args.pdf} in {time.perf_counter() - started:.2f}s")
+    else:
+        pages = synthetic_pages(args.pages)
+    total_tokens = sum(estimate_tokens(text) for _, text in pages)
+    print(f"Document: {len(pages)} pages, ~{total_tokens:,} tokens\n")
+
+    report("header-only", TextChunker(max_tokens=10 ** 9, overlap_tokens=0), pages, args.repeat)
+    report("token-aware", TextChunker(max_tokens=args.max_tokens, overlap_tokens=args.overlap), pages, args.repeat,
+           limit=args.max_tokens)
+
+
+if __name__ == "__main__":
+    main()
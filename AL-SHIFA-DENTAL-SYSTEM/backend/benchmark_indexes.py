@@ -0,0 +1,138 @@
+"""
+Index Benchmark
+Seeds a throwaway SQLite database with N appointments (default 1,000,000),
+prints EXPLAIN QUERY PLAN + timings for the hot Appointment/Invoice queries,
+then applies the migrations and prints the same report again.
+
+Usage: python benchmark_indexes.py [--appointments 1000000] [--doctors 200] [--patients 50000]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine
+import models
+from core.migrations import run_migrations, MIGRATIONS
+
+NEW_INDEXES = [
+    "ix_appointments_doctor_start",
+    "ix_appointments_patient_start_status",
+    "ix_appointments_doctor_status",
+    "ix_invoices_appointment",
+    "ix_invoices_patient_created",
+]
+
+FMT = "%Y-%m-%d %H:%M:%S.%f"
+STATUSES = ["confirmed", "pending", "completed", "cancelled", "blocked"]
+BASE = datetime(2025, 1, 1, 9, 0)
+
+
+def seed(path: str, n_appts: int, n_doctors: int, n_patients: int):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    def appts():
+        for i in range(1, n_appts + 1):
+            start = BASE + timedelta(minutes=30 * random.randint(0, 365 * 48))
+            yield (i, random.randint(1, n_patients), random.randint(1, n_doctors), "Cleaning",
+                   start.strftime(FMT), (start + timedelta(minutes=30)).strftime(FMT),
+                   random.choice(STATUSES), None)
+
+    def invoices():
+        for i in range(1, n_appts // 2 + 1):
+            created = BASE + timedelta(minutes=random.randint(0, 365 * 24 * 60))
+            yield (i, i * 2, random.randint(1, n_patients), 1500.0, "paid", created.strftime(FMT))
+
+    conn.executemany("INSERT INTO appointments VALUES (?,?,?,?,?,?,?,?)", appts())
+    conn.executemany("INSERT INTO invoices VALUES (?,?,?,?,?,?)", invoices())
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def hot_queries():
+    day = (BASE + timedelta(days=120)).replace(hour=0)
+    slot = day.replace(hour=10)
+    return [
+        ("overlap check (_check_overlap)",
+         "SELECT id FROM appointments WHERE doctor_id = ? AND start_time < ? AND end_time > ? AND status != 'cancelled' LIMIT 1",
+         (17, (slot + timedelta(minutes=30)).strftime(FMT), slot.strftime(FMT))),
+        ("doctor day schedule (get_schedule / booked-slots)",
+         "SELECT id FROM appointments WHERE doctor_id = ? AND start_time >= ? AND start_time < ? ORDER BY start_time",
+         (17, day.strftime(FMT), (day + timedelta(days=1)).strftime(FMT))),
+        ("patient upcoming (book_appointment rule 4)",
+         "SELECT id FROM appointments WHERE patient_id = ? AND start_time > ? AND status IN ('confirmed', 'pending') LIMIT 1",
+         (42, day.strftime(FMT))),
+        ("doctor by status (dashboard / analytics)",
+         "SELECT COUNT(*) FROM appointments WHERE doctor_id = ? AND status = ?",
+         (17, "confirmed")),
+        ("invoice by appointment",
+         "SELECT id FROM invoices WHERE appointment_id = ?",
+         (5000,)),
+        ("patient invoices (/patient/invoices)",
+         "SELECT id FROM invoices WHERE patient_id = ? ORDER BY created_at DESC",
+         (42,)),
+    ]
+
+
+def report(path: str, title: str, repeat: int = 20):
+    print(f"\n===== {title} =====")
+    conn = sqlite3.connect(path)
+    for label, sql, params in hot_queries():
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, params).fetchall()
+        avg_ms = (time.perf_counter() - started) * 1000 / repeat
+        print(f"\n- {label}: {avg_ms:.3f} ms avg")
+        for row in plan:
+            print(f"    {row[-1]}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--appointments", type=int, default=1_000_000)
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--patients", type=int, default=50_000)
+    args = parser.parse_args()
+
+    random.seed(7)
+    workdir = tempfile.mkdtemp(prefix="index_bench_")
+    path = os.path.join(workdir, "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+
+    # Schema as of before the migration: tables without the hot-path indexes
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for name in NEW_INDEXES:
+            conn.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+
+    print(f"🌱 Seeding {args.appointments:,} appointments into {path} ...")
+    started = time.perf_counter()
+    seed(path, args.appointments, args.doctors, args.patients)
+    print(f"   done in {time.perf_counter() - started:.1f}s")
+
+    report(path, "BEFORE (primary keys only)")
+
+    started = time.perf_counter()
+    applied = run_migrations(engine)
+    print(f"\n🏗️  Applied {applied or [m[0] for m in MIGRATIONS]} in {time.perf_counter() - started:.1f}s")
+    with sqlite3.connect(path) as conn:
+        conn.execute("ANALYZE")
+
+    report(path, "AFTER (composite indexes)")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Query-count Regression Check
+Seeds a throwaway SQLite database with one doctor and N patients (each with
+a visit today, an older visit and a medical record), calls the doctor
+dashboard and patient-list endpoints, and reads the per-request SQL count
+from the Server-Timing header (database before_cursor_execute hook + metrics
+middleware). The count must not grow with N: an N+1 pattern fails the run.
+
+Usage: python benchmark_query_counts.py [--sizes 5 50] [--max-queries 10]
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="query_counts_"), "clinic.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"  # read at config import
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import database
+import models
+from dependencies import create_access_token
+from main import app
+
+ENDPOINTS = ["/doctor/dashboard", "/doctor/patients"]
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+def seed(n_patients: int) -> int:
+    """Recreate the schema with one doctor and n patients. Returns the doctor's user id."""
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        hospital = models.Hospital(name="Main Branch", address="Clinic Road")
+        db.add(hospital); db.flush()
+        doc_user = models.User(full_name="Doctor", email="doctor@bench.local", role="doctor", is_email_verified=True)
+        db.add(doc_user); db.flush()
+        doctor = models.Doctor(user_id=doc_user.id, hospital_id=hospital.id)
+        db.add(doctor); db.flush()
+
+        today = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        for i in range(n_patients):
+            user = models.User(full_name=f"Patient {i}", email=f"patient{i}@bench.local", role="patient")
+            db.add(user); db.flush()
+            patient = models.Patient(user_id=user.id, age=20 + i % 50, gender="F" if i % 2 else "M")
+            db.add(patient); db.flush()
+            start = today + timedelta(minutes=10 * i)
+            db.add_all([
+                models.Appointment(doctor_id=doctor.id, patient_id=patient.id, treatment_type="Checkup",
+                                   start_time=start, end_time=start + timedelta(minutes=10), status="confirmed"),
+                models.Appointment(doctor_id=doctor.id, patient_id=patient.id, treatment_type="Cleaning",
+                                   start_time=start - timedelta(days=30), end_time=start - timedelta(days=30, minutes=-30),
+                                   status="completed"),
+                models.MedicalRecord(patient_id=patient.id, doctor_id=doctor.id, diagnosis="Routine"),
+            ])
+        db.commit()
+        return doc_user.id
+    finally:
+        db.close()
+
+
+def query_counts(client: TestClient, user_id: int) -> dict:
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": str(user_id)})}
+    counts = {}
+    for path in ENDPOINTS:
+        response = client.get(path, headers=headers)
+        if response.status_code != 200:
+            sys.exit(f"{path} returned {response.status_code}: {response.text[:200]}")
+        match = QUERIES_RE.search(response.headers.get("Server-Timing", ""))
+        if not match:
+            sys.exit(f"{path}: no query count in Server-Timing header")
+        counts[path] = int(match.group(1))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request SQL count must not grow with the number of patients.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50])
+    parser.add_argument("--max-queries", type=int, default=10)
+    args = parser.parse_args()
+
+    client = TestClient(app)  # no lifespan: scheduler/dispatchers stay off
+    results = {n: query_counts(client, seed(n)) for n in args.sizes}
+
+    print(f"  {'endpoint':<20}" + "".join(f"{f'N={n}':>8}" for n in args.sizes))
+    failures = []
+    for path in ENDPOINTS:
+        counts = [results[n][path] for n in args.sizes]
+        print(f"  {path:<20}" + "".join(f"{c:>8}" for c in counts))
+        if len(set(counts)) > 1:
+            failures.append(f"{path}: query count grows with patients {counts}")
+        if max(counts) > args.max_queries:
+            failures.append(f"{path}: {max(counts)} queries > {args.max_queries}")
+
+    if failures:
+        sys.exit("\n".join(["", "FAILED:"] + failures))
+    print("\nQuery counts are constant in N.")
+
+
+if __name__ == "__main__":
+    main()
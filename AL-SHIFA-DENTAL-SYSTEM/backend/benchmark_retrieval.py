@@ -0,0 +1,144 @@
+"""
+Retrieval Benchmark
+Indexes the knowledge_base directory into a throwaway Chroma store, then
+measures recall@k and latency for vector-only, BM25-only and hybrid (RRF)
+retrieval, plus hybrid + cross-encoder rerank when RAG_RERANKER_MODEL is set.
+These bypass the semantic query cache; a separate "vector (cached)" pass
+goes through it and reports its hit rate.
+
+Without --queries, queries are generated from the chunks themselves (rare
+terms, and the chunk's first sentence); the source chunk is the relevant hit.
+A --queries JSONL file ({"query": ..., "source": "file.pdf"}) counts a hit
+when any retrieved chunk comes from that source file.
+
+Usage: python benchmark_retrieval.py [--kb-dir knowledge_base] [--queries q.jsonl] [--max-queries 200] [--k 1 3 5]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rag.store import RAGStore
+from rag.loader import DocumentLoader
+from rag.bm25 import tokenize
+from rag.retriever import HybridRetriever, load_reranker
+
+
+def synthesize_queries(store: RAGStore, limit: int):
+    page = store.collection.get(include=["documents", "metadatas"])
+    chunks = list(zip(page["ids"], page["documents"], page["metadatas"]))
+    random.shuffle(chunks)
+
+    queries = []
+    for chunk_id, text, meta in chunks[:limit]:
+        terms = tokenize(text)
+        if not terms: continue
+        # Rarest terms across the corpus: the "drug name / code" style query
+        rare = sorted(set(terms), key=lambda t: (len(store.bm25.postings.get(t, ())), t))[:3]
+        queries.append({"kind": "terms", "query": " ".join(rare), "chunk_id": chunk_id, "source": meta.get("source")})
+
+        # Natural-language style: first body sentence, shortened
+        body = [line for line in text.split("\n") if line.strip() and not line.lstrip().startswith("#")]
+        sentence = re.split(r"(?<=[.!?])\s+", " ".join(body))[0] if body else ""
+        words = sentence.split()
+        if len(words) >= 5:
+            queries.append({"kind": "sentence", "query": " ".join(words[:12]), "chunk_id": chunk_id, "source": meta.get("source")})
+    return queries
+
+
+def load_queries(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return [dict(json.loads(line), kind="labelled") for line in f if line.strip()]
+
+
+def run(name: str, search, queries, ks, store: RAGStore):
+    max_k = max(ks)
+    hits = {k: 0 for k in ks}
+    latencies = []
+    for q in queries:
+        started = time.perf_counter()
+        ids = search(q["query"], max_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        if q.get("chunk_id"):
+            relevant = [doc_id == q["chunk_id"] for doc_id in ids]
+        else:
+            sources = store.get_documents(ids)
+            relevant = [sources.get(doc_id, ("", {}))[1].get("source") == q["source"] for doc_id in ids]
+        for k in ks:
+            if any(relevant[:k]): hits[k] += 1
+
+    n = len(queries)
+    recall = "  ".join(f"R@{k}={hits[k] / n:.3f}" for k in ks)
+    p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) >= 20 else max(latencies)
+    print(f"  {name:<16} {recall}   p50={statistics.median(latencies):.1f}ms  p95={p95:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline recall@k / latency benchmark for knowledge-base retrieval.")
+    parser.add_argument("--kb-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base"))
+    parser.add_argument("--queries", help="JSONL file of {\"query\", \"source\"} labelled queries")
+    parser.add_argument("--max-queries", type=int, default=200, help="Chunks to sample when synthesizing queries")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = RAGStore(persist_directory=os.path.join(tmp, "chroma_db"))
+        started = time.perf_counter()
+        print(DocumentLoader(store).load_directory(args.kb_dir))
+        print(f"Indexed {store.count()} chunks in {time.perf_counter() - started:.1f}s")
+        if not store.count():
+            print("Nothing to benchmark: knowledge base is empty.")
+            return
+
+        queries = load_queries(args.queries) if args.queries else synthesize_queries(store, args.max_queries)
+        if not queries:
+            print("No queries to run.")
+            return
+
+        hybrid = HybridRetriever(store, use_cache=False)
+        cached = HybridRetriever(store)
+        rankers = [
+            ("vector", hybrid.vector_ids),
+            ("bm25", hybrid.keyword_ids),
+            ("hybrid (rrf)", lambda q, k: [d["id"] for d in hybrid.retrieve(q, k)]),
+        ]
+        reranker = load_reranker()
+        if reranker:
+            reranked = HybridRetriever(store, reranker=reranker, use_cache=False)
+            rankers.append(("hybrid + rerank", lambda q, k: [d["id"] for d in reranked.retrieve(q, k)]))
+
+        # Warm the embedding model so the first query doesn't skew latency
+        hybrid.vector_ids("warm up", 1)
+
+        kinds = sorted({q["kind"] for q in queries})
+        for kind in kinds + (["all"] if len(kinds) > 1 else []):
+            subset = [q for q in queries if kind == "all" or q["kind"] == kind]
+            print(f"\n[{kind}] {len(subset)} queries")
+            for name, search in rankers:
+                run(name, search, subset, args.k, store)
+
+            # Same queries through the semantic cache, starting cold for each pass
+            store.query_cache.invalidate()
+            before = store.query_cache.stats()
+            run("vector (cached)", cached.vector_ids, subset, args.k, store)
+            after = store.query_cache.stats()
+            exact = after["exact_hits"] - before["exact_hits"]
+            semantic = after["semantic_hits"] - before["semantic_hits"]
+            lookups = exact + semantic + after["misses"] - before["misses"]
+            print(f"  {'':<16} cache: exact={exact} semantic={semantic} "
+                  f"hit_rate={(exact + semantic) / lookups if lookups else 0.0:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Intent Router Check
+Runs agent/router.py's IntentRouter.classify over labelled doctor queries:
+ones that must take a fast path (today's schedule, low stock, price list)
+and ones that must fall through to the LLM (dates, writes, specific items,
+analysis, negations such as "who is not coming today"). Prints each
+decision with its score and the mean classify latency; any misrouted query
+fails the run.
+
+Usage: python benchmark_router.py [--repeat 200]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agent.router import IntentRouter
+
+# query -> expected fast-path intent (None = must go to the LLM)
+CASES = [
+    ("who is coming today", "todays_schedule"),
+    ("Show today's schedule", "todays_schedule"),
+    ("who do i have today", "todays_schedule"),
+    ("what is running low", "low_stock"),
+    ("anything low in stock?", "low_stock"),
+    ("what should i order", "low_stock"),
+    ("show price list", "price_list"),
+    ("what treatments do i offer", "price_list"),
+    # Negations: the nearest phrase means the opposite
+    ("who is not coming today", None),
+    ("Who isn't coming today?", None),
+    ("no appointments today?", None),
+    ("what isn't running low", None),
+    ("what treatments don't i offer", None),
+    ("list all treatments without prices", None),
+    # Dates, writes, specific entities, analysis
+    ("who is coming tomorrow", None),
+    ("appointments on 2026-03-02", None),
+    ("add 5 gloves to stock", None),
+    ("cancel my 3pm appointment", None),
+    ("revenue this month", None),
+    ("what do i have now", None),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fast-path decisions of the agent intent router.")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    router = IntentRouter()
+    failures = []
+    print(f"  {'query':<38} {'expected':<16} {'got':<16} {'score':>6}")
+    for query, expected in CASES:
+        intent, score = router.classify(query)
+        mark = "" if intent == expected else "  <-- FAIL"
+        print(f"  {query:<38} {str(expected):<16} {str(intent):<16} {score:>6.1f}{mark}")
+        if intent != expected:
+            failures.append(f"{query!r}: expected {expected}, got {intent} ({score:.1f})")
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        for query, _ in CASES:
+            router.classify(query)
+    seconds = time.perf_counter() - started
+    print(f"\nclassify: {seconds / (args.repeat * len(CASES)) * 1e6:.0f} us/query")
+
+    if failures:
+        sys.exit("\n".join(["", "FAILED:"] + failures))
+    print(f"All {len(CASES)} queries routed as expected.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+SMTP Benchmark
+Runs a local aiosmtpd server (plain SMTP + AUTH, optional simulated
+round-trip latency per reply) and sends N emails three ways:
+  - per-message: new connection + EHLO + LOGIN + QUIT for every email (old EmailAdapter)
+  - pooled:      EmailAdapter.send() over notifications.smtp_pool
+  - batched:     EmailAdapter.send_many() (one session, back-to-back sendmail)
+Then restarts the server under the pool to check reconnect-on-failure.
+
+Requires: pip install aiosmtpd
+Usage: python benchmark_smtp.py [--emails 200] [--rtt-ms 20] [--port 8025]
+"""
+
+import argparse
+import asyncio
+import os
+import smtplib
+import sys
+import logging
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+USER, PASSWORD = "bench@clinic.local", "secret"
+os.environ["EMAIL_USER"] = USER  # sender address used by EmailAdapter (read at config import)
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import SMTP, AuthResult
+except ImportError:
+    sys.exit("aiosmtpd is not installed: pip install aiosmtpd")
+logging.getLogger("mail.log").setLevel(logging.ERROR)  # aiosmtpd's per-session chatter
+
+from notifications.email import EmailAdapter
+from notifications.smtp_pool import SMTPConnectionPool
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+
+class LatencySMTP(SMTP):
+    """Delays every reply by the simulated network round-trip."""
+    rtt = 0.0
+
+    async def push(self, status):
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        await super().push(status)
+
+
+class BenchController(Controller):
+    def factory(self):
+        return LatencySMTP(self.handler, **self.SMTP_kwargs)
+
+
+def start_server(handler, port: int, rtt: float) -> Controller:
+    LatencySMTP.rtt = rtt
+    controller = BenchController(
+        handler, hostname="127.0.0.1", port=port,
+        authenticator=lambda server, session, envelope, mechanism, auth_data: AuthResult(success=True),
+        auth_require_tls=False
+    )
+    controller.start()
+    return controller
+
+
+def per_message_send(port: int, to_email: str, message: str):
+    with smtplib.SMTP("127.0.0.1", port) as server:
+        server.ehlo()
+        server.login(USER, PASSWORD)
+        server.sendmail(USER, to_email, message)
+
+
+def run(name: str, total: int, func):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"  {name:<12} {elapsed:>8.2f} s  {elapsed / total * 1000:>8.2f} ms/email")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-message SMTP connections vs the pooled session manager.")
+    parser.add_argument("--emails", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="Simulated round-trip per SMTP reply")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    handler = CountingHandler()
+    controller = start_server(handler, args.port, args.rtt_ms / 1000)
+    pool = SMTPConnectionPool(host="127.0.0.1", port=args.port, user=USER, password=PASSWORD,
+                              security="none", size=1, idle_timeout=60, max_messages=10_000)
+    adapter = EmailAdapter(pool=pool)
+
+    emails = [{"to_email": f"patient{i}@example.com", "subject": f"Reminder #{i}",
+               "body": "Your appointment is tomorrow at 10:00.", "html_body": "<p>Your appointment is tomorrow.</p>"}
+              for i in range(args.emails)]
+    messages = [(e["to_email"], EmailAdapter.build_message(e["to_email"], e["subject"], e["body"], e["html_body"]))
+                for e in emails]
+
+    print(f"{args.emails} emails, simulated RTT {args.rtt_ms:.0f} ms per SMTP reply\n")
+    try:
+        base = run("per-message", args.emails, lambda: [per_message_send(args.port, to, msg) for to, msg in messages])
+        pooled = run("pooled", args.emails, lambda: [adapter.send(**e) for e in emails])
+        batched = run("batched", args.emails, lambda: adapter.send_many(emails))
+        print(f"\n  speed-up: pooled x{base / pooled:.1f}, batched x{base / batched:.1f}")
+        print(f"  server received {handler.received} / {args.emails * 3}")
+
+        # Server restart drops the pooled session: next send must reconnect transparently
+        controller.stop()
+        controller = start_server(handler, args.port, args.rtt_ms / 1000)
+        adapter.send(**emails[0])
+        stats = pool.stats()
+        print(f"  after server restart: reconnects={stats['reconnects']} connects={stats['connects']} "
+              f"failures={stats['failures']}")
+        if stats["reconnects"] != 1:
+            sys.exit("reconnect-on-failure did not happen")
+    finally:
+        pool.close_all()
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Notification Template Benchmark
+Renders N personalised appointment reminders (subject + text + HTML) four ways:
+  - f-string:       inline f-string text body (how NotificationService built emails; no HTML part)
+  - compile each:   jinja2 template compiled from source for every message (ad-hoc
+                    templating; timed on the first --compile-sample messages, it is slow)
+  - render():       notifications.template_registry, one call per message
+  - render_many():  the registry's bulk API, one pass (scheduler reminder job)
+Then times the scheduler's reminder job end to end on a scratch retry queue:
+render() + enqueue() per message vs render_many() + enqueue_many().
+Reports compile time for the whole registry and messages/second. The
+registry's plain-text output must equal the f-string's.
+
+Usage: python benchmark_templates.py [--messages 5000] [--repeat 3] [--compile-sample 200]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from jinja2 import Environment
+
+from infra.retry_queue import RetryQueue
+from notifications.service import NotificationService
+from notifications.template_registry import TemplateRegistry, _strftime
+
+TREATMENTS = ["Root Canal", "Scaling & Polishing", "", "Filling", "Braces <Review>"]
+
+
+def make_contexts(n: int):
+    start = datetime(2026, 3, 2, 9, 0)
+    return [{
+        "appointment_id": i,
+        "patient_email": f"patient{i}@example.com",
+        "patient_name": f"Patient {i}",
+        "doctor_name": f"Doctor {i % 17}",
+        "treatment": TREATMENTS[i % len(TREATMENTS)],
+        "start_time": (start + timedelta(minutes=30 * i)).isoformat(),
+        "location": "Al-Shifa Dental Clinic, Main Branch",
+    } for i in range(n)]
+
+
+def fstring_reminder(c: dict):
+    start = datetime.fromisoformat(c["start_time"])
+    treatment = f"Treatment: {c['treatment']}\n" if c["treatment"] else ""
+    subject = f"Reminder: Your Appointment on {start.strftime('%a, %d %b at %I:%M %p')}"
+    body = f"""
+Dear {c['patient_name']},
+
+This is a reminder of your upcoming appointment.
+
+Doctor: Dr. {c['doctor_name']}
+{treatment}Time: {start.strftime('%A, %d %b %Y at %I:%M %p')}
+Location: {c['location']}
+
+Please arrive 10 minutes early. If you can't make it, cancel or reschedule from your patient portal.
+
+Best regards,
+Al-Shifa Dental Clinic
+"""
+    return subject, body.strip(), None
+
+
+def timed(func, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render throughput of the notification template registry.")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--compile-sample", type=int, default=200)
+    args = parser.parse_args()
+
+    contexts = make_contexts(args.messages)
+
+    started = time.perf_counter()
+    registry = TemplateRegistry()
+    count = registry.load()
+    print(f"Compiled {count} notifications in {(time.perf_counter() - started) * 1000:.1f} ms")
+    print(f"{args.messages} reminders\n")
+
+    # Ad-hoc: a fresh environment compiling the same sources per message
+    loader_env = registry.env
+    text_source = loader_env.loader.get_source(loader_env, "appointment_reminder.txt.j2")[0]
+    adhoc_env = Environment(loader=loader_env.loader, autoescape=loader_env.autoescape,
+                            undefined=loader_env.undefined, trim_blocks=True, lstrip_blocks=True, cache_size=0)
+    adhoc_env.filters["strftime"] = _strftime
+
+    def compile_each():
+        out = []
+        for c in contexts[:args.compile_sample]:
+            text = adhoc_env.from_string(text_source)
+            html = adhoc_env.get_template("appointment_reminder.html.j2")  # cache_size=0: recompiled
+            ctx = text.new_context(c)
+            out.append(("".join(text.blocks["subject"](ctx)).strip(),
+                        "".join(text.blocks["body"](ctx)).strip(), html.render(c)))
+        return out
+
+    rows = [
+        ("f-string", lambda: [fstring_reminder(c) for c in contexts]),
+        ("compile each", compile_each),
+        ("render()", lambda: [tuple(registry.render("appointment_reminder", **c)) for c in contexts]),
+        ("render_many()", lambda: [tuple(m) for m in registry.render_many("appointment_reminder", contexts)]),
+    ]
+    print(f"  {'method':<14} {'us/msg':>8} {'msgs/s':>10}")
+    outputs = {}
+    for name, func in rows:
+        seconds, result = timed(func, args.repeat)
+        outputs[name] = result
+        print(f"  {name:<14} {seconds / len(result) * 1e6:>8.1f} {len(result) / seconds:>10.0f}")
+
+    text_mismatches = sum(1 for a, b in zip(outputs["f-string"], outputs["render_many()"]) if a[:2] != b[:2])
+    bulk_mismatches = sum(1 for a, b in zip(outputs["render()"], outputs["render_many()"]) if a != b)
+    escaped = "&lt;Review&gt;" in outputs["render_many()"][4][2]
+    print(f"\nText vs f-string mismatches: {text_mismatches}, render() vs render_many(): {bulk_mismatches}, "
+          f"HTML autoescaped: {escaped}")
+    if text_mismatches or bulk_mismatches or not escaped:
+        sys.exit(1)
+
+    # Reminder job end to end: render + persist each job on a scratch retry queue
+    print(f"\n  {'reminder job':<26} {'total s':>8} {'msgs/s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = RetryQueue(path=os.path.join(tmp, "per_message.db"))
+        service = NotificationService(retry_queue=queue)
+
+        def per_message():
+            for c in contexts:
+                m = registry.render("appointment_reminder", **c)
+                queue.enqueue("notification.email",
+                              {"to_email": c["patient_email"], "subject": m.subject, "body": m.text, "html_body": m.html},
+                              idempotency_key=f"reminder:{c['appointment_id']}:{c['start_time']}")
+
+        for name, func in (("render() + enqueue()", per_message),
+                           ("send_appointment_reminders", lambda: service.send_appointment_reminders(contexts))):
+            started = time.perf_counter()
+            func()
+            seconds = time.perf_counter() - started
+            print(f"  {name:<26} {seconds:>8.2f} {len(contexts) / seconds:>10.0f}")
+            queue.conn.execute("DELETE FROM retry_jobs")
+        # Second run of the job: idempotency keys already present, nothing new queued
+        service.send_appointment_reminders(contexts)
+        queued = queue.conn.execute("SELECT COUNT(*) FROM retry_jobs").fetchone()[0]
+        service.send_appointment_reminders(contexts)
+        requeued = queue.conn.execute("SELECT COUNT(*) FROM retry_jobs").fetchone()[0] - queued
+        print(f"\n  re-run of the reminder job queued {requeued} duplicates")
+        queue.conn.close()
+        if requeued:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Tool-call Parser Benchmark
+Generates N fuzzed model outputs (well-formed, malformed and tag-free text,
+each with the calls it really contains) and compares the old permissive
+regex fallback (per-match name-set rebuild + 3 cleanup passes) with
+agent.tool_parser on whole messages and on random streamed chunks.
+
+Reports time per message, missed/spurious calls and leaked tag text.
+Streamed parsing must give exactly the same result as whole-message parsing.
+
+Usage: python benchmark_tool_parser.py [--messages 5000] [--seed 7] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from agent.tool_parser import ToolCallGrammar
+
+TOOL_NAMES = [
+    "list_doctors", "get_doctor_treatments", "check_availability", "search_availability",
+    "get_my_appointments", "cancel_appointment", "book_appointment", "reschedule_appointment",
+    "book_followup",
+]
+# Mirrors PatientBrain.tools_schema (the old parser rebuilt this list per match)
+TOOLS_SCHEMA = [{"type": "function", "function": {"name": n}} for n in TOOL_NAMES]
+
+PROSE = [
+    "Sure, let me check that for you.", "Here are the available doctors:", "Dr. Ahmed is free at 10:00.",
+    "Your appointment is confirmed.", "Please choose a slot [Book Now] [View Slots]",
+    "Use <b>bold</b> for emphasis, e.g. a=b > c.", "Result: value=\"x\" and more>", "No tools needed here.",
+]
+ARGS = [
+    {}, {"doctor_id": "3"}, {"doctor_id": 2, "date": "2026-02-12", "time": "10:00", "reason": "Checkup"},
+    {"appointment_id": 15}, {"doctor_id": "Dr. Sara", "date": "2026-03-01", "days": 3},
+]
+
+
+def make_case(rng: random.Random):
+    """(text, [(name, args_json), ...] actually intended as valid calls)."""
+    parts, expected = [], []
+    for _ in range(rng.randint(1, 3)):
+        if rng.random() < 0.4:
+            parts.append(rng.choice(PROSE))
+            continue
+        name = rng.choice(TOOL_NAMES)
+        args = rng.choice(ARGS)
+        body = json.dumps(args)
+        form = rng.randrange(9)
+        if form == 0: text = f"<function={name}>{body}</function>"
+        elif form == 1: text = f'<function="{name}">{body}</function>'
+        elif form == 2: text = f"<function={name}{body}</function>"
+        elif form == 3: text = f"{name}>{body}</function>"
+        elif form == 4: text = f"<function={name}>({body})</function>"
+        elif form == 5: text = f"<function=unknown_tool>{body}</function>"; name = None
+        elif form == 6: text = f"<function={name}>{body[:-1]}</function>"; name = None   # truncated JSON
+        elif form == 7: text = f"<function={name}>[1, 2]</function>"; name = None      # not an object
+        else: text = f"<function={name}>{body}"                                         # unterminated
+        if name and form == 8 and rng.random() < 0.5:
+            # Unterminated tags only end cleanly at end of text
+            parts.append(text)
+            expected.append((name, json.dumps(args)))
+            break
+        parts.append(text)
+        if name: expected.append((name, json.dumps(args)))
+    return " ".join(parts), expected
+
+
+# --- Legacy fallback (as PatientBrain had it) ---
+def legacy_parse(content: str):
+    calls = []
+    pattern = r'(?:<function=)?([\w_]+)(?:>|=")(.*?)(?:</function>|")?'
+    for match in re.finditer(pattern, content, re.DOTALL):
+        name = match.group(1).strip()
+        args_str = match.group(2).strip()
+        if args_str.endswith(")") and not args_str.endswith("})"):
+            args_str = args_str[:-1]
+        valid_tools = [t["function"]["name"] for t in TOOLS_SCHEMA]
+        if name not in valid_tools: continue
+        try:
+            if not args_str: args_str = "{}"
+            calls.append((name, json.dumps(json.loads(args_str))))
+        except Exception:
+            continue
+    return calls
+
+
+def legacy_finalize(text: str) -> str:
+    text = re.sub(r'<function=.*?>.*?</function>', '', text, flags=re.DOTALL)
+    text = re.sub(r'[\w_]+>.*?<\/function>', '', text, flags=re.DOTALL)
+    return re.sub(r'<function=.*?>', '', text)
+
+
+def score(results, cases):
+    missed = spurious = leaked = 0
+    for (calls, visible), (text, expected) in zip(results, cases):
+        remaining = list(expected)
+        for call in calls:
+            if call in remaining: remaining.remove(call)
+            else: spurious += 1
+        missed += len(remaining)
+        if "function" in visible or "</" in visible.replace("</b>", ""):
+            leaked += 1
+    return missed, spurious, leaked
+
+
+def timed(func, cases, repeat):
+    best, results = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = [func(text) for text, _ in cases]
+        best = min(best, time.perf_counter() - started)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz + speed benchmark for agent.tool_parser.")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cases = [make_case(rng) for _ in range(args.messages)]
+    total_calls = sum(len(e) for _, e in cases)
+    print(f"{len(cases)} fuzzed messages, {total_calls} valid calls\n")
+
+    grammar = ToolCallGrammar(TOOL_NAMES)
+
+    def compiled(text):
+        result = grammar.parse(text)
+        return [(c.function.name, c.function.arguments) for c in result.calls], result.visible
+
+    def streamed(text, chunk_rng=random.Random(args.seed)):
+        p = grammar.parser()
+        visible, i = [], 0
+        while i < len(text):
+            n = chunk_rng.randint(1, 8)
+            visible.append(p.feed(text[i:i + n]))
+            i += n
+        visible.append(p.close())
+        return [(c.function.name, c.function.arguments) for c in p.calls], "".join(visible)
+
+    rows = [
+        ("legacy regex", lambda text: (legacy_parse(text), legacy_finalize(text))),
+        ("compiled", compiled),
+        ("streamed", streamed),
+    ]
+    print(f"  {'parser':<14} {'us/msg':>8} {'missed':>7} {'spurious':>9} {'leaked':>7}")
+    outputs = {}
+    for name, func in rows:
+        seconds, results = timed(func, cases, args.repeat)
+        outputs[name] = results
+        missed, spurious, leaked = score(results, cases)
+        print(f"  {name:<14} {seconds / len(cases) * 1e6:>8.1f} {missed:>7} {spurious:>9} {leaked:>7}")
+
+    mismatches = sum(1 for a, b in zip(outputs["compiled"], outputs["streamed"]) if a != b)
+    print(f"\nStreamed vs whole-message mismatches: {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
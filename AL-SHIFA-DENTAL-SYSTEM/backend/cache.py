@@ -1,12 +1,51 @@
 """
 Simple in-memory cache for agent responses to improve performance.
 Caches responses for frequently asked questions.
+
+LRU + TTL on an OrderedDict (O(1) get/set/evict), guarded by a lock since
+sync routes run in FastAPI's threadpool. Entries carry a namespace (e.g.
+"doctor:12") and tags (e.g. "appointments") so writes can drop exactly the
+answers they make stale. Committed ORM writes to the tables in
+TABLE_DOMAINS invalidate matching entries automatically (see bottom).
 """
 
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional, Dict, Any, Iterable
 import hashlib
 
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from infra.metrics import request_metrics
+
+# Table -> data domain used as a cache tag. Tables with a doctor_id column
+# (and doctors itself, by id) only invalidate that doctor's namespace; the
+# rest are clinic-wide. Doctor.scheduling_config drives availability and
+# working hours, which the appointment tools answer from.
+TABLE_DOMAINS = {
+    "appointments": "appointments",
+    "doctors": "appointments",
+    "invoices": "invoices",
+    "inventory": "inventory",
+    "treatment_inventory_links": "inventory",
+    "treatments": "treatments",
+    "patients": "patients",
+    "medical_records": "patients",
+}
+
+
+class _Entry:
+    __slots__ = ("response", "expires_at", "namespace", "tags")
+
+    def __init__(self, response: str, expires_at: float, namespace: Optional[str], tags: frozenset):
+        self.response = response
+        self.expires_at = expires_at
+        self.namespace = namespace
+        self.tags = tags
+
+
 class ResponseCache:
     def __init__(self, ttl_minutes: int = 30, max_size: int = 100):
         """
@@ -14,53 +53,128 @@ class ResponseCache:
             ttl_minutes: Time-to-live for cached responses in minutes
             max_size: Maximum number of cached items
         """
-        self.cache: Dict[str, tuple[str, datetime]] = {}
-        self.ttl = timedelta(minutes=ttl_minutes)
+        self.cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.ttl_seconds = ttl_minutes * 60
         self.max_size = max_size
-    
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
     def _get_key(self, query: str, user_id: int) -> str:
         """Generate cache key from query and user"""
         combined = f"{user_id}:{query.lower().strip()}"
         return hashlib.md5(combined.encode()).hexdigest()
-    
+
     def get(self, query: str, user_id: int) -> Optional[str]:
         """Retrieve cached response if available and valid"""
         key = self._get_key(query, user_id)
-        
-        if key in self.cache:
-            response, timestamp = self.cache[key]
-            
+        now = time.monotonic()
+
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
             # Check if expired
-            if datetime.now() - timestamp < self.ttl:
-                return response
-            else:
-                # Remove expired entry
+            if entry.expires_at <= now:
                 del self.cache[key]
-        
-        return None
-    
-    def set(self, query: str, user_id: int, response: str):
-        """Cache a response"""
-        # Evict oldest if at capacity
-        if len(self.cache) >= self.max_size:
-            # Remove oldest entry
-            oldest_key = min(self.cache.items(), key=lambda x: x[1][1])[0]
-            del self.cache[oldest_key]
-        
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry.response
+
+    def set(self, query: str, user_id: int, response: str, namespace: str = None, tags: Iterable[str] = ()):
+        """Cache a response, evicting the least recently used entry when full"""
         key = self._get_key(query, user_id)
-        self.cache[key] = (response, datetime.now())
-    
+        entry = _Entry(response, time.monotonic() + self.ttl_seconds, namespace, frozenset(tags))
+
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+            self.cache[key] = entry
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, namespace: str = None, tags: Iterable[str] = None) -> int:
+        """
+        Drop entries matching `namespace` and/or any of `tags`.
+        Both given -> entry must match both. Neither given -> no-op (use clear()).
+        Returns the number of entries removed.
+        """
+        tags = frozenset(tags or ())
+        if namespace is None and not tags:
+            return 0
+
+        with self.lock:
+            doomed = [
+                key for key, entry in self.cache.items()
+                if (namespace is None or entry.namespace == namespace)
+                and (not tags or not entry.tags.isdisjoint(tags))
+            ]
+            for key in doomed:
+                del self.cache[key]
+            self.invalidations += len(doomed)
+            return len(doomed)
+
     def clear(self):
         """Clear all cached responses"""
-        self.cache.clear()
-    
+        with self.lock:
+            self.cache.clear()
+
     def stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
-        return {
-            "size": len(self.cache),
-            "max_size": self.max_size,
-            "ttl_minutes": self.ttl.total_seconds() / 60
-        }
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.cache),
+                "max_size": self.max_size,
+                "ttl_minutes": self.ttl_seconds / 60,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
 
 # Global cache instance
 response_cache = ResponseCache(ttl_minutes=30, max_size=100)
+request_metrics.register_collector("agent_response_cache", response_cache.stats)
+
+
+# --- WRITE-AWARE INVALIDATION ---
+def _pending_invalidations(session) -> set:
+    return session.info.setdefault("response_cache_invalidations", set())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_invalidations(session, flush_context):
+    """Record (namespace, domain) for every written row; applied on commit."""
+    pending = None
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        domain = TABLE_DOMAINS.get(getattr(obj, "__tablename__", None))
+        if not domain: continue
+        if pending is None: pending = _pending_invalidations(session)
+        doctor_id = obj.id if obj.__tablename__ == "doctors" else getattr(obj, "doctor_id", None)
+        pending.add((f"doctor:{doctor_id}" if doctor_id else None, domain))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_invalidations(session):
+    pending = session.info.pop("response_cache_invalidations", None)
+    if not pending: return
+    for namespace, domain in pending:
+        response_cache.invalidate(namespace=namespace, tags=[domain])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_invalidations(session):
+    session.info.pop("response_cache_invalidations", None)
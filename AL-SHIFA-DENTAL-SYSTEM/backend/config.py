@@ -12,6 +12,17 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 1440)
 # Database Configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./dental_clinic.db")
 
+# Connection Pool (Postgres / server databases)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# SQLite Tuning (applied on every new connection)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 268435456))  # 256 MB
+
 # AI Configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -20,6 +31,41 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 # Agent Settings
 MAX_AGENT_STEPS = 5
 
+# Agent chat sessions: "sqlite" (shared across workers) or "memory" (per process)
+AGENT_SESSION_BACKEND = os.getenv("AGENT_SESSION_BACKEND", "sqlite")
+AGENT_SESSION_DB = os.getenv(
+    "AGENT_SESSION_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "agent_sessions.db")
+)
+AGENT_SESSION_TTL_MINUTES = int(os.getenv("AGENT_SESSION_TTL_MINUTES", 60))
+AGENT_SESSION_MAX = int(os.getenv("AGENT_SESSION_MAX", 1000))
+
+# Agent prompt history: token budget, exchanges kept, tool output caps (chars)
+AGENT_HISTORY_TOKEN_BUDGET = int(os.getenv("AGENT_HISTORY_TOKEN_BUDGET", 6000))
+AGENT_HISTORY_KEEP_EXCHANGES = int(os.getenv("AGENT_HISTORY_KEEP_EXCHANGES", 4))
+AGENT_TOOL_OUTPUT_MAX_CHARS = int(os.getenv("AGENT_TOOL_OUTPUT_MAX_CHARS", 4000))
+AGENT_OLD_TOOL_OUTPUT_MAX_CHARS = int(os.getenv("AGENT_OLD_TOOL_OUTPUT_MAX_CHARS", 400))
+
+# Local intent router: fuzzy score (0-100) and lead over the next intent to skip the LLM
+AGENT_ROUTER_ENABLED = os.getenv("AGENT_ROUTER_ENABLED", "true").lower() == "true"
+AGENT_ROUTER_MIN_SCORE = float(os.getenv("AGENT_ROUTER_MIN_SCORE", 88))
+AGENT_ROUTER_MIN_MARGIN = float(os.getenv("AGENT_ROUTER_MIN_MARGIN", 5))
+
+# Knowledge Base Ingestion (PDF extraction/chunking worker processes)
+RAG_INGEST_PROCESSES = int(os.getenv("RAG_INGEST_PROCESSES", 2))
+# Job status files (one JSON per upload), beside kb_manifest.json so every worker can answer polls
+RAG_JOB_STATUS_DIR = os.getenv("RAG_JOB_STATUS_DIR", "./data/kb_jobs")
+# Chunk size in (estimated) tokens; the default embedder truncates at 256 word pieces
+RAG_CHUNK_MAX_TOKENS = int(os.getenv("RAG_CHUNK_MAX_TOKENS", 200))
+RAG_CHUNK_OVERLAP_TOKENS = int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", 40))
+
+# Knowledge Base Retrieval (hybrid BM25 + vector, optional cross-encoder rerank)
+RAG_RETRIEVAL_CANDIDATES = int(os.getenv("RAG_RETRIEVAL_CANDIDATES", 20))
+RAG_RERANKER_MODEL = os.getenv("RAG_RERANKER_MODEL", "")  # e.g. cross-encoder/ms-marco-MiniLM-L-6-v2
+
+# Semantic cache in front of knowledge-base vector search
+RAG_QUERY_CACHE_THRESHOLD = float(os.getenv("RAG_QUERY_CACHE_THRESHOLD", 0.92))
+RAG_QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", 512))
+
 # EMAIL CONFIGURATION (SMTP)
 EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp.gmail.com")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT", 465))
@@ -28,6 +74,43 @@ EMAIL_USER = os.getenv("EMAIL_USER")
 _raw_password = os.getenv("EMAIL_PASSWORD", "")
 EMAIL_PASSWORD = _raw_password.replace(" ", "")
 
+# "ssl", "starttls" or "none"; empty picks by port (587 -> starttls, else ssl)
+EMAIL_SECURITY = os.getenv("EMAIL_SECURITY", "").lower()
+# Persistent SMTP sessions (see notifications/smtp_pool.py)
+EMAIL_SMTP_POOL_SIZE = int(os.getenv("EMAIL_SMTP_POOL_SIZE", 2))
+EMAIL_SMTP_IDLE_TIMEOUT = int(os.getenv("EMAIL_SMTP_IDLE_TIMEOUT", 60))
+EMAIL_SMTP_MAX_MESSAGES = int(os.getenv("EMAIL_SMTP_MAX_MESSAGES", 100))
+EMAIL_SMTP_TIMEOUT = int(os.getenv("EMAIL_SMTP_TIMEOUT", 30))
+
+# Notification outbox dispatcher (see notifications/outbox.py)
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 4))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", 5))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", 10))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", 3600))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", 300))
+
+# Persistent retry queue for email/WhatsApp (see infra/retry_queue.py)
+RETRY_QUEUE_DB = os.getenv("RETRY_QUEUE_DB", "./data/retry_queue.db")
+RETRY_QUEUE_WORKERS = int(os.getenv("RETRY_QUEUE_WORKERS", 4))
+RETRY_QUEUE_MAX_ATTEMPTS = int(os.getenv("RETRY_QUEUE_MAX_ATTEMPTS", 6))
+RETRY_QUEUE_BACKOFF_BASE_SECONDS = float(os.getenv("RETRY_QUEUE_BACKOFF_BASE_SECONDS", 5))
+RETRY_QUEUE_BACKOFF_MAX_SECONDS = float(os.getenv("RETRY_QUEUE_BACKOFF_MAX_SECONDS", 1800))
+RETRY_QUEUE_POLL_SECONDS = float(os.getenv("RETRY_QUEUE_POLL_SECONDS", 2))
+RETRY_QUEUE_LEASE_SECONDS = int(os.getenv("RETRY_QUEUE_LEASE_SECONDS", 300))
+RETRY_QUEUE_RETENTION_HOURS = float(os.getenv("RETRY_QUEUE_RETENTION_HOURS", 24))
+
+# Inventory alert digests: per-doctor batching window, repeat suppression (see notifications/alert_digest.py)
+ALERT_DIGEST_WINDOW_SECONDS = float(os.getenv("ALERT_DIGEST_WINDOW_SECONDS", 300))
+ALERT_DIGEST_DEDUPE_HOURS = float(os.getenv("ALERT_DIGEST_DEDUPE_HOURS", 24))
+
+# Notification templates (Jinja, compiled at startup) and appointment reminder lead time
+NOTIFICATION_TEMPLATE_DIR = os.getenv(
+    "NOTIFICATION_TEMPLATE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "notifications", "templates")
+)
+APPOINTMENT_REMINDER_HOURS = float(os.getenv("APPOINTMENT_REMINDER_HOURS", 24))
+
 EMAIL_FROM_NAME = os.getenv("EMAIL_FROM_NAME", "Al-Shifa Dental System")
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin@system.com")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "Admin@123")
\ No newline at end of file
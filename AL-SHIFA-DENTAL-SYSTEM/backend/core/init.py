@@ -7,9 +7,11 @@ import bcrypt
 import models
 import database
 import config
+from core.migrations import run_migrations
 
 def init_db():
     models.Base.metadata.create_all(bind=database.engine)
+    run_migrations(database.engine)
 
 def create_default_admin(db: Session):
     admin_email = config.ADMIN_EMAIL
@@ -44,8 +46,48 @@ async def lifespan(app: FastAPI):
     finally:
         db.close()
     
+    # Build the shared RAG store + load the embedding model once, not per chat
+    try:
+        from rag.store import get_rag_store
+        get_rag_store().warm_up()
+        print("✅ [Startup] Knowledge base ready.")
+    except Exception as e:
+        print(f"⚠️ [Startup] Knowledge base init failed (will retry on first use): {e}")
+
+    # Compile notification templates once (reminders/confirmations render from these)
+    try:
+        from notifications.template_registry import template_registry
+        print(f"✅ [Startup] {template_registry.load()} notification templates compiled.")
+    except Exception as e:
+        print(f"⚠️ [Startup] Notification templates failed to compile: {e}")
+
     # Start background scheduler
     from agent.scheduler import proactive_system
     proactive_system.start()
+
+    # Send queued notifications outside request handlers
+    from notifications.outbox import outbox_dispatcher
+    outbox_dispatcher.start()
+
+    # Run persisted retry jobs
+    from notifications.service import register_retry_handlers
+    from infra.retry_queue import retry_queue
+    register_retry_handlers(retry_queue)
+    retry_queue.start()
     
     yield
+
+    outbox_dispatcher.stop()
+
+    # Queue due inventory digests before the retry queue stops (open windows persist in the DB)
+    from notifications.alert_digest import alert_aggregator
+    alert_aggregator.flush_due()
+    retry_queue.stop()
+
+    # Shutdown: stop knowledge-base ingestion workers
+    from rag.jobs import ingestion_jobs
+    ingestion_jobs.shutdown()
+
+    # Close pooled SMTP sessions politely (QUIT)
+    from notifications.smtp_pool import smtp_pool
+    smtp_pool.close_all()
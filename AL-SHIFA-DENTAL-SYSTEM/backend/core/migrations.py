@@ -0,0 +1,70 @@
+"""
+Lightweight versioned schema migrations.
+
+`create_all()` only creates missing tables; it never adds indexes or columns
+to tables that already exist in a deployed database. Each migration below runs
+exactly once per database and is recorded in the `schema_migrations` table.
+Migrations must be idempotent (fresh databases already get the objects from
+`create_all()`), so they use `checkfirst` / inspection before altering anything.
+"""
+
+from datetime import datetime
+from sqlalchemy import Table, Column, String, DateTime, MetaData, select
+
+import models
+
+_meta = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("id", String, primary_key=True),
+    Column("applied_at", DateTime),
+)
+
+
+def _find_index(name: str):
+    for table in models.Base.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(f"Index {name} is not declared in models.py")
+
+
+def _create_indexes(*names):
+    def apply(conn):
+        for name in names:
+            _find_index(name).create(bind=conn, checkfirst=True)
+    return apply
+
+
+# Ordered list of (migration_id, callable(connection))
+MIGRATIONS = [
+    ("0001_hot_path_indexes", _create_indexes(
+        "ix_appointments_doctor_start",
+        "ix_appointments_patient_start_status",
+        "ix_appointments_doctor_status",
+        "ix_invoices_appointment",
+        "ix_invoices_patient_created",
+    )),
+]
+
+
+def run_migrations(engine) -> list:
+    """Apply pending migrations in order. Returns the ids that were applied."""
+    _meta.create_all(bind=engine)
+    applied_now = []
+    with engine.begin() as conn:
+        applied = set(conn.execute(select(schema_migrations.c.id)).scalars())
+        for migration_id, apply in MIGRATIONS:
+            if migration_id in applied:
+                continue
+            apply(conn)
+            conn.execute(schema_migrations.insert().values(id=migration_id, applied_at=datetime.utcnow()))
+            applied_now.append(migration_id)
+            print(f"✅ [Migration] Applied {migration_id}")
+    return applied_now
+
+
+if __name__ == "__main__":
+    import database
+    run_migrations(database.engine)
@@ -1,17 +1,159 @@
-from sqlalchemy import create_engine
+import time
+from threading import Lock
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+import config
 from config import DATABASE_URL
+from infra.metrics import request_metrics
 
 # Determine if we are using SQLite
 is_sqlite = DATABASE_URL.startswith("sqlite")
 
 
-# Create the engine with appropriate arguments
-# connect_args = {"check_same_thread": False} if is_sqlite else {}
+class PoolMetrics:
+    """
+    Thread-safe counters for connection pool and session usage.
+    Lets us see when get_db sessions starve the FastAPI threadpool.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.active_sessions = 0
+        self.peak_active_sessions = 0
+
+    def record_wait(self, seconds: float):
+        with self.lock:
+            self.waits += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def on_checkout(self):
+        with self.lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def on_checkin(self):
+        with self.lock:
+            self.checkins += 1
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def on_connect(self):
+        with self.lock:
+            self.connects += 1
+
+    def session_opened(self):
+        with self.lock:
+            self.active_sessions += 1
+            self.peak_active_sessions = max(self.peak_active_sessions, self.active_sessions)
+
+    def session_closed(self):
+        with self.lock:
+            self.active_sessions = max(0, self.active_sessions - 1)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "checked_out": self.checked_out,
+                "peak_checked_out": self.peak_checked_out,
+                "waits": self.waits,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "active_sessions": self.active_sessions,
+                "peak_active_sessions": self.peak_active_sessions,
+            }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long callers wait for a connection.
+    Only checkouts that found the pool exhausted (size + overflow all in use)
+    count as waits; the rest are served or connected immediately.
+    """
+
+    def _do_get(self):
+        exhausted = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+        if not exhausted:
+            return super()._do_get()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL lets readers proceed while a booking is being written
+        if ":memory:" not in DATABASE_URL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL):
+    """
+    Build the SQLAlchemy engine with per-dialect tuning.
+    - SQLite: cross-thread connections + WAL/mmap/busy-timeout pragmas.
+    - Others (Postgres): sized pool with pre-ping and recycle from config.
+    """
+    if url.startswith("sqlite"):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+        )
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    else:
+        engine = create_engine(
+            url,
+            poolclass=InstrumentedQueuePool,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+        )
+
+    event.listen(engine, "connect", lambda *args: pool_metrics.on_connect())
+    event.listen(engine, "checkout", lambda *args: pool_metrics.on_checkout())
+    event.listen(engine, "checkin", lambda *args: pool_metrics.on_checkin())
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+
+# Per-request SQL count/time (read by the metrics middleware in main.py)
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
 
-engine = create_engine(
-    DATABASE_URL
-)
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start_time")
+    if starts:
+        request_metrics.record_sql(time.perf_counter() - starts.pop())
+
+
+engine = create_db_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -20,7 +162,30 @@ Base = declarative_base()
 # Dependency to get DB session
 def get_db():
     db = SessionLocal()
+    pool_metrics.session_opened()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+        pool_metrics.session_closed()
+
+
+def get_pool_stats() -> dict:
+    """Pool configuration + live checkout/wait counters."""
+    pool = engine.pool
+    stats = {
+        "dialect": engine.dialect.name,
+        "pool_class": type(pool).__name__,
+        "status": pool.status(),
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "pool_size": pool.size(),
+            "overflow": pool.overflow(),
+            "checked_in": pool.checkedin(),
+        })
+    stats.update(pool_metrics.snapshot())
+    return stats
+
+
+request_metrics.register_collector("db_pool", get_pool_stats)
@@ -19,10 +19,7 @@ ACCESS_TOKEN_EXPIRE_MINUTES = config.ACCESS_TOKEN_EXPIRE_MINUTES
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 # --- UTILS ---
-def get_db():
-    db = database.SessionLocal()
-    try: yield db
-    finally: db.close()
+get_db = database.get_db  # single instrumented session dependency
 
 def get_password_hash(password: str) -> str:
     return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
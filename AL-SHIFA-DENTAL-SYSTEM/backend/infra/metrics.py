@@ -0,0 +1,146 @@
+from contextvars import ContextVar
+from threading import Lock
+from typing import Callable, Dict, Optional
+
+
+class RequestStats:
+    """
+    SQL counters for the request currently being served. Tool threads
+    (asyncio.to_thread) share it through the copied context, hence the lock.
+    """
+
+    __slots__ = ("sql_count", "sql_seconds", "lock")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.lock = Lock()
+
+    def add_sql(self, seconds: float):
+        with self.lock:
+            self.sql_count += 1
+            self.sql_seconds += seconds
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe per-route request/SQL metrics, rendered in Prometheus text format.
+    Other subsystems plug their own gauges in via `register_collector`.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.routes: Dict[tuple, dict] = {}
+        self.collectors: Dict[str, Callable[[], dict]] = {}
+        self.sql_count_outside_requests = 0
+
+    # --- REQUEST LIFECYCLE ---
+    def begin_request(self):
+        stats = RequestStats()
+        return stats, _current_request.set(stats)
+
+    def end_request(self, token):
+        _current_request.reset(token)
+
+    def record_sql(self, seconds: float):
+        stats = _current_request.get()
+        if stats is None:
+            with self.lock:
+                self.sql_count_outside_requests += 1
+            return
+        stats.add_sql(seconds)
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        with self.lock:
+            entry = self.routes.get(key)
+            if entry is None:
+                entry = self.routes[key] = {
+                    "count": 0, "seconds": 0.0, "sql_count": 0, "sql_seconds": 0.0,
+                    "sql_count_max": 0, "statuses": {},
+                }
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["sql_count"] += stats.sql_count
+            entry["sql_seconds"] += stats.sql_seconds
+            entry["sql_count_max"] = max(entry["sql_count_max"], stats.sql_count)
+            entry["statuses"][status] = entry["statuses"].get(status, 0) + 1
+
+    # --- COLLECTORS ---
+    def register_collector(self, prefix: str, func: Callable[[], dict]):
+        """`func` returns {name: number}; exported as gauges named `<prefix>_<name>`."""
+        self.collectors[prefix] = func
+
+    # --- EXPORT ---
+    def render_prometheus(self) -> str:
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+
+        with self.lock:
+            routes = {k: dict(v, statuses=dict(v["statuses"])) for k, v in self.routes.items()}
+            outside = self.sql_count_outside_requests
+
+        metric("http_requests_total", "counter", "Requests served, by route template and status.", [
+            ({"method": m, "route": r, "status": status}, count)
+            for (m, r), e in routes.items() for status, count in e["statuses"].items()
+        ])
+        metric("http_request_duration_seconds_sum", "counter", "Total wall time spent serving requests.", [
+            ({"method": m, "route": r}, round(e["seconds"], 6)) for (m, r), e in routes.items()
+        ])
+        metric("http_request_duration_seconds_count", "counter", "Requests timed.", [
+            ({"method": m, "route": r}, e["count"]) for (m, r), e in routes.items()
+        ])
+        metric("http_request_sql_queries_total", "counter", "SQL statements issued while serving requests.", [
+            ({"method": m, "route": r}, e["sql_count"]) for (m, r), e in routes.items()
+        ])
+        metric("http_request_sql_queries_max", "gauge", "Most SQL statements issued by a single request (N+1 detector).", [
+            ({"method": m, "route": r}, e["sql_count_max"]) for (m, r), e in routes.items()
+        ])
+        metric("http_request_sql_duration_seconds_sum", "counter", "Time spent in SQL while serving requests.", [
+            ({"method": m, "route": r}, round(e["sql_seconds"], 6)) for (m, r), e in routes.items()
+        ])
+        metric("sql_queries_outside_requests_total", "counter", "SQL statements issued by background jobs/startup.", [
+            ({}, outside)
+        ])
+
+        for prefix, func in list(self.collectors.items()):
+            try:
+                values = func() or {}
+            except Exception as e:
+                lines.append(f"# collector {prefix} failed: {_escape(str(e))}")
+                continue
+            for name, value in values.items():
+                if isinstance(value, bool): value = int(value)
+                if not isinstance(value, (int, float)): continue
+                full_name = f"{prefix}_{name}"
+                lines.append(f"# TYPE {full_name} gauge")
+                lines.append(f"{full_name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def server_timing_header(stats: RequestStats, total_seconds: float) -> str:
+    db_ms = stats.sql_seconds * 1000
+    total_ms = total_seconds * 1000
+    return (
+        f'db;dur={db_ms:.1f};desc="{stats.sql_count} queries", '
+        f'app;dur={max(0.0, total_ms - db_ms):.1f}, '
+        f'total;dur={total_ms:.1f}'
+    )
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Global registry instance
+request_metrics = MetricsRegistry()
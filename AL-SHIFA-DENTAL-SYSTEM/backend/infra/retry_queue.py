@@ -1,30 +1,340 @@
+"""
+Persistent retry queue for side effects (email, WhatsApp).
+
+A job is a registered handler name + JSON payload stored in a local SQLite
+file, so queued work survives restarts. enqueue() returns immediately; a
+poller thread claims due jobs (BEGIN IMMEDIATE + lease, safe with several
+app workers on one host) and runs them on a thread pool. A failure
+reschedules the job with exponential backoff + jitter instead of sleeping;
+after `max_attempts` it moves to the dead-letter table, where replay() can
+put it back. An idempotency key makes a repeated enqueue() return the
+existing job (queued, done or dead) instead of adding a second one.
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
 import time
-from typing import Callable, Dict, Any
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import config
+from infra.metrics import request_metrics
+
+
+def backoff_delay(attempts: int, base: float, cap: float) -> float:
+    """Seconds before retry number `attempts` (1-based): exponential, capped, with jitter."""
+    delay = min(cap, base * 2 ** (attempts - 1))
+    # Jitter in [delay/2, delay] spreads retries after a provider outage
+    return delay / 2 + random.uniform(0, delay / 2)
 
 
 class RetryQueue:
-    """
-    In-memory retry queue.
-    Safe default for MVP.
-    Replace with Redis/Celery later.
-    """
+    # Finished jobs (kept only for idempotency) are purged every N polls
+    PURGE_EVERY = 100
+
+    def __init__(self, path: str = config.RETRY_QUEUE_DB, workers: int = config.RETRY_QUEUE_WORKERS,
+                 max_attempts: int = config.RETRY_QUEUE_MAX_ATTEMPTS,
+                 backoff_base: float = config.RETRY_QUEUE_BACKOFF_BASE_SECONDS,
+                 backoff_max: float = config.RETRY_QUEUE_BACKOFF_MAX_SECONDS,
+                 poll_seconds: float = config.RETRY_QUEUE_POLL_SECONDS,
+                 lease_seconds: int = config.RETRY_QUEUE_LEASE_SECONDS,
+                 retention_hours: float = config.RETRY_QUEUE_RETENTION_HOURS):
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_hours * 3600
+
+        self.handlers: Dict[str, Callable] = {}
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.executor = None
+        self.polls = 0
+        self.in_flight = 0
+        self.succeeded = 0
+        self.failed_attempts = 0
+        self.dead = 0
+        self.duplicates = 0
+        self.replayed = 0
+
+        # Opened on first use, so importing the module never touches the queue file
+        self._conn = None
+        self._conn_lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self._conn_lock:
+                if self._conn is None:
+                    self._conn = self._open()
+        return self._conn
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS retry_jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, handler TEXT NOT NULL, payload TEXT NOT NULL,"
+            " idempotency_key TEXT UNIQUE, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_run_at REAL NOT NULL, last_error TEXT, created_at REAL NOT NULL, finished_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_retry_jobs_status_due ON retry_jobs (status, next_run_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS retry_dead_letters ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, job_id INTEGER NOT NULL, handler TEXT NOT NULL,"
+            " payload TEXT NOT NULL, idempotency_key TEXT, attempts INTEGER NOT NULL, last_error TEXT,"
+            " created_at REAL NOT NULL, failed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_retry_dead_letters_key ON retry_dead_letters (idempotency_key)")
+        return conn
+
+    # --- HANDLERS / ENQUEUE ---
+    def register(self, name: str, handler: Callable):
+        """Map a job name to the function called with the job's payload as kwargs."""
+        self.handlers[name] = handler
+
+    def enqueue(self, name: str, payload: Dict[str, Any], idempotency_key: Optional[str] = None,
+                delay_seconds: float = 0) -> int:
+        """Persist a job and return its id (the existing id if `idempotency_key` was seen before)."""
+        return self.enqueue_many(name, [(payload, idempotency_key)], delay_seconds)[0]
+
+    def enqueue_many(self, name: str, jobs: List[Tuple[Dict[str, Any], Optional[str]]],
+                     delay_seconds: float = 0) -> List[int]:
+        """Persist [(payload, idempotency_key), ...] in one transaction. Returns job ids in order."""
+        now = time.time()
+        rows = [(json.dumps(payload, separators=(",", ":"), default=str), key) for payload, key in jobs]
+        job_ids = []
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for data, key in rows:
+                    existing = self._find_key(key) if key else None
+                    if existing is None:
+                        cur = self.conn.execute(
+                            "INSERT INTO retry_jobs (handler, payload, idempotency_key, status, attempts, next_run_at,"
+                            " created_at) VALUES (?, ?, ?, 'pending', 0, ?, ?)",
+                            (name, data, key, now + delay_seconds, now)
+                        )
+                        job_ids.append(cur.lastrowid)
+                    else:
+                        self.duplicates += 1
+                        job_ids.append(existing)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        self.wake_event.set()
+        return job_ids
+
+    def _find_key(self, key: str) -> Optional[int]:
+        row = self.conn.execute("SELECT id FROM retry_jobs WHERE idempotency_key = ?", (key,)).fetchone()
+        if not row:
+            row = self.conn.execute(
+                "SELECT job_id FROM retry_dead_letters WHERE idempotency_key = ? ORDER BY id DESC LIMIT 1", (key,)
+            ).fetchone()
+        return row[0] if row else None
 
-    def __init__(self, max_retries: int = 3, delay_seconds: int = 2):
-        self.max_retries = max_retries
-        self.delay_seconds = delay_seconds
+    # --- LIFECYCLE ---
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.conn  # open (and migrate) now rather than on the poller's first claim
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="retry-queue")
+        self.thread = threading.Thread(target=self._run, name="retry-queue-poller", daemon=True)
+        self.thread.start()
+        print(f"✅ [Startup] Retry queue started ({self.workers} workers, {len(self.handlers)} handlers).")
 
-    def execute(self, func: Callable, payload: Dict[str, Any]):
-        attempt = 0
-        last_error = None
+    def stop(self, timeout: float = 10):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+        if self.executor:
+            # Claimed-but-unstarted jobs become due again when their lease expires
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
 
-        while attempt < self.max_retries:
+    def _run(self):
+        while not self.stop_event.is_set():
             try:
-                return func(**payload)
+                claimed = self.dispatch_due()
+                self.polls += 1
+                if self.polls % self.PURGE_EVERY == 0:
+                    self._purge()
             except Exception as e:
-                last_error = e
-                attempt += 1
-                time.sleep(self.delay_seconds)
+                print(f"⚠️ Retry queue poll failed: {e}")
+                claimed = 0
+            if not claimed:
+                self.wake_event.wait(self.poll_seconds)
+            self.wake_event.clear()
+
+    # --- EXECUTION ---
+    def dispatch_due(self) -> int:
+        """Claim due jobs and hand them to the worker pool. Returns how many were claimed."""
+        with self.lock:
+            capacity = self.workers * 2 - self.in_flight
+            if capacity <= 0:
+                return 0
+            now = time.time()
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 'running' rows past their lease belong to a worker that died
+                jobs = self.conn.execute(
+                    "SELECT id, handler, payload, attempts FROM retry_jobs"
+                    " WHERE status IN ('pending', 'running') AND next_run_at <= ? ORDER BY next_run_at LIMIT ?",
+                    (now, capacity)
+                ).fetchall()
+                self.conn.executemany(
+                    "UPDATE retry_jobs SET status = 'running', next_run_at = ? WHERE id = ?",
+                    [(now + self.lease_seconds, job[0]) for job in jobs]
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.in_flight += len(jobs)
+        for job in jobs:
+            self.executor.submit(self._execute, *job)
+        return len(jobs)
+
+    def _execute(self, job_id: int, name: str, payload: str, attempts: int):
+        attempts += 1
+        try:
+            handler = self.handlers.get(name)
+            if handler is None:
+                raise LookupError(f"No handler registered for job '{name}'")
+            handler(**json.loads(payload))
+        except Exception as e:
+            self._failed(job_id, name, attempts, e)
+        else:
+            with self.lock:
+                self.conn.execute(
+                    "UPDATE retry_jobs SET status = 'done', attempts = ?, last_error = NULL, finished_at = ?"
+                    " WHERE id = ?", (attempts, time.time(), job_id)
+                )
+                self.succeeded += 1
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def _failed(self, job_id: int, name: str, attempts: int, e: Exception):
+        error = e.__cause__ or e
+        last_error = f"{type(error).__name__}: {error}"
+        now = time.time()
+        try:
+            with self.lock:
+                self.failed_attempts += 1
+                if attempts < self.max_attempts:
+                    self.conn.execute(
+                        "UPDATE retry_jobs SET status = 'pending', attempts = ?, last_error = ?, next_run_at = ?"
+                        " WHERE id = ?",
+                        (attempts, last_error, now + backoff_delay(attempts, self.backoff_base, self.backoff_max), job_id)
+                    )
+                    return
+                self.conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self.conn.execute(
+                        "INSERT INTO retry_dead_letters"
+                        " (job_id, handler, payload, idempotency_key, attempts, last_error, created_at, failed_at)"
+                        " SELECT id, handler, payload, idempotency_key, ?, ?, created_at, ? FROM retry_jobs WHERE id = ?",
+                        (attempts, last_error, now, job_id)
+                    )
+                    self.conn.execute("DELETE FROM retry_jobs WHERE id = ?", (job_id,))
+                    self.conn.execute("COMMIT")
+                except Exception:
+                    self.conn.execute("ROLLBACK")
+                    raise
+                self.dead += 1
+            print(f"❌ Retry job #{job_id} ({name}) dead after {attempts} attempts: {last_error}")
+        except Exception:
+            traceback.print_exc()
+
+    def _purge(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM retry_jobs WHERE status = 'done' AND finished_at <= ?",
+                              (time.time() - self.retention_seconds,))
+
+    # --- DEAD LETTERS ---
+    def dead_letters(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, job_id, handler, payload, idempotency_key, attempts, last_error, failed_at"
+                " FROM retry_dead_letters ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [{
+            "id": r[0], "job_id": r[1], "handler": r[2], "payload": json.loads(r[3]), "idempotency_key": r[4],
+            "attempts": r[5], "last_error": r[6], "failed_at": r[7],
+        } for r in rows]
+
+    def replay(self, dead_letter_id: int) -> Optional[int]:
+        """Move a dead letter back to the queue with a fresh attempt budget. Returns the new job id."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT handler, payload, idempotency_key FROM retry_dead_letters WHERE id = ?", (dead_letter_id,)
+                ).fetchone()
+                if not row:
+                    self.conn.execute("ROLLBACK")
+                    return None
+                job_id = self.conn.execute(
+                    "INSERT INTO retry_jobs (handler, payload, idempotency_key, status, attempts, next_run_at, created_at)"
+                    " VALUES (?, ?, ?, 'pending', 0, ?, ?)", (*row, now, now)
+                ).lastrowid
+                self.conn.execute("DELETE FROM retry_dead_letters WHERE id = ?", (dead_letter_id,))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.replayed += 1
+        self.wake_event.set()
+        return job_id
+
+    def replay_all(self) -> List[int]:
+        with self.lock:
+            ids = [r[0] for r in self.conn.execute("SELECT id FROM retry_dead_letters ORDER BY id").fetchall()]
+        return [job_id for job_id in map(self.replay, ids) if job_id is not None]
+
+    # --- STATUS ---
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            counts, dead_letters = {}, 0
+            # Never opened (not started, nothing enqueued): don't create the file just to report zeros
+            if self._conn is not None:
+                counts = dict(self._conn.execute(
+                    "SELECT CASE WHEN status = 'pending' AND attempts > 0 THEN 'retrying' ELSE status END, COUNT(*)"
+                    " FROM retry_jobs GROUP BY 1"
+                ).fetchall())
+                dead_letters = self._conn.execute("SELECT COUNT(*) FROM retry_dead_letters").fetchone()[0]
+            return {
+                "running": bool(self.thread and self.thread.is_alive()),
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "pending": counts.get("pending", 0),
+                "retrying": counts.get("retrying", 0),
+                "dead_letters": dead_letters,
+                "succeeded": self.succeeded,
+                "failed_attempts": self.failed_attempts,
+                "dead": self.dead,
+                "duplicates": self.duplicates,
+                "replayed": self.replayed,
+            }
+
 
-        raise RuntimeError(
-            f"RetryQueue exhausted after {self.max_retries} attempts"
-        ) from last_error
+# Global queue (handlers register at import; started in core.init lifespan)
+retry_queue = RetryQueue()
+request_metrics.register_collector("retry_queue", retry_queue.stats)
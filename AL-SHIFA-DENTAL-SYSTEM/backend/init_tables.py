@@ -5,3 +5,7 @@ import models
 print("Creating tables...")
 models.Base.metadata.create_all(bind=engine)
 print("✅ Tables created or already exist.")
+
+from core.migrations import run_migrations
+run_migrations(engine)
+print("✅ Migrations up to date.")
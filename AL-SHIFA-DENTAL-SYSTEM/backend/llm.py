@@ -1,5 +1,5 @@
 
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 import config
 import os
 
@@ -9,6 +9,13 @@ client = OpenAI(
     api_key=config.GROQ_API_KEY
 )
 
+# Async client for the chat agents: awaits the round-trip instead of holding
+# a threadpool worker, and shares one connection pool across brains.
+async_client = AsyncOpenAI(
+    base_url="https://api.groq.com/openai/v1",
+    api_key=config.GROQ_API_KEY
+)
+
 def get_llm_response(messages: list, model: str = "llama-3.3-70b-versatile", tools=None) -> str:
     """
     Helper to get response from LLM.
@@ -1,11 +1,17 @@
 
 import os
+import time
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
 from core.init import lifespan
+from core.security import get_current_user
+import database
+import models
+from infra.metrics import request_metrics, server_timing_header
 from api import public, auth, doctor, admin, organization
 import agent_routes
 import patient_agent_routes
@@ -18,6 +24,41 @@ logger = logging.getLogger(__name__)
 app = FastAPI(lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
+# --- REQUEST METRICS (SQL count/time per route) ---
+# Server-Timing covers work done before the headers go out; the per-route
+# metrics are recorded once the body has finished, so streamed (SSE) replies
+# include the SQL and time spent while streaming.
+@app.middleware("http")
+async def request_metrics_middleware(request: Request, call_next):
+    stats, token = request_metrics.begin_request()
+    started = time.perf_counter()
+
+    def record(status: int):
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", None) or "unmatched"
+        request_metrics.record_request(request.method, route_path, status, time.perf_counter() - started, stats)
+
+    try:
+        response = await call_next(request)
+    except Exception:
+        record(500)
+        raise
+    finally:
+        request_metrics.end_request(token)
+    response.headers["Server-Timing"] = server_timing_header(stats, time.perf_counter() - started)
+
+    body = response.body_iterator
+
+    async def body_with_metrics():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            record(response.status_code)
+
+    response.body_iterator = body_with_metrics()
+    return response
+
 # --- ROUTERS ---
 app.include_router(auth.router)
 app.include_router(public.router)
@@ -35,4 +76,13 @@ app.mount("/media", StaticFiles(directory="media"), name="media")
 
 @app.get("/")
 def root():
-    return {"message": "Al-Shifa Dental System API is Running"}
\ No newline at end of file
+    return {"message": "Al-Shifa Dental System API is Running"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return request_metrics.render_prometheus()
+
+@app.get("/health/db")
+def db_health(user: models.User = Depends(get_current_user)):
+    if user.role != "admin": raise HTTPException(403)
+    return database.get_pool_stats()
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -113,6 +113,13 @@ class Appointment(Base):
     doctor = relationship("Doctor")
     invoices = relationship("Invoice", back_populates="appointment")
 
+    # Hot paths: overlap checks / schedules, patient upcoming, dashboards
+    __table_args__ = (
+        Index("ix_appointments_doctor_start", "doctor_id", "start_time"),
+        Index("ix_appointments_patient_start_status", "patient_id", "start_time", "status"),
+        Index("ix_appointments_doctor_status", "doctor_id", "status"),
+    )
+
 class Invoice(Base):
     __tablename__ = "invoices"
     id = Column(Integer, primary_key=True, index=True)
@@ -125,6 +132,11 @@ class Invoice(Base):
     appointment = relationship("Appointment", back_populates="invoices")
     patient = relationship("Patient")
 
+    __table_args__ = (
+        Index("ix_invoices_appointment", "appointment_id"),
+        Index("ix_invoices_patient_created", "patient_id", "created_at"),
+    )
+
 class MedicalRecord(Base):
     __tablename__ = "medical_records"
     id = Column(Integer, primary_key=True, index=True)
@@ -146,3 +158,44 @@ class PatientFile(Base):
     filepath = Column(String)
     uploaded_at = Column(DateTime, default=datetime.utcnow)
 
+
+class NotificationOutbox(Base):
+    # Written in the same transaction as the change it announces; sent by notifications.outbox
+    __tablename__ = "notification_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String)  # NotificationService method, e.g. "send_cancellation_email"
+    payload = Column(Text)  # JSON kwargs for that method
+    status = Column(String, default="pending")  # pending | sending | sent | dead
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    # Dispatcher poll: due rows by status
+    __table_args__ = (
+        Index("ix_notification_outbox_status_due", "status", "next_attempt_at"),
+    )
+
+class InventoryAlert(Base):
+    # One row per doctor + item + kind, shared by all workers: pending in the next digest, or sent (deduped)
+    __tablename__ = "inventory_alerts"
+    id = Column(Integer, primary_key=True, index=True)
+    doctor_id = Column(Integer, ForeignKey("doctors.id"))
+    item_id = Column(Integer)
+    kind = Column(String)  # low_stock | forecast
+    level = Column(String)  # low | out | short
+    status = Column(String, default="pending")  # pending | sent
+    item_name = Column(String)
+    current_quantity = Column(Integer)
+    threshold = Column(Integer, default=0)
+    horizon = Column(String, default="")
+    doctor_email = Column(String)
+    doctor_name = Column(String)
+    pending_since = Column(DateTime, default=datetime.utcnow)  # oldest pending row opens the digest window
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("doctor_id", "item_id", "kind", name="uq_inventory_alerts_doctor_item_kind"),
+        Index("ix_inventory_alerts_status_pending", "status", "pending_since"),
+    )
@@ -0,0 +1,257 @@
+"""
+Inventory alert digests.
+
+Completing a day's appointments consumes stock item by item, and every item
+under threshold used to send its own email. InventoryService now reports
+low-stock and shortage-forecast events here instead. Alert state lives in
+the inventory_alerts table (one row per doctor + item + kind), so it
+survives restarts and is shared by every app worker. A doctor's oldest
+pending row opens a window of ALERT_DIGEST_WINDOW_SECONDS; when it closes
+(flush_due(), run by the scheduler) the pending rows are claimed with a
+conditional UPDATE, the digest is queued on the retry queue, and only then
+is the claim committed as sent. A failed enqueue rolls back and the alerts
+stay pending for the next flush. An (item, kind, level) that was sent is
+suppressed for ALERT_DIGEST_DEDUPE_HOURS unless it escalates
+(low -> out of stock); restocking above threshold clears it.
+
+Events reported with the caller's session are written only after that
+session commits (on a separate session, once its transaction is over), so
+a rolled-back stock change never alerts and the two writes never contend
+for SQLite's lock.
+"""
+
+from datetime import datetime, timedelta
+from threading import Lock
+
+from sqlalchemy import event, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import config
+from database import SessionLocal
+from infra.metrics import request_metrics
+from models import InventoryAlert
+
+# Severity order for escalation (a higher level is sent even if a lower one was)
+LEVELS = {"short": 1, "low": 1, "out": 2}
+
+
+class AlertEvent:
+    __slots__ = ("kind", "item_id", "item_name", "level", "current_quantity", "threshold", "horizon")
+
+    def __init__(self, kind: str, item_id: int, item_name: str, level: str, current_quantity: int,
+                 threshold: int = 0, horizon: str = ""):
+        self.kind = kind  # "low_stock" | "forecast"
+        self.item_id = item_id
+        self.item_name = item_name
+        self.level = level  # "low" | "out" for low_stock, "short" for forecast
+        self.current_quantity = current_quantity
+        self.threshold = threshold  # min_threshold (low_stock) or quantity needed (forecast)
+        self.horizon = horizon
+
+
+def stock_level(quantity: int) -> str:
+    return "out" if quantity <= 0 else "low"
+
+
+class AlertAggregator:
+    def __init__(self, window_seconds: float = config.ALERT_DIGEST_WINDOW_SECONDS,
+                 dedupe_hours: float = config.ALERT_DIGEST_DEDUPE_HOURS, session_factory=SessionLocal):
+        self.window_seconds = window_seconds
+        self.dedupe_seconds = dedupe_hours * 3600
+        self.session_factory = session_factory
+        # Per-process counters only; alert state is in the database
+        self.lock = Lock()
+        self.events = 0
+        self.suppressed = 0
+        self.digests = 0
+
+    # --- EVENTS ---
+    def add(self, doctor_id: int, doctor_email: str, doctor_name: str, event: AlertEvent, db: Session = None):
+        """
+        Record an alert for the doctor's next digest. False if it was already sent (or is pending).
+        With `db`, it is recorded when that session commits (returns None).
+        """
+        if db is not None:
+            _pending_ops(db).append(lambda: self.add(doctor_id, doctor_email, doctor_name, event))
+            return None
+        with self.lock:
+            self.events += 1
+        db = self.session_factory()
+        try:
+            try:
+                added = self._upsert(db, doctor_id, doctor_email, doctor_name, event)
+                db.commit()
+            except IntegrityError:
+                # Another worker inserted the same alert first: apply this event to its row
+                db.rollback()
+                added = self._upsert(db, doctor_id, doctor_email, doctor_name, event)
+                db.commit()
+        finally:
+            db.close()
+        if added:
+            print(f"📧 {event.kind} alert for {event.item_name} added to doctor {doctor_id}'s digest")
+        else:
+            with self.lock:
+                self.suppressed += 1
+        return added
+
+    def _upsert(self, db, doctor_id: int, doctor_email: str, doctor_name: str, event: AlertEvent) -> bool:
+        now = datetime.utcnow()
+        row = db.query(InventoryAlert).filter(
+            InventoryAlert.doctor_id == doctor_id,
+            InventoryAlert.item_id == event.item_id,
+            InventoryAlert.kind == event.kind
+        ).first()
+        if row is None:
+            row = InventoryAlert(doctor_id=doctor_id, item_id=event.item_id, kind=event.kind,
+                                 level=event.level, status="pending", pending_since=now)
+            db.add(row)
+            added = True
+        elif row.status == "sent":
+            recent = row.sent_at and (now - row.sent_at).total_seconds() < self.dedupe_seconds
+            if recent and LEVELS[event.level] <= LEVELS[row.level]:
+                return False
+            row.status, row.level, row.pending_since, row.sent_at = "pending", event.level, now, None
+            added = True
+        else:
+            # Already pending: keep the newest numbers for the digest, never downgrade the level
+            added = LEVELS[event.level] > LEVELS[row.level]
+            if added:
+                row.level = event.level
+        row.item_name = event.item_name
+        row.current_quantity = event.current_quantity
+        row.threshold = event.threshold
+        row.horizon = event.horizon
+        row.doctor_email = doctor_email
+        row.doctor_name = doctor_name
+        db.flush()
+        return added
+
+    def resolve(self, doctor_id: int, item_id: int, kind: str = "low_stock", db: Session = None):
+        """
+        Item is healthy again: a future dip alerts immediately instead of being deduped.
+        With `db`, applied when that session commits.
+        """
+        if db is not None:
+            _pending_ops(db).append(lambda: self.resolve(doctor_id, item_id, kind))
+            return
+        db = self.session_factory()
+        try:
+            db.query(InventoryAlert).filter(
+                InventoryAlert.doctor_id == doctor_id,
+                InventoryAlert.item_id == item_id,
+                InventoryAlert.kind == kind
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    # --- FLUSHING ---
+    def flush_due(self, force: bool = False) -> int:
+        """Send every digest whose window has closed (all of them with force). Returns digests sent."""
+        now = datetime.utcnow()
+        db = self.session_factory()
+        sent = 0
+        try:
+            windows = db.query(InventoryAlert.doctor_id, func.min(InventoryAlert.pending_since)).filter(
+                InventoryAlert.status == "pending"
+            ).group_by(InventoryAlert.doctor_id).all()
+            for doctor_id, opened_at in windows:
+                if not force and (now - opened_at).total_seconds() < self.window_seconds:
+                    continue
+                try:
+                    if self._flush_doctor(db, doctor_id, opened_at, now):
+                        sent += 1
+                except Exception as e:
+                    db.rollback()
+                    print(f"⚠️ Inventory digest for doctor {doctor_id} failed (alerts stay pending): {e}")
+
+            # Forget sends older than the dedupe window
+            db.query(InventoryAlert).filter(
+                InventoryAlert.status == "sent",
+                InventoryAlert.sent_at <= now - timedelta(seconds=self.dedupe_seconds)
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        with self.lock:
+            self.digests += sent
+        return sent
+
+    def _flush_doctor(self, db, doctor_id: int, opened_at: datetime, now: datetime) -> bool:
+        alerts = db.query(InventoryAlert).filter(
+            InventoryAlert.doctor_id == doctor_id,
+            InventoryAlert.status == "pending"
+        ).all()
+        if not alerts:
+            return False
+        # Conditional claim: a worker flushing the same doctor concurrently matches nothing
+        claimed = db.execute(
+            update(InventoryAlert)
+            .where(InventoryAlert.id.in_([a.id for a in alerts]), InventoryAlert.status == "pending")
+            .values(status="sent", sent_at=now)
+        ).rowcount
+        if claimed != len(alerts):
+            db.rollback()
+            return False
+        # Queue first, commit the claim after: a failed enqueue leaves the alerts pending
+        self._send(doctor_id, alerts, opened_at)
+        db.commit()
+        return True
+
+    def _send(self, doctor_id: int, alerts: list, opened_at: datetime):
+        from notifications.service import NotificationService
+
+        alerts = sorted(alerts, key=lambda a: (-LEVELS[a.level], a.item_name))
+        # Same window -> same key, so a retried flush (e.g. the commit above failed) is not sent twice
+        NotificationService().send_inventory_digest(
+            doctor_email=alerts[0].doctor_email,
+            doctor_name=alerts[0].doctor_name,
+            low_stock=[a for a in alerts if a.kind == "low_stock"],
+            forecasts=[a for a in alerts if a.kind == "forecast"],
+            idempotency_key=f"inventory-digest:{doctor_id}:{opened_at.isoformat()}"
+        )
+        print(f"📧 Inventory digest queued for doctor {doctor_id} ({len(alerts)} items)")
+
+    def stats(self) -> dict:
+        db = self.session_factory()
+        try:
+            pending_doctors, pending_alerts = db.query(
+                func.count(func.distinct(InventoryAlert.doctor_id)), func.count(InventoryAlert.id)
+            ).filter(InventoryAlert.status == "pending").one()
+        finally:
+            db.close()
+        with self.lock:
+            return {
+                "window_seconds": self.window_seconds,
+                "pending_doctors": pending_doctors,
+                "pending_alerts": pending_alerts,
+                "events": self.events,
+                "suppressed": self.suppressed,
+                "digests": self.digests,
+            }
+
+
+# --- DEFERRED EVENTS (applied after the caller's commit) ---
+def _pending_ops(session) -> list:
+    return session.info.setdefault("inventory_alert_ops", [])
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_ops(session):
+    for op in session.info.pop("inventory_alert_ops", ()):
+        try:
+            op()
+        except Exception as e:
+            print(f"⚠️ Failed to record inventory alert: {e}")
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_ops(session):
+    session.info.pop("inventory_alert_ops", None)
+
+
+# Global aggregator (flushed by agent.scheduler; due digests are also flushed on shutdown)
+alert_aggregator = AlertAggregator()
+request_metrics.register_collector("alert_digest", alert_aggregator.stats)
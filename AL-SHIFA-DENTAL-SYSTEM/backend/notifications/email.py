@@ -1,50 +1,63 @@
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import logging
 from datetime import datetime
 import config
+from notifications.smtp_pool import SMTPConnectionPool, smtp_pool
 
 logger = logging.getLogger(__name__)
 
 class EmailAdapter:
+    def __init__(self, pool: SMTPConnectionPool = None):
+        # Shared persistent SMTP sessions; no handshake/login per message
+        self.pool = pool or smtp_pool
+
+    @staticmethod
+    def build_message(to_email: str, subject: str, body: str, html_body: str = None) -> str:
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = subject
+        msg['From'] = config.EMAIL_USER
+        msg['To'] = to_email
+
+        part1 = MIMEText(body, 'plain')
+        msg.attach(part1)
+        if html_body:
+            part2 = MIMEText(html_body, 'html')
+            msg.attach(part2)
+        return msg.as_string()
+
     def send(self, to_email: str, subject: str, body: str, html_body: str = None):
         try:
-            # 1. Setup Message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = subject
-            msg['From'] = config.EMAIL_USER
-            msg['To'] = to_email
-
-            # 2. Attach Content
-            part1 = MIMEText(body, 'plain')
-            msg.attach(part1)
-            if html_body:
-                part2 = MIMEText(html_body, 'html')
-                msg.attach(part2)
-
-            # 3. Connect to SMTP Server
-            logger.info(f"Connecting to SMTP: {config.EMAIL_HOST}:{config.EMAIL_PORT}")
-            
-            # LOGIC FIX: Handle both Port 587 (TLS) and Port 465 (SSL)
-            if config.EMAIL_PORT == 587:
-                # Use standard SMTP with STARTTLS (The method that worked for you)
-                with smtplib.SMTP(config.EMAIL_HOST, config.EMAIL_PORT) as server:
-                    server.ehlo()
-                    server.starttls()  # Upgrade connection to secure
-                    server.ehlo()
-                    server.login(config.EMAIL_USER, config.EMAIL_PASSWORD)
-                    server.sendmail(config.EMAIL_USER, to_email, msg.as_string())
-            else:
-                # Use implicit SSL (Legacy/Port 465)
-                with smtplib.SMTP_SSL(config.EMAIL_HOST, config.EMAIL_PORT) as server:
-                    server.login(config.EMAIL_USER, config.EMAIL_PASSWORD)
-                    server.sendmail(config.EMAIL_USER, to_email, msg.as_string())
-            
+            message = self.build_message(to_email, subject, body, html_body)
+            self.pool.send(config.EMAIL_USER, to_email, message)
+
             logger.info(f"✅ Email sent successfully to {to_email}")
             return {"status": "sent"}
 
         except Exception as e:
             logger.error(f"❌ Failed to send email: {e}")
             # Re-raise to ensure main.py knows it failed
-            raise e
\ No newline at end of file
+            raise e
+
+    def send_many(self, emails: list) -> list:
+        """
+        Send [{"to_email", "subject", "body", "html_body"?}, ...] over one SMTP session.
+        Returns [{"to": ..., "status": "sent"|"failed", "error"?}, ...]; one bad address doesn't stop the rest.
+        """
+        batch = [(e["to_email"], self.build_message(e["to_email"], e["subject"], e["body"], e.get("html_body")))
+                 for e in emails]
+        try:
+            errors = self.pool.send_many(config.EMAIL_USER, batch)
+        except Exception as e:
+            logger.error(f"❌ Failed to send email batch: {e}")
+            raise e
+
+        results = []
+        for (to_email, _), error in zip(batch, errors):
+            if error:
+                logger.error(f"❌ Failed to send email to {to_email}: {error}")
+                results.append({"to": to_email, "status": "failed", "error": str(error)})
+            else:
+                results.append({"to": to_email, "status": "sent"})
+        logger.info(f"✅ Email batch: {sum(r['status'] == 'sent' for r in results)}/{len(results)} sent")
+        return results
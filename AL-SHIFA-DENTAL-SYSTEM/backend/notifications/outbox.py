@@ -0,0 +1,249 @@
+"""
+Transactional notification outbox.
+
+Services call enqueue_notification(db, kind, **kwargs) before their own
+commit, so the email is recorded atomically with the appointment change and
+the HTTP request never waits on SMTP. OutboxDispatcher polls due rows,
+claims each with a conditional UPDATE (safe with several app workers; on
+Postgres the poll also uses FOR UPDATE SKIP LOCKED), sends them on a small
+worker pool with one attempt each, and reschedules failures with
+exponential backoff + jitter until OUTBOX_MAX_ATTEMPTS, then marks them dead.
+A commit that enqueued something wakes the dispatcher immediately.
+"""
+
+import json
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, update
+from sqlalchemy.orm import Session
+
+import config
+from database import SessionLocal, is_sqlite
+from infra.metrics import request_metrics
+from infra.retry_queue import backoff_delay as retry_backoff_delay
+from models import NotificationOutbox
+
+# NotificationService methods that may be queued (payload = their kwargs)
+OUTBOX_KINDS = {
+    "send_cancellation_email",
+    "send_doctor_cancellation_notification",
+    "send_reschedule_email",
+    "send_doctor_reschedule_notification",
+}
+
+
+def enqueue_notification(db: Session, kind: str, **payload) -> NotificationOutbox:
+    """Add an outbox row to the caller's transaction (sent after it commits)."""
+    if kind not in OUTBOX_KINDS:
+        raise ValueError(f"Unknown notification kind: {kind}")
+    row = NotificationOutbox(kind=kind, payload=json.dumps(payload), status="pending",
+                             attempts=0, next_attempt_at=datetime.utcnow())
+    db.add(row)
+    db.info["outbox_enqueued"] = True
+    return row
+
+
+def backoff_delay(attempts: int) -> float:
+    """Seconds before retry number `attempts` (1-based): exponential, capped, with jitter."""
+    return retry_backoff_delay(attempts, config.OUTBOX_BACKOFF_BASE_SECONDS, config.OUTBOX_BACKOFF_MAX_SECONDS)
+
+
+class OutboxDispatcher:
+    def __init__(self, workers: int = config.OUTBOX_WORKERS, poll_seconds: float = config.OUTBOX_POLL_SECONDS,
+                 batch_size: int = config.OUTBOX_BATCH_SIZE, max_attempts: int = config.OUTBOX_MAX_ATTEMPTS,
+                 lease_seconds: int = config.OUTBOX_LEASE_SECONDS):
+        self.workers = max(1, workers)
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.executor = None
+        self.in_flight = 0
+        self.sent = 0
+        self.failed_attempts = 0
+        self.dead = 0
+        self.last_poll = None
+        self.last_latency_seconds = 0.0
+
+    # --- LIFECYCLE ---
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="outbox")
+        self.thread = threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True)
+        self.thread.start()
+        print(f"✅ [Startup] Notification outbox dispatcher started ({self.workers} workers).")
+
+    def stop(self, timeout: float = 10):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+        if self.executor:
+            # Claimed-but-unsent rows fall back to pending when their lease expires
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def wake(self):
+        self.wake_event.set()
+
+    # --- POLLING ---
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                claimed = self.dispatch_due()
+            except Exception as e:
+                print(f"⚠️ Outbox poll failed: {e}")
+                claimed = 0
+            # A full batch means more may be due: poll again right away
+            if claimed < self.batch_size:
+                self.wake_event.wait(self.poll_seconds)
+            self.wake_event.clear()
+
+    def dispatch_due(self) -> int:
+        """Claim due rows and hand them to the worker pool. Returns how many were claimed."""
+        with self.lock:
+            capacity = self.workers * 2 - self.in_flight
+        if capacity <= 0:
+            return 0
+
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            due = db.query(NotificationOutbox.id).filter(
+                ((NotificationOutbox.status == "pending") & (NotificationOutbox.next_attempt_at <= now))
+                # Lease expired: the worker (or process) that claimed it died
+                | ((NotificationOutbox.status == "sending") & (NotificationOutbox.next_attempt_at <= now))
+            ).order_by(NotificationOutbox.next_attempt_at).limit(min(capacity, self.batch_size))
+            if not is_sqlite:
+                due = due.with_for_update(skip_locked=True)
+            ids = [row_id for (row_id,) in due.all()]
+
+            claimed = []
+            lease_until = now + timedelta(seconds=self.lease_seconds)
+            for row_id in ids:
+                # Conditional claim: only one dispatcher wins a row
+                result = db.execute(
+                    update(NotificationOutbox)
+                    .where(NotificationOutbox.id == row_id,
+                           NotificationOutbox.status.in_(("pending", "sending")),
+                           NotificationOutbox.next_attempt_at <= now)
+                    .values(status="sending", next_attempt_at=lease_until)
+                )
+                if result.rowcount == 1:
+                    claimed.append(row_id)
+            db.commit()
+        finally:
+            db.close()
+
+        with self.lock:
+            self.last_poll = now
+            self.in_flight += len(claimed)
+        for row_id in claimed:
+            self.executor.submit(self._deliver, row_id)
+        return len(claimed)
+
+    # --- DELIVERY ---
+    def _deliver(self, row_id: int):
+        from notifications.service import NotificationService
+
+        db = SessionLocal()
+        try:
+            row = db.query(NotificationOutbox).filter(NotificationOutbox.id == row_id).first()
+            if not row or row.status != "sending":
+                return
+            try:
+                # Single attempt here: retries are rescheduled rows, never sleeps
+                service = NotificationService(deliver_now=True)
+                getattr(service, row.kind)(**json.loads(row.payload))
+            except Exception as e:
+                error = e.__cause__ or e
+                row.attempts += 1
+                row.last_error = f"{type(error).__name__}: {error}"
+                dead = row.attempts >= self.max_attempts
+                if dead:
+                    row.status = "dead"
+                    print(f"❌ Outbox #{row.id} ({row.kind}) dead after {row.attempts} attempts: {row.last_error}")
+                else:
+                    row.status = "pending"
+                    row.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_delay(row.attempts))
+                db.commit()
+                with self.lock:
+                    self.failed_attempts += 1
+                    if dead: self.dead += 1
+                return
+
+            row.attempts += 1
+            row.status = "sent"
+            row.sent_at = datetime.utcnow()
+            row.last_error = None
+            latency = (row.sent_at - row.created_at).total_seconds()
+            db.commit()
+            with self.lock:
+                self.sent += 1
+                self.last_latency_seconds = latency
+        except Exception:
+            traceback.print_exc()
+            db.rollback()
+        finally:
+            db.close()
+            with self.lock:
+                self.in_flight -= 1
+
+    # --- STATUS ---
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "running": bool(self.thread and self.thread.is_alive()),
+                "workers": self.workers,
+                "in_flight": self.in_flight,
+                "sent": self.sent,
+                "failed_attempts": self.failed_attempts,
+                "dead": self.dead,
+                "last_latency_seconds": round(self.last_latency_seconds, 3),
+            }
+
+    def status(self, db: Session, recent: int = 20) -> dict:
+        """Dispatcher counters + queue depth by status + latest failures (admin view)."""
+        counts = dict(db.query(NotificationOutbox.status, func.count(NotificationOutbox.id))
+                      .group_by(NotificationOutbox.status).all())
+        oldest = db.query(func.min(NotificationOutbox.created_at)).filter(
+            NotificationOutbox.status.in_(("pending", "sending"))).scalar()
+        failures = db.query(NotificationOutbox).filter(NotificationOutbox.last_error.isnot(None)) \
+            .order_by(NotificationOutbox.id.desc()).limit(recent).all()
+        return {
+            "dispatcher": self.stats(),
+            "queue": {s: counts.get(s, 0) for s in ("pending", "sending", "sent", "dead")},
+            "oldest_pending_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else 0,
+            "recent_failures": [{
+                "id": r.id, "kind": r.kind, "status": r.status, "attempts": r.attempts,
+                "last_error": r.last_error,
+                "next_attempt_at": r.next_attempt_at.isoformat() if r.status == "pending" else None,
+            } for r in failures],
+        }
+
+
+# Global dispatcher (started in core.init lifespan)
+outbox_dispatcher = OutboxDispatcher()
+request_metrics.register_collector("notification_outbox", outbox_dispatcher.stats)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_dispatcher(session):
+    if session.info.pop("outbox_enqueued", False):
+        outbox_dispatcher.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_enqueued(session):
+    session.info.pop("outbox_enqueued", None)
@@ -1,157 +1,146 @@
 from notifications.whatsapp import WhatsAppAdapter
 from notifications.email import EmailAdapter
-from infra.retry_queue import RetryQueue
+from infra.retry_queue import RetryQueue, retry_queue as default_retry_queue
 from infra.monitoring import MonitoringLogger
+from notifications.template_registry import template_registry
+
+
+def _send_whatsapp(to_number: str, message: str):
+    return WhatsAppAdapter().send(to_number=to_number, message=message)
+
+
+def _send_email(to_email: str, subject: str, body: str, html_body: str = None):
+    return EmailAdapter().send(to_email=to_email, subject=subject, body=body, html_body=html_body)
+
+
+def register_retry_handlers(queue: RetryQueue = default_retry_queue):
+    """Queued sends survive restarts, so the queue looks their handlers up by name."""
+    queue.register("notification.whatsapp", _send_whatsapp)
+    queue.register("notification.email", _send_email)
 
 
 class NotificationService:
     """
     Resilient Notification Service
-    - Retry on failure
+    - Bodies rendered from precompiled templates (notifications/templates)
+    - Sends are queued on the persistent retry queue (backoff, dead letters)
+    - deliver_now=True sends inline and raises (callers with their own retries, e.g. the outbox)
     - Audited
     """
 
-    def __init__(self):
+    def __init__(self, retry_queue: RetryQueue = None, deliver_now: bool = False):
         self.whatsapp = WhatsAppAdapter()
         self.email = EmailAdapter()
-        self.retry_queue = RetryQueue()
+        self.retry_queue = retry_queue or default_retry_queue
+        self.deliver_now = deliver_now
 
-    def notify_whatsapp(self, to_number: str, message: str):
+    def notify_whatsapp(self, to_number: str, message: str, idempotency_key: str = None):
         MonitoringLogger.log(
             agent="notification",
             action="whatsapp_send_attempt",
             payload={"to": to_number}
         )
 
-        return self.retry_queue.execute(
-            self.whatsapp.send,
+        if self.deliver_now:
+            return self.whatsapp.send(to_number=to_number, message=message)
+        job_id = self.retry_queue.enqueue(
+            "notification.whatsapp",
             {
                 "to_number": to_number,
                 "message": message
-            }
+            },
+            idempotency_key=idempotency_key
         )
+        return {"status": "queued", "job_id": job_id}
 
-    def notify_email(self, to_email: str, subject: str, body: str):
+    def notify_email(self, to_email: str, subject: str, body: str, html_body: str = None, idempotency_key: str = None):
         MonitoringLogger.log(
             agent="notification",
             action="email_send_attempt",
             payload={"to": to_email, "subject": subject}
         )
 
-        return self.retry_queue.execute(
-            self.email.send,
+        if self.deliver_now:
+            return self.email.send(to_email=to_email, subject=subject, body=body, html_body=html_body)
+        job_id = self.retry_queue.enqueue(
+            "notification.email",
             {
                 "to_email": to_email,
                 "subject": subject,
-                "body": body
-            }
+                "body": body,
+                "html_body": html_body
+            },
+            idempotency_key=idempotency_key
         )
+        return {"status": "queued", "job_id": job_id}
     
+    def notify_template(self, to_email: str, template: str, idempotency_key: str = None, **context):
+        """Render notifications/templates/<template>.{txt,html}.j2 and send it"""
+        message = template_registry.render(template, **context)
+        return self.notify_email(to_email, message.subject, message.text, html_body=message.html,
+                                 idempotency_key=idempotency_key)
+
     # --- Appointment-Specific Notifications ---
     
     def send_cancellation_email(self, patient_email: str, patient_name: str, doctor_name: str, appointment_date: str, appointment_time: str):
         """Send cancellation confirmation to patient"""
-        subject = "Appointment Cancelled - Al-Shifa Dental Clinic"
-        body = f"""
-Dear {patient_name},
-
-Your appointment has been successfully cancelled.
-
-Appointment Details:
-- Doctor: Dr. {doctor_name}
-- Date: {appointment_date}
-- Time: {appointment_time}
-
-If you wish to book a new appointment, please log in to your patient portal.
-
-Best regards,
-Al-Shifa Dental Clinic
-        """
-        return self.notify_email(patient_email, subject, body.strip())
+        return self.notify_template(patient_email, "cancellation", patient_name=patient_name, doctor_name=doctor_name,
+                                    appointment_date=appointment_date, appointment_time=appointment_time)
     
     def send_doctor_cancellation_notification(self, doctor_email: str, doctor_name: str, patient_name: str, appointment_date: str, appointment_time: str):
         """Notify doctor about patient cancellation"""
-        subject = f"Appointment Cancelled by Patient - {appointment_date}"
-        body = f"""
-Dear Dr. {doctor_name},
-
-A patient has cancelled their appointment.
-
-Cancelled Appointment:
-- Patient: {patient_name}
-- Date: {appointment_date}
-- Time: {appointment_time}
-
-The slot is now available for other bookings.
-
-Best regards,
-Al-Shifa Dental System
-        """
-        return self.notify_email(doctor_email, subject, body.strip())
+        return self.notify_template(doctor_email, "doctor_cancellation", doctor_name=doctor_name, patient_name=patient_name,
+                                    appointment_date=appointment_date, appointment_time=appointment_time)
     
     def send_reschedule_email(self, patient_email: str, patient_name: str, doctor_name: str, old_date: str, old_time: str, new_date: str, new_time: str):
         """Send reschedule confirmation to patient"""
-        subject = "Appointment Rescheduled - Al-Shifa Dental Clinic"
-        body = f"""
-Dear {patient_name},
-
-Your appointment has been successfully rescheduled.
-
-Previous Appointment:
-- Date: {old_date}
-- Time: {old_time}
-
-New Appointment:
-- Doctor: Dr. {doctor_name}
-- Date: {new_date}
-- Time: {new_time}
-
-Please arrive 10 minutes early for registration.
-
-Best regards,
-Al-Shifa Dental Clinic
-        """
-        return self.notify_email(patient_email, subject, body.strip())
+        return self.notify_template(patient_email, "reschedule", patient_name=patient_name, doctor_name=doctor_name,
+                                    old_date=old_date, old_time=old_time, new_date=new_date, new_time=new_time)
     
     def send_doctor_reschedule_notification(self, doctor_email: str, doctor_name: str, patient_name: str, old_date: str, old_time: str, new_date: str, new_time: str):
         """Notify doctor about appointment reschedule"""
-        subject = f"Appointment Rescheduled - {patient_name}"
-        body = f"""
-Dear Dr. {doctor_name},
-
-An appointment has been rescheduled.
+        return self.notify_template(doctor_email, "doctor_reschedule", doctor_name=doctor_name, patient_name=patient_name,
+                                    old_date=old_date, old_time=old_time, new_date=new_date, new_time=new_time)
 
-Patient: {patient_name}
+    def send_booking_confirmation(self, patient_email: str, patient_name: str, doctor_name: str, start_time, location: str, appointment_id: int = None):
+        """Send booking confirmation to patient (one per appointment)"""
+        return self.notify_template(patient_email, "booking_confirmation",
+                                    idempotency_key=f"booking-confirmation:{appointment_id}" if appointment_id else None,
+                                    patient_name=patient_name, doctor_name=doctor_name,
+                                    start_time=start_time, location=location)
 
-Previous Time:
-- {old_date} at {old_time}
-
-New Time:
-- {new_date} at {new_time}
-
-Please update your schedule accordingly.
-
-Best regards,
-Al-Shifa Dental System
+    def send_appointment_reminders(self, reminders: list) -> list:
+        """
+        Bulk reminders: [{"appointment_id", "patient_email", "patient_name", "doctor_name",
+        "treatment", "start_time", "location"}, ...]. Rendered in one pass and queued in one
+        transaction; the idempotency key makes re-runs of the reminder job no-ops.
         """
-        return self.notify_email(doctor_email, subject, body.strip())
+        messages = template_registry.render_many("appointment_reminder", reminders)
+        jobs = [(
+            {"to_email": r["patient_email"], "subject": m.subject, "body": m.text, "html_body": m.html},
+            f"reminder:{r['appointment_id']}:{r['start_time']}"
+        ) for r, m in zip(reminders, messages)]
+        MonitoringLogger.log(
+            agent="notification",
+            action="email_reminder_batch",
+            payload={"count": len(jobs)}
+        )
+        return self.retry_queue.enqueue_many("notification.email", jobs)
+
+    # --- Inventory Notifications ---
 
     def send_low_stock_notification(self, doctor_email: str, doctor_name: str, item_name: str, current_quantity: int, min_threshold: int):
         """Notify doctor about low inventory stock"""
-        subject = f"🚨 Low Stock Alert: {item_name}"
-        body = f"""
-Dear Dr. {doctor_name},
-
-This is an automated alert to inform you that an inventory item is running low.
-
-Item Details:
-- Name: {item_name}
-- Current Quantity: {current_quantity}
-- Minimum Level: {min_threshold}
-
-Please restock this item soon to ensure uninterrupted operations.
-
-Best regards,
-Al-Shifa Dental System
-        """
-        return self.notify_email(doctor_email, subject, body.strip())
+        return self.notify_template(doctor_email, "low_stock", doctor_name=doctor_name, item_name=item_name,
+                                    current_quantity=current_quantity, min_threshold=min_threshold)
+
+    def send_shortage_forecast_alert(self, doctor_email: str, doctor_name: str, item_name: str, current_quantity: int, needed_quantity: int, date_range: str):
+        """Warn doctor that booked treatments will use more stock than is on hand"""
+        return self.notify_template(doctor_email, "shortage_forecast", doctor_name=doctor_name, item_name=item_name,
+                                    current_quantity=current_quantity, needed_quantity=needed_quantity,
+                                    date_range=date_range)
+
+    def send_inventory_digest(self, doctor_email: str, doctor_name: str, low_stock: list, forecasts: list, idempotency_key: str = None):
+        """One email for all inventory alerts collected by notifications.alert_digest"""
+        return self.notify_template(doctor_email, "inventory_digest", idempotency_key=idempotency_key,
+                                    doctor_name=doctor_name, low_stock=low_stock, forecasts=forecasts)
@@ -0,0 +1,229 @@
+"""
+Persistent SMTP connections for EmailAdapter.
+
+Opening SMTP_SSL/STARTTLS + login costs several round-trips per message;
+a cancellation sends two emails back to back and reminders go out in
+batches. The pool keeps up to `size` authenticated sessions open, reuses
+the most recently used one, closes sessions idle longer than
+`idle_timeout` (servers drop them anyway) or that hit `max_messages`, and
+reconnects once when the server has dropped a session mid-send.
+"""
+
+import logging
+import smtplib
+import time
+from threading import Condition
+from typing import Iterable, List, Optional, Tuple
+
+import config
+from infra.metrics import request_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _is_connection_error(e: Exception) -> bool:
+    """True if the session is dead (retry on a new one), not the message bad."""
+    if isinstance(e, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(e, smtplib.SMTPResponseException):
+        return e.smtp_code == 421  # "service closing transmission channel"
+    # SMTPException subclasses OSError; plain OSErrors are socket failures
+    return isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException)
+
+
+class _Session:
+    __slots__ = ("smtp", "created_at", "last_used", "sent")
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.created_at = self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class SMTPConnectionPool:
+    def __init__(self, host: str = config.EMAIL_HOST, port: int = config.EMAIL_PORT,
+                 user: Optional[str] = config.EMAIL_USER, password: Optional[str] = config.EMAIL_PASSWORD,
+                 security: str = config.EMAIL_SECURITY, size: int = config.EMAIL_SMTP_POOL_SIZE,
+                 idle_timeout: float = config.EMAIL_SMTP_IDLE_TIMEOUT,
+                 max_messages: int = config.EMAIL_SMTP_MAX_MESSAGES, timeout: float = config.EMAIL_SMTP_TIMEOUT):
+        """
+        Args:
+            security: "ssl" (implicit TLS), "starttls" or "none"; "" picks by port (587 -> starttls, else ssl)
+            size: max concurrent SMTP sessions
+            idle_timeout: seconds a session may sit unused before it is closed instead of reused
+            max_messages: recycle a session after this many messages (provider limits)
+        """
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.security = security or ("starttls" if port == 587 else "ssl")
+        self.size = max(1, size)
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self.timeout = timeout
+
+        self.cond = Condition()
+        self.idle: List[_Session] = []  # LIFO: reuse the warmest session
+        self.open_sessions = 0
+        self.connects = 0
+        self.reconnects = 0
+        self.messages = 0
+        self.failures = 0
+        self.idle_closed = 0
+
+    # --- SESSIONS ---
+    def _connect(self) -> _Session:
+        logger.info(f"Connecting to SMTP: {self.host}:{self.port} ({self.security})")
+        if self.security == "ssl":
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.security == "starttls":
+                smtp.ehlo()
+                smtp.starttls()
+            smtp.ehlo()
+            if self.user:
+                smtp.login(self.user, self.password)
+        except Exception:
+            smtp.close()  # half-open (TLS/auth failed): don't leak the socket
+            raise
+        with self.cond:
+            self.connects += 1
+        return _Session(smtp)
+
+    @staticmethod
+    def _close(session: _Session):
+        try:
+            session.smtp.quit()
+        except Exception:
+            try:
+                session.smtp.close()
+            except Exception:
+                pass
+
+    def _acquire(self) -> _Session:
+        stale = []
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                while self.idle:
+                    session = self.idle.pop()
+                    if now - session.last_used <= self.idle_timeout:
+                        break
+                    stale.append(session)
+                    self.open_sessions -= 1
+                    self.idle_closed += 1
+                else:
+                    session = None
+                if session or self.open_sessions < self.size:
+                    if not session:
+                        self.open_sessions += 1
+                    break
+                self.cond.wait()
+
+        for old in stale:
+            self._close(old)
+        if session:
+            return session
+        try:
+            return self._connect()
+        except Exception:
+            self._discard(None)
+            raise
+
+    def _release(self, session: _Session):
+        if session.sent >= self.max_messages:
+            self._discard(session)
+            return
+        session.last_used = time.monotonic()
+        with self.cond:
+            self.idle.append(session)
+            self.cond.notify()
+
+    def _discard(self, session: Optional[_Session]):
+        if session:
+            self._close(session)
+        with self.cond:
+            self.open_sessions -= 1
+            self.cond.notify()
+
+    # --- SENDING ---
+    def _sendmail(self, session: _Session, from_addr: str, to_addrs, message: str):
+        session.smtp.sendmail(from_addr, to_addrs, message)
+        session.sent += 1
+        with self.cond:
+            self.messages += 1
+
+    def send(self, from_addr: str, to_addrs, message: str):
+        """Send one message, reconnecting once if the pooled session was dropped."""
+        self.send_many(from_addr, [(to_addrs, message)], raise_errors=True)
+
+    def send_many(self, from_addr: str, messages: Iterable[Tuple[object, str]],
+                  raise_errors: bool = False) -> List[Optional[Exception]]:
+        """
+        Send [(to_addrs, message), ...] over one session.
+        Returns one entry per message: None if sent, else the exception
+        (a refused recipient doesn't stop the batch). raise_errors re-raises the first one.
+        """
+        results: List[Optional[Exception]] = []
+        session = self._acquire()
+        try:
+            for to_addrs, message in messages:
+                try:
+                    try:
+                        self._sendmail(session, from_addr, to_addrs, message)
+                    except Exception as e:
+                        if not _is_connection_error(e): raise
+                        # Dropped by the server (idle, restart): one fresh session, one retry
+                        logger.warning(f"SMTP session lost ({e}); reconnecting")
+                        self._close(session)
+                        session = None
+                        session = self._connect()
+                        with self.cond:
+                            self.reconnects += 1
+                        self._sendmail(session, from_addr, to_addrs, message)
+                    results.append(None)
+                except Exception as e:
+                    with self.cond:
+                        self.failures += 1
+                    # No session left (reconnect failed, e.g. 535 auth): abort the batch
+                    if raise_errors or session is None or _is_connection_error(e):
+                        raise
+                    results.append(e)
+        except Exception as e:
+            if session is None or _is_connection_error(e):
+                self._discard(session)
+            else:
+                self._release(session)
+            raise
+        self._release(session)
+        return results
+
+    def close_all(self):
+        with self.cond:
+            sessions, self.idle = self.idle, []
+            self.open_sessions -= len(sessions)
+            self.cond.notify_all()
+        for session in sessions:
+            self._close(session)
+
+    def stats(self) -> dict:
+        with self.cond:
+            return {
+                "size": self.size,
+                "open": self.open_sessions,
+                "idle": len(self.idle),
+                "connects": self.connects,
+                "reconnects": self.reconnects,
+                "messages": self.messages,
+                "failures": self.failures,
+                "idle_closed": self.idle_closed,
+                "messages_per_connect": round(self.messages / self.connects, 2) if self.connects else 0.0,
+            }
+
+
+# Global pool (connects lazily on first send)
+smtp_pool = SMTPConnectionPool()
+request_metrics.register_collector("smtp_pool", smtp_pool.stats)
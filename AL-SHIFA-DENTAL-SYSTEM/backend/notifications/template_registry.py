@@ -0,0 +1,104 @@
+"""
+Notification template registry.
+
+Each notification is a Jinja template pair in notifications/templates/:
+  <name>.txt.j2   {% block subject %} + {% block body %} (plain text, no escaping)
+  <name>.html.j2  optional HTML part, autoescaped, usually extends _layout.html.j2
+load() compiles every template once (at startup); render() / render_many()
+then only run the compiled block functions. render_many() resolves the
+templates once and renders a whole batch (e.g. the scheduler's reminders)
+in a single pass.
+"""
+
+import os
+from datetime import date, datetime
+from threading import Lock
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined
+
+import config
+from infra.metrics import request_metrics
+
+
+class RenderedEmail(NamedTuple):
+    subject: str
+    text: str
+    html: Optional[str]
+
+
+def _strftime(value, fmt: str = "%A, %d %b %Y at %I:%M %p") -> str:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.strftime(fmt) if isinstance(value, (date, datetime)) else str(value)
+
+
+class TemplateRegistry:
+    def __init__(self, directory: str = config.NOTIFICATION_TEMPLATE_DIR):
+        self.directory = directory
+        self.env = Environment(
+            loader=FileSystemLoader(directory),
+            autoescape=lambda name: bool(name) and name.endswith(".html.j2"),
+            undefined=StrictUndefined,  # a missing variable is an error, not a blank in a patient email
+            trim_blocks=True,
+            lstrip_blocks=True,
+            auto_reload=False,
+            cache_size=-1,
+        )
+        self.env.filters["strftime"] = _strftime
+        self.lock = Lock()
+        self.templates: Dict[str, tuple] = {}  # name -> (text template, html template or None)
+        self.renders = 0
+
+    # --- LOADING ---
+    def load(self) -> int:
+        """Compile every template in the directory. Returns the number of notifications."""
+        names = sorted({f[:-len(".txt.j2")] for f in os.listdir(self.directory) if f.endswith(".txt.j2")})
+        for name in names:
+            self._get(name)
+        return len(names)
+
+    def _get(self, name: str) -> tuple:
+        pair = self.templates.get(name)
+        if pair is None:
+            with self.lock:
+                pair = self.templates.get(name)
+                if pair is None:
+                    text = self.env.get_template(f"{name}.txt.j2")
+                    html_name = f"{name}.html.j2"
+                    html = self.env.get_template(html_name) \
+                        if os.path.exists(os.path.join(self.directory, html_name)) else None
+                    pair = self.templates[name] = (text, html)
+        return pair
+
+    def names(self) -> List[str]:
+        return sorted(self.templates)
+
+    # --- RENDERING ---
+    def render(self, name: str, **context) -> RenderedEmail:
+        return self.render_many(name, [context])[0]
+
+    def render_many(self, name: str, contexts: Iterable[dict]) -> List[RenderedEmail]:
+        """Render one notification for many recipients (one context dict each)."""
+        text, html = self._get(name)
+        subject_block, body_block = text.blocks["subject"], text.blocks["body"]
+        rendered = []
+        for context in contexts:
+            ctx = text.new_context(context)
+            rendered.append(RenderedEmail(
+                subject="".join(subject_block(ctx)).strip(),
+                text="".join(body_block(ctx)).strip(),
+                html=html.render(context) if html else None,
+            ))
+        with self.lock:
+            self.renders += len(rendered)
+        return rendered
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"templates": len(self.templates), "renders": self.renders}
+
+
+# Global registry (compiled in core.init lifespan, lazily elsewhere)
+template_registry = TemplateRegistry()
+request_metrics.register_collector("notification_templates", template_registry.stats)
@@ -1,9 +1,13 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, SessionLocal
 from auth_dependency import get_current_user
 from models import User, Patient
 from agent.patient_brain import PatientBrain
+from agent.streaming import SSE_HEADERS, sse_event
+from agent.session_store import session_store
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/patient/agent", tags=["Patient AI"])
@@ -11,41 +15,44 @@ router = APIRouter(prefix="/patient/agent", tags=["Patient AI"])
 class ChatRequest(BaseModel):
     query: str
 
-@router.post("/chat")
-def patient_chat(request: ChatRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+# --- SESSION PERSISTENCE ---
+# Only the message history is stored; the brain is rebuilt per request on
+# the request's DB session, so any worker can continue the conversation.
+# These helpers block (DB / session store), so the async routes below call
+# them through asyncio.to_thread to keep the event loop free.
+def _get_brain(db: Session, patient_id: int) -> PatientBrain:
+    return PatientBrain(db, patient_id, history=session_store.get(f"patient:{patient_id}"))
+
+def _save_brain(brain: PatientBrain):
+    session_store.set(f"patient:{brain.patient_id}", brain.messages)
+
+def _get_patient(db: Session, current_user: User) -> Patient:
     if current_user.role != "patient":
         raise HTTPException(status_code=403, detail="Access denied")
     
     patient = db.query(Patient).filter(Patient.user_id == current_user.id).first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient profile not found")
+    return patient
 
-    # --- SESSION PERSISTENCE ---
-    global CHAT_SESSIONS
-    if 'CHAT_SESSIONS' not in globals():
-        CHAT_SESSIONS = {}
+def _commit(db: Session):
+    # CRITICAL: Commit any database changes made by tools
+    try:
+        db.commit()
+        print("DEBUG: Database changes committed successfully")
+    except Exception as commit_err:
+        print(f"DEBUG: Commit failed: {commit_err}")
+        db.rollback()
 
-    if patient.id not in CHAT_SESSIONS:
-        CHAT_SESSIONS[patient.id] = PatientBrain(db, patient.id)
-    
-    brain = CHAT_SESSIONS[patient.id]
-    
-    # CRITICAL: Update DB session for this request (old session is closed)
-    brain.db = db
-    brain.tool_engine.db = db
-    brain.tool_engine.appt_service.db = db
-    # ---------------------------
+@router.post("/chat")
+async def patient_chat(request: ChatRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    patient = await asyncio.to_thread(_get_patient, db, current_user)
+    brain = await asyncio.to_thread(_get_brain, db, patient.id)
     try:
         print(f"DEBUG: Processing query: {request.query}")
-        response_text = brain.process(request.query)
-        
-        # CRITICAL: Commit any database changes made by tools
-        try:
-            db.commit()
-            print("DEBUG: Database changes committed successfully")
-        except Exception as commit_err:
-            print(f"DEBUG: Commit failed: {commit_err}")
-            db.rollback()
+        response_text = await brain.process(request.query)
+        await asyncio.to_thread(_save_brain, brain)
+        await asyncio.to_thread(_commit, db)
         
         print(f"DEBUG: Brain returned: {response_text!r}")
         
@@ -57,6 +64,30 @@ def patient_chat(request: ChatRequest, db: Session = Depends(get_db), current_us
             
     except Exception as e:
         print(f"DEBUG: Error in route: {e}")
-        db.rollback()
+        await asyncio.to_thread(db.rollback)
         return {"response": f"❌ Error: {str(e)}", "text": f"❌ Error: {str(e)}"}
 
+
+@router.post("/chat/stream")
+async def patient_chat_stream(request: ChatRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """SSE variant of /chat: `data: {"token": ...}` events, then `data: {"done": true, "response": ..., "actions": [...]}`."""
+    patient_id = (await asyncio.to_thread(_get_patient, db, current_user)).id
+
+    async def events():
+        # The request-scoped session may be closed before the body finishes streaming
+        stream_db = SessionLocal()
+        try:
+            brain = await asyncio.to_thread(_get_brain, stream_db, patient_id)
+            async for event in brain.stream(request.query):
+                if event.get("done"):
+                    # Commit tool writes before telling the client we're finished
+                    await asyncio.to_thread(_commit, stream_db)
+                    await asyncio.to_thread(_save_brain, brain)
+                yield sse_event(event)
+        except Exception as e:
+            await asyncio.to_thread(stream_db.rollback)
+            yield sse_event({"done": True, "response": f"❌ Error: {str(e)}", "actions": []})
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
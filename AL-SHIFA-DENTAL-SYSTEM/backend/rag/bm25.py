@@ -0,0 +1,90 @@
+"""
+In-memory BM25 index over the knowledge-base chunks.
+
+Catches exact-term queries (drug names, ISO codes, tooth numbers) that
+embedding search tends to blur. RAGStore keeps it in sync with the
+Chroma collection on every upsert/delete.
+"""
+
+import math
+import re
+from collections import Counter
+from threading import Lock
+from typing import Dict, Iterable, List, Tuple
+
+# Words plus joined codes/doses: "iso-3950", "0.12", "ibuprofen"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it of on or the to was what when "
+    "which who with do does should after before".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.lock = Lock()
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {chunk_id: tf}
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, items: Iterable[Tuple[str, str]]):
+        """Index (chunk_id, text) pairs; existing ids are replaced."""
+        with self.lock:
+            for chunk_id, text in items:
+                self._remove(chunk_id)
+                counts = Counter(tokenize(text))
+                for term, tf in counts.items():
+                    self.postings.setdefault(term, {})[chunk_id] = tf
+                length = sum(counts.values())
+                self.doc_lengths[chunk_id] = length
+                self.total_length += length
+
+    def remove(self, chunk_ids: Iterable[str]):
+        with self.lock:
+            for chunk_id in chunk_ids:
+                self._remove(chunk_id)
+
+    def _remove(self, chunk_id: str):
+        length = self.doc_lengths.pop(chunk_id, None)
+        if length is None: return
+        self.total_length -= length
+        # Postings are keyed by term, so scan; removals are rare (file re-index)
+        empty = []
+        for term, docs in self.postings.items():
+            if docs.pop(chunk_id, None) is not None and not docs:
+                empty.append(term)
+        for term in empty:
+            del self.postings[term]
+
+    def clear(self):
+        with self.lock:
+            self.postings.clear()
+            self.doc_lengths.clear()
+            self.total_length = 0
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, score) by BM25."""
+        terms = set(tokenize(query))
+        with self.lock:
+            n = len(self.doc_lengths)
+            if not n or not terms: return []
+            avg_length = self.total_length / n
+            scores: Dict[str, float] = {}
+            for term in terms:
+                docs = self.postings.get(term)
+                if not docs: continue
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for chunk_id, tf in docs.items():
+                    norm = tf + self.k1 * (1 - self.b + self.b * self.doc_lengths[chunk_id] / avg_length)
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
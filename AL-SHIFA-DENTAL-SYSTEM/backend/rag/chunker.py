@@ -0,0 +1,161 @@
+"""
+Token-aware chunking for knowledge-base documents.
+
+1. Split on markdown headers (#, ##, ###); each chunk is prefixed with its
+   header path so it embeds with its context.
+2. Pack sentences into chunks of at most `max_tokens`, carrying roughly
+   `overlap_tokens` of trailing sentences into the next chunk.
+3. A sentence longer than the limit is cut on word boundaries.
+
+Tokens are estimated (words + punctuation), which tracks the embedding
+model's word-piece count closely enough for sizing without loading a
+tokenizer. Page numbers are tracked so PDF chunks can cite their pages.
+"""
+
+import re
+from typing import Iterable, List, Optional, Tuple
+
+import config
+
+HEADER_PATTERN = re.compile(r"^(#{1,3})\s+(.*\S)\s*$")
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+(?=[\"'(\[]?[A-Z0-9•\-])")
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Bump when chunk boundaries change: manifest entries from another version are re-indexed
+# (1 = header-only splitting, 2 = token-limited packing with overlap)
+CHUNKER_VERSION = 2
+
+
+def estimate_tokens(text: str) -> int:
+    return len(TOKEN_PATTERN.findall(text))
+
+
+class Chunk:
+    __slots__ = ("text", "page_start", "page_end")
+
+    def __init__(self, text: str, page_start: Optional[int], page_end: Optional[int]):
+        self.text = text
+        self.page_start = page_start
+        self.page_end = page_end
+
+    def metadata(self) -> dict:
+        if self.page_start is None: return {}
+        return {"page_start": self.page_start, "page_end": self.page_end}
+
+
+class TextChunker:
+    def __init__(self, max_tokens: int = config.RAG_CHUNK_MAX_TOKENS,
+                 overlap_tokens: int = config.RAG_CHUNK_OVERLAP_TOKENS):
+        self.max_tokens = max(16, max_tokens)
+        # Overlap must leave room for new content in every chunk
+        self.overlap_tokens = max(0, min(overlap_tokens, self.max_tokens // 2))
+
+    def signature(self) -> dict:
+        """Everything that decides chunk boundaries; stored per file in kb_manifest.json."""
+        return {"version": CHUNKER_VERSION, "max_tokens": self.max_tokens, "overlap_tokens": self.overlap_tokens}
+
+    def chunk_text(self, text: str) -> List[Chunk]:
+        return self.chunk_pages([(None, text)])
+
+    def chunk_pages(self, pages: Iterable[Tuple[Optional[int], str]]) -> List[Chunk]:
+        """`pages` is [(page_number or None, text), ...] in reading order."""
+        chunks: List[Chunk] = []
+        for header_path, units in self._sections(pages):
+            chunks.extend(self._pack(header_path, units))
+        return chunks
+
+    # --- SECTIONS ---
+    def _sections(self, pages):
+        """
+        Yield (header_path, [(sentence, page, tokens), ...]) per header section.
+        Paragraph breaks and sentence ends both act as split points.
+        """
+        headers: List[str] = []
+        units = []
+        paragraph, paragraph_page = [], None
+
+        def flush_paragraph():
+            nonlocal paragraph, paragraph_page
+            if paragraph:
+                for sentence in SENTENCE_BOUNDARY.split(" ".join(paragraph)):
+                    sentence = sentence.strip()
+                    if sentence:
+                        units.append((sentence, paragraph_page, estimate_tokens(sentence)))
+            paragraph, paragraph_page = [], None
+
+        for page, text in pages:
+            for line in text.split("\n"):
+                stripped = line.strip()
+                match = HEADER_PATTERN.match(stripped)
+                if match:
+                    flush_paragraph()
+                    if units: yield "\n".join(headers), units
+                    units = []
+                    level = len(match.group(1))
+                    headers = headers[:level - 1] + [stripped]
+                elif not stripped:
+                    flush_paragraph()
+                else:
+                    if not paragraph: paragraph_page = page
+                    paragraph.append(stripped)
+            # Page boundary ends the paragraph so page metadata stays exact
+            flush_paragraph()
+        if units or headers:
+            yield "\n".join(headers), units
+
+    # --- PACKING ---
+    def _split_long(self, sentence: str, page, budget: int):
+        words = sentence.split()
+        piece, piece_tokens = [], 0
+        for word in words:
+            t = estimate_tokens(word)
+            if piece and piece_tokens + t > budget:
+                yield " ".join(piece), page, piece_tokens
+                piece, piece_tokens = [], 0
+            piece.append(word)
+            piece_tokens += t
+        if piece:
+            yield " ".join(piece), page, piece_tokens
+
+    def _pack(self, header_path: str, units) -> List[Chunk]:
+        header_tokens = estimate_tokens(header_path) if header_path else 0
+        budget = max(8, self.max_tokens - header_tokens)
+
+        flat = []
+        for sentence, page, tokens in units:
+            if tokens > budget:
+                flat.extend(self._split_long(sentence, page, budget))
+            else:
+                flat.append((sentence, page, tokens))
+
+        if not flat:
+            # Header with no body (e.g. title page) still gets indexed
+            return [Chunk(header_path, None, None)] if header_path else []
+
+        chunks = []
+        window, window_tokens = [], 0
+
+        def emit():
+            body = " ".join(s for s, _, _ in window)
+            text = f"{header_path}\n{body}" if header_path else body
+            page_numbers = [p for _, p, _ in window if p is not None]
+            chunks.append(Chunk(text, min(page_numbers) if page_numbers else None,
+                                max(page_numbers) if page_numbers else None))
+
+        for unit in flat:
+            if window and window_tokens + unit[2] > budget:
+                emit()
+                # Carry trailing sentences (up to overlap_tokens) into the next chunk
+                carried, carried_tokens = [], 0
+                for prev in reversed(window):
+                    if carried_tokens + prev[2] > self.overlap_tokens: break
+                    carried.insert(0, prev)
+                    carried_tokens += prev[2]
+                if carried_tokens + unit[2] > budget:
+                    carried, carried_tokens = [], 0
+                window, window_tokens = carried, carried_tokens
+            window.append(unit)
+            window_tokens += unit[2]
+
+        emit()
+        return chunks
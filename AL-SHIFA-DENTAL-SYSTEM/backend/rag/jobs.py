@@ -0,0 +1,213 @@
+"""
+Background ingestion jobs for knowledge-base uploads.
+
+Extraction + chunking (pypdf, CPU-bound) runs in a process pool so several
+PDFs are parsed in parallel; embedding/upserting runs on a single indexer
+thread because the Chroma collection and manifest want one writer.
+Job state is mirrored to a JSON file per job (RAG_JOB_STATUS_DIR), so a
+status poll answered by another uvicorn worker still finds the job.
+"""
+
+import json
+import multiprocessing
+import os
+import re
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Lock
+from typing import Optional
+
+import config
+from rag.loader import DocumentLoader, extract_chunks
+
+# Finished jobs kept for status polling
+MAX_TRACKED_JOBS = 200
+_JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class IngestionJob:
+    def __init__(self, file_path: str):
+        self.id = uuid.uuid4().hex
+        self.file_path = file_path
+        self.filename = os.path.basename(file_path)
+        self.status = "queued"  # queued -> extracting -> indexing -> done | failed
+        self.pages = None
+        self.chunks = None
+        self.message = ""
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self) -> dict:
+        return _public_dict(self.to_record())
+
+    def to_record(self) -> dict:
+        """Persisted form: to_dict() fields plus raw timestamps."""
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "message": self.message,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _public_dict(record: dict) -> dict:
+    job = {k: v for k, v in record.items() if k not in ("created_at", "finished_at")}
+    job["elapsed_seconds"] = round((record["finished_at"] or time.time()) - record["created_at"], 2)
+    return job
+
+
+class IngestionJobManager:
+    def __init__(self, max_processes: int = config.RAG_INGEST_PROCESSES, status_dir: str = config.RAG_JOB_STATUS_DIR):
+        self.max_processes = max(1, max_processes)
+        self.status_dir = status_dir
+        self.lock = Lock()
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._process_pool = None
+        self._index_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-indexer")
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self._process_pool is None:
+                # spawn, not fork: the API process already runs scheduler/DB threads
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.max_processes,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._process_pool
+
+    # --- SUBMIT ---
+    def submit(self, file_path: str) -> IngestionJob:
+        job = IngestionJob(file_path)
+        with self.lock:
+            self.jobs[job.id] = job
+            while len(self.jobs) > MAX_TRACKED_JOBS:
+                self.jobs.popitem(last=False)
+
+        job.status = "extracting"
+        self._save(job)
+        self._prune()
+        try:
+            future = self._get_process_pool().submit(extract_chunks, file_path)
+        except Exception as e:
+            # No worker processes available (e.g. pool broken): extract on the indexer thread
+            print(f"⚠️ Ingestion pool unavailable, extracting in-process: {e}")
+            self._index_pool.submit(self._extract_and_index, job)
+            return job
+
+        future.add_done_callback(lambda f: self._on_extracted(job, f))
+        return job
+
+    def _on_extracted(self, job: IngestionJob, future):
+        try:
+            extracted = future.result()
+        except Exception as e:
+            self._fail(job, e)
+            return
+        self._index_pool.submit(self._index, job, extracted)
+
+    def _extract_and_index(self, job: IngestionJob):
+        try:
+            extracted = extract_chunks(job.file_path)
+        except Exception as e:
+            self._fail(job, e)
+            return
+        self._index(job, extracted)
+
+    def _index(self, job: IngestionJob, extracted: dict):
+        job.pages = extracted["pages"]
+        job.chunks = len(extracted["chunks"])
+        job.status = "indexing"
+        self._save(job)
+        try:
+            from rag.store import get_rag_store
+            DocumentLoader(get_rag_store()).index_chunks(job.file_path, extracted["chunks"])
+            job.message = f"Successfully indexed {job.chunks} chunks from {job.filename}."
+            job.status = "done"
+        except Exception as e:
+            self._fail(job, e)
+            return
+        finally:
+            job.finished_at = job.finished_at or time.time()
+            self._save(job)
+        print(f"✅ [KB] {job.message} ({job.to_dict()['elapsed_seconds']}s)")
+
+    def _fail(self, job: IngestionJob, error: Exception):
+        job.status = "failed"
+        job.error = str(error)
+        job.finished_at = time.time()
+        self._save(job)
+        print(f"❌ [KB] Ingestion of {job.filename} failed: {error}")
+
+    # --- STATUS FILES ---
+    def _status_path(self, job_id: str) -> str:
+        return os.path.join(self.status_dir, f"{job_id}.json")
+
+    def _save(self, job: IngestionJob):
+        try:
+            os.makedirs(self.status_dir, exist_ok=True)
+            path = self._status_path(job.id)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(job.to_record(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️ [KB] Could not write status for job {job.id}: {e}")
+
+    def _load(self, job_id: str) -> Optional[dict]:
+        try:
+            with open(self._status_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _prune(self):
+        """Keep the newest MAX_TRACKED_JOBS status files."""
+        try:
+            paths = [os.path.join(self.status_dir, name) for name in os.listdir(self.status_dir) if name.endswith(".json")]
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:-MAX_TRACKED_JOBS]:
+                os.remove(path)
+        except OSError:
+            pass
+
+    # --- STATUS ---
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        if job:
+            return job.to_dict()
+        # Submitted on another worker
+        if not _JOB_ID_RE.match(job_id): return None
+        record = self._load(job_id)
+        return _public_dict(record) if record else None
+
+    def list_jobs(self, limit: int = 20) -> list:
+        try:
+            names = [name[:-5] for name in os.listdir(self.status_dir) if name.endswith(".json")]
+        except OSError:
+            names = []
+        records = [r for r in map(self._load, names) if r]
+        with self.lock:
+            # This worker's own jobs are the freshest copy
+            local = {job.id: job.to_record() for job in self.jobs.values()}
+        records = list({**{r["job_id"]: r for r in records}, **local}.values())
+        records.sort(key=lambda r: r["created_at"], reverse=True)
+        return [_public_dict(r) for r in records[:limit]]
+
+    def shutdown(self):
+        with self.lock:
+            pool, self._process_pool = self._process_pool, None
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._index_pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Global job manager instance
+ingestion_jobs = IngestionJobManager()
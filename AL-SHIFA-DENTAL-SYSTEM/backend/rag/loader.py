@@ -1,114 +1,204 @@
 
 import os
 import glob
+import hashlib
+import json
+from threading import Lock
 from rag.store import RAGStore
+from rag.chunker import TextChunker
+
+SUPPORTED_EXTENSIONS = (".txt", ".pdf")
+
+# One writer at a time for kb_manifest.json (uploads + startup sync)
+_manifest_lock = Lock()
+
+
+def chunk_id(source: str, text: str) -> str:
+    """Deterministic id: re-indexing the same chunk overwrites instead of duplicating."""
+    return hashlib.sha256(f"{source}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
 
 class DocumentLoader:
     def __init__(self, store: RAGStore):
         self.store = store
 
+    # --- MANIFEST ---
+    # {filename: {"path", "mtime", "size", "sha256", "chunker": {...}, "ids": [...]}}
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self.store.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        # Collection was wiped behind our back: everything must be re-indexed
+        if manifest and self.store.count() == 0:
+            return {}
+        return manifest
+
+    def _save_manifest(self, manifest: dict):
+        tmp_path = self.store.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.store.manifest_path)
+
     def load_directory(self, directory_path: str):
         """
-        Loads all .txt and .pdf files from a directory into the RAG store.
+        Syncs all .txt and .pdf files from a directory into the RAG store.
+        Unchanged files are skipped; chunks of deleted files are removed.
         """
         if not os.path.exists(directory_path):
             return f"Directory {directory_path} does not exist."
-            
-        count = 0
-        
-        # Load Text Files
-        for file_path in glob.glob(os.path.join(directory_path, "*.txt")):
-            success, msg = self.process_file(file_path)
-            if success:
-                # Extract count from message "Successfully indexed X chunks..."
-                try:
-                    count += int(msg.split(" ")[2])
-                except:
-                    pass
-
-        # Load PDF Files
-        try:
-            import pypdf
-            for file_path in glob.glob(os.path.join(directory_path, "*.pdf")):
-                success, msg = self.process_file(file_path)
-                if success:
-                    try:
-                        count += int(msg.split(" ")[2])
-                    except:
-                        pass
-        except ImportError:
-            print("pypdf not installed, skipping PDFs")
-            
-        return f"Loaded {count} chunks total from {directory_path}."
 
-    def process_file(self, file_path: str):
+        directory_path = os.path.abspath(directory_path)
+        indexed = skipped = removed = 0
+
+        for file_path in sorted(glob.glob(os.path.join(directory_path, "*"))):
+            if not file_path.endswith(SUPPORTED_EXTENSIONS): continue
+            success, result = self._index_file(file_path)
+            if not success:
+                print(f"Skipping {os.path.basename(file_path)}: {result}")
+            elif result["unchanged"]:
+                skipped += 1
+            else:
+                indexed += result["chunks"]
+
+        # Files that disappeared from this directory since the last sync
+        with _manifest_lock:
+            manifest = self._load_manifest()
+            gone = [
+                name for name, entry in manifest.items()
+                if os.path.dirname(entry.get("path", "")) == directory_path and not os.path.exists(entry["path"])
+            ]
+            for name in gone:
+                self.store.delete_ids(manifest.pop(name).get("ids", []))
+                removed += 1
+            if gone:
+                self._save_manifest(manifest)
+
+        return f"Loaded {indexed} chunks total from {directory_path} ({skipped} unchanged files, {removed} removed)."
+
+    def process_file(self, file_path: str, force: bool = False):
+        """
+        Process a single file and add to RAG store (header-aware, size-limited chunks).
+        """
+        success, result = self._index_file(file_path, force=force)
+        if not success:
+            return False, result
+        if result["unchanged"]:
+            return True, f"Already indexed {result['chunks']} chunks from {result['source']} (unchanged)."
+        return True, f"Successfully indexed {result['chunks']} chunks from {result['source']}."
+
+    def _index_file(self, file_path: str, force: bool = False):
         """
-        Process a single file and add to RAG store using header-aware chunking.
+        Returns (True, {"source", "chunks", "unchanged"}) or (False, error message).
+        Only chunks whose content changed are embedded; stale ones are deleted.
         """
         if not os.path.exists(file_path):
              return False, "File not found"
              
         filename = os.path.basename(file_path)
+        if not filename.endswith(SUPPORTED_EXTENSIONS):
+            return False, "Unsupported file format"
         
         try:
-            content = ""
-            if filename.endswith(".txt"):
-                with open(file_path, "r", encoding="utf-8") as f:
-                    content = f.read()
-            elif filename.endswith(".pdf"):
-                import pypdf
-                reader = pypdf.PdfReader(file_path)
-                for page in reader.pages:
-                    content += page.extract_text() + "\n\n"
-            else:
-                return False, "Unsupported file format"
-
-            chunks = self._chunk_by_headers(content)
-            count = 0
-            for chunk in chunks:
-                if len(chunk.strip()) > 20: 
-                    self.store.add_document(chunk.strip(), filename)
-                    count += 1
-            
-            return True, f"Successfully indexed {count} chunks from {filename}."
+            stat = os.stat(file_path)
+            with _manifest_lock:
+                previous = self._load_manifest().get(filename)
+
+            # Cheap check first (mtime/size), then content hash (e.g. touched but identical).
+            # Entries chunked with another chunker version/size are re-indexed even if unchanged.
+            sha = None
+            if previous and not force and previous.get("chunker") == TextChunker().signature():
+                if previous.get("mtime") != stat.st_mtime or previous.get("size") != stat.st_size:
+                    sha = file_sha256(file_path)
+                if sha is None or sha == previous.get("sha256"):
+                    if sha is not None:
+                        self._record(filename, file_path, stat, sha, previous["ids"])
+                    return True, {"source": filename, "chunks": len(previous["ids"]), "unchanged": True}
+
+            extracted = extract_chunks(file_path)
+            return True, self.index_chunks(file_path, extracted["chunks"], sha=sha)
             
         except Exception as e:
             return False, str(e)
 
-    def _chunk_by_headers(self, text: str):
+    def index_chunks(self, file_path: str, chunks: list, sha: str = None) -> dict:
         """
-        Splits text into chunks based on Markdown headers (# or ##).
-        Each chunk includes its header.
+        Apply prepared [(chunk_id, text, metadata), ...] for `file_path` to the store:
+        embed only ids not already indexed, delete ids that disappeared.
         """
-        lines = text.split("\n")
-        chunks = []
-        current_chunk = []
-        
-        main_header = ""
-        sub_header = ""
-        
-        for line in lines:
-            stripped = line.strip()
-            if stripped.startswith("# "):
-                # If we have a previous chunk, save it
-                if current_chunk:
-                    chunks.append("\n".join(current_chunk))
-                main_header = stripped
-                sub_header = ""
-                current_chunk = [line]
-            elif stripped.startswith("## "):
-                if current_chunk:
-                    chunks.append("\n".join(current_chunk))
-                sub_header = stripped
-                # New chunk starts with main header (if any) and then sub-header
-                current_chunk = []
-                if main_header:
-                    current_chunk.append(main_header)
-                current_chunk.append(line)
-            else:
-                current_chunk.append(line)
-                
-        if current_chunk:
-            chunks.append("\n".join(current_chunk))
-            
-        return chunks
+        filename = os.path.basename(file_path)
+        stat = os.stat(file_path)
+        with _manifest_lock:
+            previous = self._load_manifest().get(filename)
+
+        ids = [cid for cid, _, _ in chunks]
+        if previous:
+            old_ids = set(previous.get("ids", []))
+            self.store.delete_ids(old_ids - set(ids))
+        else:
+            # Never tracked: drop any chunks a pre-manifest (uuid) ingest left behind
+            self.store.delete_source(filename)
+            old_ids = set()
+
+        new = [chunk for chunk in chunks if chunk[0] not in old_ids]
+        if new:
+            self.store.upsert_documents(
+                [cid for cid, _, _ in new],
+                [text for _, text, _ in new],
+                [dict(meta, source=filename) for _, _, meta in new]
+            )
+
+        self._record(filename, file_path, stat, sha or file_sha256(file_path), ids)
+        return {"source": filename, "chunks": len(ids), "unchanged": False}
+
+    def _record(self, filename: str, file_path: str, stat, sha: str, ids: list):
+        with _manifest_lock:
+            manifest = self._load_manifest()
+            manifest[filename] = {
+                "path": os.path.abspath(file_path),
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "sha256": sha,
+                "chunker": TextChunker().signature(),
+                "ids": list(ids),
+            }
+            self._save_manifest(manifest)
+
+
+# --- EXTRACTION (pure functions, safe to run in worker processes) ---
+def extract_pages(file_path: str) -> list:
+    """[(page_number or None, text), ...]; text files are a single unnumbered page."""
+    if file_path.endswith(".txt"):
+        with open(file_path, "r", encoding="utf-8") as f:
+            return [(None, f.read())]
+
+    import pypdf
+    reader = pypdf.PdfReader(file_path)
+    return [(number, page.extract_text() or "") for number, page in enumerate(reader.pages, start=1)]
+
+
+def extract_chunks(file_path: str, chunker: TextChunker = None) -> dict:
+    """
+    Read + chunk one file into {"pages": n, "chunks": [(chunk_id, text, metadata), ...]}.
+    Short fragments are dropped and repeated chunks collapse to one id.
+    """
+    source = os.path.basename(file_path)
+    pages = extract_pages(file_path)
+    chunks, seen = [], set()
+    for chunk in (chunker or TextChunker()).chunk_pages(pages):
+        text = chunk.text.strip()
+        if len(text) <= 20: continue
+        cid = chunk_id(source, text)
+        if cid in seen: continue
+        seen.add(cid)
+        chunks.append((cid, text, chunk.metadata()))
+    return {"pages": len(pages), "chunks": chunks}
@@ -0,0 +1,108 @@
+"""
+Hybrid retrieval for consult_knowledge_base: Chroma (semantic) + BM25
+(exact terms) fused with reciprocal-rank fusion, then an optional local
+cross-encoder rerank of the fused candidates.
+"""
+
+import time
+from threading import Lock
+from typing import Dict, List, Optional
+
+import config
+from rag.store import RAGStore, get_rag_store
+
+# Standard RRF damping constant (Cormack et al.)
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[tuple]:
+    """[(id, fused_score), ...] best first, from several best-first id lists."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+
+class CrossEncoderReranker:
+    """Thin wrapper over sentence-transformers' CrossEncoder (optional dependency)."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name)
+
+    def rerank(self, query: str, docs: List[dict]) -> List[dict]:
+        if not docs: return docs
+        scores = self.model.predict([(query, d["text"]) for d in docs])
+        for doc, score in zip(docs, scores):
+            doc["rerank_score"] = float(score)
+        return sorted(docs, key=lambda d: d["rerank_score"], reverse=True)
+
+
+class HybridRetriever:
+    def __init__(self, store: RAGStore, reranker: Optional[CrossEncoderReranker] = None,
+                 candidates: int = config.RAG_RETRIEVAL_CANDIDATES, use_cache: bool = True):
+        self.store = store
+        self.reranker = reranker
+        self.candidates = candidates
+        self.use_cache = use_cache
+
+    def vector_ids(self, query: str, n: int) -> List[str]:
+        if not self.store.count(): return []
+        results = self.store.search(query, n_results=min(n, self.store.count()), use_cache=self.use_cache)
+        return results["ids"][0] if results["ids"] else []
+
+    def keyword_ids(self, query: str, n: int) -> List[str]:
+        self.store.refresh_if_stale()
+        return [doc_id for doc_id, _ in self.store.bm25.search(query, n)]
+
+    def retrieve(self, query: str, k: int = 3) -> List[dict]:
+        """
+        Top-k chunks as [{"id", "text", "source", "score", "page_start", "page_end"}, ...].
+        Each ranker contributes `candidates` ids; RRF merges them.
+        """
+        started = time.perf_counter()
+        fused = reciprocal_rank_fusion([
+            self.vector_ids(query, self.candidates),
+            self.keyword_ids(query, self.candidates),
+        ])
+        # Without a reranker only the top-k are needed; with one, rerank the whole pool
+        pool = fused if self.reranker else fused[:k]
+        docs_by_id = self.store.get_documents([doc_id for doc_id, _ in pool])
+
+        docs = []
+        for doc_id, score in pool:
+            if doc_id not in docs_by_id: continue
+            text, meta = docs_by_id[doc_id]
+            docs.append({
+                "id": doc_id, "text": text, "source": meta.get("source", "unknown"), "score": score,
+                "page_start": meta.get("page_start"), "page_end": meta.get("page_end"),
+            })
+
+        if self.reranker:
+            docs = self.reranker.rerank(query, docs)
+        print(f"DEBUG: Hybrid retrieval ({len(fused)} candidates) took {(time.perf_counter() - started) * 1000:.1f} ms")
+        return docs[:k]
+
+
+# --- SHARED INSTANCE ---
+_retriever = None
+_retriever_lock = Lock()
+
+def load_reranker(model_name: str = config.RAG_RERANKER_MODEL) -> Optional[CrossEncoderReranker]:
+    if not model_name: return None
+    try:
+        return CrossEncoderReranker(model_name)
+    except ImportError:
+        print("⚠️ sentence-transformers not installed, reranking disabled")
+    except Exception as e:
+        print(f"⚠️ Could not load reranker {model_name}: {e}")
+    return None
+
+def get_retriever() -> HybridRetriever:
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = HybridRetriever(get_rag_store(), reranker=load_reranker())
+    return _retriever
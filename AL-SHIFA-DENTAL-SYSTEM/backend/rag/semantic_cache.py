@@ -0,0 +1,127 @@
+"""
+Semantic cache in front of RAGStore.search.
+
+Near-identical questions ("extraction aftercare" / "post-extraction
+instructions") reuse the chunk ids retrieved for an earlier query when
+their embeddings are within a cosine-similarity threshold. Exact repeats
+skip the embedding call too. Any change to the collection invalidates
+everything (chunk ids may no longer be the best, or may not exist).
+"""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class _Entry:
+    __slots__ = ("embedding", "ids", "n_results")
+
+    def __init__(self, embedding: np.ndarray, ids: List[str], n_results: int):
+        self.embedding = embedding
+        self.ids = ids
+        self.n_results = n_results
+
+
+class SemanticQueryCache:
+    def __init__(self, embed, threshold: float = 0.92, max_size: int = 512):
+        """
+        Args:
+            embed: callable(list[str]) -> list of vectors (the store's embedding function)
+            threshold: minimum cosine similarity for a semantic hit
+            max_size: entries kept (least recently used evicted)
+        """
+        self.embed = embed
+        self.threshold = threshold
+        self.max_size = max_size
+        self.lock = Lock()
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self.generation = 0
+        self._matrix = None
+        self._matrix_keys: List[str] = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.embed_seconds = 0.0
+
+    def lookup(self, query: str, n_results: int) -> Tuple[Optional[List[str]], Optional[Any], int]:
+        """
+        Returns (chunk_ids or None, query embedding or None, generation).
+        On a miss the embedding is returned so the caller can query with it
+        instead of embedding twice; pass generation back to store().
+        """
+        key = _normalize_query(query)
+        with self.lock:
+            generation = self.generation
+            entry = self.entries.get(key)
+            if entry is not None and entry.n_results >= n_results:
+                self.entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry.ids[:n_results], None, generation
+
+        started = time.perf_counter()
+        embedding = np.asarray(self.embed([query])[0], dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        unit = embedding / norm if norm else embedding
+
+        with self.lock:
+            self.embed_seconds += time.perf_counter() - started
+            if generation == self.generation and self.entries:
+                matrix, keys = self._get_matrix()
+                sims = matrix @ unit
+                best = int(np.argmax(sims))
+                entry = self.entries.get(keys[best])
+                if sims[best] >= self.threshold and entry is not None and entry.n_results >= n_results:
+                    self.entries.move_to_end(keys[best])
+                    self.semantic_hits += 1
+                    return entry.ids[:n_results], embedding, generation
+            self.misses += 1
+        return None, embedding, generation
+
+    def store(self, query: str, embedding, ids: List[str], n_results: int, generation: int):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        with self.lock:
+            # Collection changed while this query was running: result may be stale
+            if generation != self.generation: return
+            self.entries[_normalize_query(query)] = _Entry(vector / norm if norm else vector, list(ids), n_results)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self._matrix = None
+
+    def _get_matrix(self):
+        if self._matrix is None:
+            self._matrix_keys = list(self.entries.keys())
+            self._matrix = np.vstack([self.entries[k].embedding for k in self._matrix_keys])
+        return self._matrix, self._matrix_keys
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            if self.entries:
+                self.invalidations += 1
+            self.entries.clear()
+            self._matrix = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "embed_seconds_total": round(self.embed_seconds, 6),
+            }
@@ -1,46 +1,183 @@
 
 import chromadb
 from chromadb.config import Settings
+from chromadb.utils import embedding_functions
+from threading import Lock
 import uuid
 import os
 
+import config
+from rag.bm25 import BM25Index
+from rag.semantic_cache import SemanticQueryCache
+
+KNOWLEDGE_BASE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "knowledge_base")
+
+# Max chunks per collection.upsert call
+UPSERT_BATCH_SIZE = 256
+
 class RAGStore:
     def __init__(self, persist_directory="./data/chroma_db"):
         self.client = chromadb.PersistentClient(path=persist_directory)
+        # Per-file ingestion manifest (see rag.loader), kept beside the chroma dir
+        self.manifest_path = os.path.join(os.path.dirname(os.path.abspath(persist_directory)), "kb_manifest.json")
+        # Replaced on every write, so other workers' stores notice and resync
+        self.version_path = os.path.join(os.path.dirname(os.path.abspath(persist_directory)), "kb_version")
+        self._seen_version = self._version_stamp()
+        self._refresh_lock = Lock()
+        self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
         
         # Create or get the collection
         self.collection = self.client.get_or_create_collection(
             name="clinical_knowledge",
-            metadata={"hnsw:space": "cosine"} # Cosine similarity for text matching
+            metadata={"hnsw:space": "cosine"}, # Cosine similarity for text matching
+            embedding_function=self.embedding_function
+        )
+
+        # Keyword index over the same chunks (hybrid retrieval, see rag.retriever)
+        self.bm25 = BM25Index()
+        self._build_bm25()
+
+        # Near-duplicate queries reuse earlier chunk ids; cleared on any write (any worker's)
+        self.query_cache = SemanticQueryCache(
+            self.embedding_function,
+            threshold=config.RAG_QUERY_CACHE_THRESHOLD,
+            max_size=config.RAG_QUERY_CACHE_SIZE
         )
 
+    def _build_bm25(self, index: BM25Index = None, page_size: int = 1000):
+        index = index or self.bm25
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents"], limit=page_size, offset=offset)
+            if not page["ids"]: break
+            index.add(zip(page["ids"], page["documents"]))
+            offset += len(page["ids"])
+
+    # --- CROSS-WORKER SYNC ---
+    # Each uvicorn worker holds its own BM25 index; the shared Chroma dir is
+    # the source of truth. Writers replace kb_version, readers stat it.
+    def _version_stamp(self):
+        try:
+            st = os.stat(self.version_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns)
+
+    def _mark_changed(self):
+        # Someone else wrote since we last looked: stay stale so we resync too
+        stale = self._version_stamp() != self._seen_version
+        tmp_path = f"{self.version_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, self.version_path)
+        if not stale:
+            self._seen_version = self._version_stamp()
+
+    def refresh_if_stale(self):
+        """Another worker changed the collection: rebuild the keyword index and drop cached queries."""
+        stamp = self._version_stamp()
+        if stamp == self._seen_version: return
+        with self._refresh_lock:
+            if stamp == self._seen_version: return
+            bm25 = BM25Index()
+            self._build_bm25(bm25)
+            self.bm25 = bm25
+            self.query_cache.invalidate()
+            self._seen_version = stamp
+
     def add_document(self, text: str, source: str):
         """
         Add a document chunk to the vector store.
         """
+        doc_id = str(uuid.uuid4())
         self.collection.add(
             documents=[text],
             metadatas=[{"source": source}],
-            ids=[str(uuid.uuid4())]
+            ids=[doc_id]
         )
+        self.bm25.add([(doc_id, text)])
+        self.query_cache.invalidate()
+        self._mark_changed()
+
+    def upsert_documents(self, ids: list, texts: list, metadatas: list):
+        """
+        Insert or replace chunks by id, in batches (one embedding call per batch).
+        """
+        batch_size = min(UPSERT_BATCH_SIZE, self.client.get_max_batch_size())
+        for i in range(0, len(ids), batch_size):
+            self.collection.upsert(
+                ids=ids[i:i + batch_size],
+                documents=texts[i:i + batch_size],
+                metadatas=metadatas[i:i + batch_size]
+            )
+        self.bm25.add(zip(ids, texts))
+        self.query_cache.invalidate()
+        self._mark_changed()
+
+    def delete_ids(self, ids: list):
+        if ids:
+            self.collection.delete(ids=list(ids))
+            self.bm25.remove(ids)
+            self.query_cache.invalidate()
+            self._mark_changed()
 
-    def search(self, query: str, n_results: int = 3):
+    def delete_source(self, source: str):
+        """Remove every chunk indexed from `source` (file name)."""
+        self.delete_ids(self.collection.get(where={"source": source}, include=[])["ids"])
+
+    def get_documents(self, ids: list) -> dict:
+        """{id: (text, metadata)} for the given chunk ids."""
+        if not ids: return {}
+        found = self.collection.get(ids=list(ids), include=["documents", "metadatas"])
+        return {i: (doc, meta or {}) for i, doc, meta in zip(found["ids"], found["documents"], found["metadatas"])}
+
+    def search(self, query: str, n_results: int = 3, use_cache: bool = True):
         """
         Search for relevant documents.
+        use_cache=False always queries the collection (benchmarks measuring real retrieval).
         """
+        self.refresh_if_stale()
+        if not use_cache:
+            return self.collection.query(query_texts=[query], n_results=n_results)
+
+        cached_ids, embedding, generation = self.query_cache.lookup(query, n_results)
+        if cached_ids is not None:
+            return self._results_for_ids(cached_ids)
+
         results = self.collection.query(
-            query_texts=[query],
+            query_embeddings=[embedding],
             n_results=n_results
         )
+        self.query_cache.store(query, embedding, results["ids"][0], n_results, generation)
         return results
 
+    def _results_for_ids(self, ids: list) -> dict:
+        """Rebuild a collection.query()-shaped result for cached chunk ids."""
+        docs = self.get_documents(ids)
+        ids = [i for i in ids if i in docs]
+        return {
+            "ids": [ids],
+            "documents": [[docs[i][0] for i in ids]],
+            "metadatas": [[docs[i][1] for i in ids]],
+            "distances": None,
+        }
+
     def reset(self):
         """
         Clear the database.
         """
         try:
             self.client.delete_collection("clinical_knowledge")
-            self.collection = self.client.get_or_create_collection(name="clinical_knowledge")
+            self.collection = self.client.get_or_create_collection(
+                name="clinical_knowledge",
+                metadata={"hnsw:space": "cosine"},
+                embedding_function=self.embedding_function
+            )
+            self.bm25.clear()
+            self.query_cache.invalidate()
+            self._mark_changed()
+            if os.path.exists(self.manifest_path):
+                os.remove(self.manifest_path)
             return True
         except Exception as e:
             print(f"Error resetting RAG store: {e}")
@@ -48,3 +185,30 @@ class RAGStore:
             
     def count(self):
         return self.collection.count()
+
+    def warm_up(self):
+        """Load the embedding model now so the first search doesn't pay for it."""
+        self.embedding_function(["warm up"])
+
+
+# --- SHARED INSTANCE ---
+_shared_store = None
+_shared_store_lock = Lock()
+
+def get_rag_store() -> RAGStore:
+    """
+    Process-wide RAGStore, created on first use (normally at startup).
+    Syncs the knowledge_base directory into the collection.
+    """
+    global _shared_store
+    if _shared_store is None:
+        with _shared_store_lock:
+            if _shared_store is None:
+                from rag.loader import DocumentLoader
+                store = RAGStore()
+                # Incremental: only new/changed files are (re)embedded
+                print(DocumentLoader(store).load_directory(KNOWLEDGE_BASE_DIR))
+                from infra.metrics import request_metrics
+                request_metrics.register_collector("rag_query_cache", store.query_cache.stats)
+                _shared_store = store
+    return _shared_store
@@ -1,14 +1,14 @@
 from sqlalchemy.orm import Session
 from models import Appointment, Patient, User, Invoice, Doctor
 from datetime import datetime, timedelta
-from notifications.service import NotificationService
+from notifications.outbox import enqueue_notification
 from services.inventory_service import InventoryService
+from services.availability_service import AvailabilityService
 
 class AppointmentService:
     def __init__(self, db: Session, doctor_id: int):
         self.db = db
         self.doc_id = doctor_id
-        self.notifier = NotificationService()
 
     def get_schedule(self, date_str: str = None, range_days: int = 0):
         query = self.db.query(Appointment).filter(Appointment.doctor_id == self.doc_id)
@@ -228,34 +228,33 @@ class AppointmentService:
         if invoice:
             invoice.status = "cancelled"
         
-        self.db.commit()
-        
-        # Send notifications to both doctor and patient
-        try:
-            patient = self.db.query(Patient).filter(Patient.id == patient_id).first()
-            doctor = self.db.query(Doctor).filter(Doctor.id == appt.doctor_id).first()
+        # Queue notifications to both doctor and patient in the same transaction
+        # (sent by the outbox dispatcher; SMTP never blocks this request)
+        patient = self.db.query(Patient).filter(Patient.id == patient_id).first()
+        doctor = self.db.query(Doctor).filter(Doctor.id == appt.doctor_id).first()
+        
+        if patient and doctor:
+            # Notify patient
+            enqueue_notification(
+                self.db, "send_cancellation_email",
+                patient_email=patient.user.email,
+                patient_name=patient.user.full_name,
+                doctor_name=doctor.user.full_name,
+                appointment_date=appt.start_time.strftime("%d %b %Y"),
+                appointment_time=appt.start_time.strftime("%I:%M %p")
+            )
             
-            if patient and doctor:
-                # Notify patient
-                self.notifier.send_cancellation_email(
-                    patient_email=patient.user.email,
-                    patient_name=patient.user.full_name,
-                    doctor_name=doctor.user.full_name,
-                    appointment_date=appt.start_time.strftime("%d %b %Y"),
-                    appointment_time=appt.start_time.strftime("%I:%M %p")
-                )
-                
-                # Notify doctor
-                self.notifier.send_doctor_cancellation_notification(
-                    doctor_email=doctor.user.email,
-                    doctor_name=doctor.user.full_name,
-                    patient_name=patient.user.full_name,
-                    appointment_date=appt.start_time.strftime("%d %b %Y"),
-                    appointment_time=appt.start_time.strftime("%I:%M %p")
-                )
-        except Exception as e:
-            print(f"Notification error: {e}")
-            # Don't fail cancellation if notification fails
+            # Notify doctor
+            enqueue_notification(
+                self.db, "send_doctor_cancellation_notification",
+                doctor_email=doctor.user.email,
+                doctor_name=doctor.user.full_name,
+                patient_name=patient.user.full_name,
+                appointment_date=appt.start_time.strftime("%d %b %Y"),
+                appointment_time=appt.start_time.strftime("%I:%M %p")
+            )
+        
+        self.db.commit()
         
         return appt
 
@@ -327,40 +326,39 @@ class AppointmentService:
             # Update appointment times
             appt.start_time = start_dt
             appt.end_time = end_dt
-            self.db.commit()
             
-            # Send notifications to both doctor and patient
-            try:
-                patient = self.db.query(Patient).filter(Patient.id == patient_id).first()
+            # Queue notifications to both doctor and patient with the change
+            patient = self.db.query(Patient).filter(Patient.id == patient_id).first()
+            
+            if patient and doctor:
+                new_date_str = start_dt.strftime("%d %b %Y")
+                new_time_str = start_dt.strftime("%I:%M %p")
                 
-                if patient and doctor:
-                    new_date_str = start_dt.strftime("%d %b %Y")
-                    new_time_str = start_dt.strftime("%I:%M %p")
-                    
-                    # Notify patient
-                    self.notifier.send_reschedule_email(
-                        patient_email=patient.user.email,
-                        patient_name=patient.user.full_name,
-                        doctor_name=doctor.user.full_name,
-                        old_date=old_date,
-                        old_time=old_time,
-                        new_date=new_date_str,
-                        new_time=new_time_str
-                    )
-                    
-                    # Notify doctor
-                    self.notifier.send_doctor_reschedule_notification(
-                        doctor_email=doctor.user.email,
-                        doctor_name=doctor.user.full_name,
-                        patient_name=patient.user.full_name,
-                        old_date=old_date,
-                        old_time=old_time,
-                        new_date=new_date_str,
-                        new_time=new_time_str
-                    )
-            except Exception as e:
-                print(f"Notification error: {e}")
-                # Don't fail reschedule if notification fails
+                # Notify patient
+                enqueue_notification(
+                    self.db, "send_reschedule_email",
+                    patient_email=patient.user.email,
+                    patient_name=patient.user.full_name,
+                    doctor_name=doctor.user.full_name,
+                    old_date=old_date,
+                    old_time=old_time,
+                    new_date=new_date_str,
+                    new_time=new_time_str
+                )
+                
+                # Notify doctor
+                enqueue_notification(
+                    self.db, "send_doctor_reschedule_notification",
+                    doctor_email=doctor.user.email,
+                    doctor_name=doctor.user.full_name,
+                    patient_name=patient.user.full_name,
+                    old_date=old_date,
+                    old_time=old_time,
+                    new_date=new_date_str,
+                    new_time=new_time_str
+                )
+            
+            self.db.commit()
             
             return appt
             
@@ -383,29 +381,30 @@ class AppointmentService:
         # Implementation for doctor blocking (simplified here)
         return self.book_appointment(None, date_str, time_str, "Blocked") 
 
-    def get_available_slots(self, date_str: str):
+    def get_available_slots(self, date_str: str, doctor_id: int = None):
         """
-        Generate available 30-minute slots for a given date (09:00 - 17:00).
+        Available slots for a given date, on the doctor's configured grid.
         """
-        booked = self.get_schedule(date_str)
-        booked_times = {a.start_time.strftime("%H:%M") for a in booked if a.status != 'cancelled'}
-        
-        slots = []
-        start_hour = 9  # 9 AM
-        end_hour = 17   # 5 PM
-        
-        current_dt = datetime.strptime(f"{date_str} {start_hour}:00", "%Y-%m-%d %H:%M")
-        end_dt_limit = datetime.strptime(f"{date_str} {end_hour}:00", "%Y-%m-%d %H:%M")
-        
-        while current_dt < end_dt_limit:
-            time_str = current_dt.strftime("%H:%M")
-            if time_str not in booked_times:
-                # Extra check: Don't show past slots for TODAY
-                if current_dt > datetime.now():
-                    slots.append(time_str)
-            current_dt += timedelta(minutes=30)
-            
-        return slots 
+        return self.get_available_slots_range(date_str, 1, doctor_id).get(date_str, [])
+
+    def get_available_slots_range(self, date_str: str, days: int = 1, doctor_id: int = None):
+        """
+        Available slots for `days` consecutive days: {"YYYY-MM-DD": ["HH:MM", ...]}.
+        Loads the doctor's intervals once for the whole range.
+        """
+        start_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        engine = AvailabilityService(self.db, doctor_id or self.doc_id)
+        return engine.free_slots(start_date, days)
+
+    def search_availability(self, treatment: str, start_date: str, end_date: str = None, hospital_id: int = None, limit: int = 5):
+        """
+        Earliest free slots across all doctors offering a treatment in a date range.
+        Dates are YYYY-MM-DD; end_date defaults to 6 days after start_date.
+        """
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else start + timedelta(days=6)
+        if end < start: raise ValueError("End date must be on or after the start date.")
+        return AvailabilityService(self.db).search(treatment, start, end, hospital_id=hospital_id, limit=limit)
 
     def analyze_schedule(self, date_str: str):
         """
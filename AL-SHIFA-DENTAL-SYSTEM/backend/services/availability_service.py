@@ -0,0 +1,238 @@
+import json
+from bisect import bisect_left
+from datetime import datetime, date, timedelta
+from heapq import merge
+from itertools import islice, repeat
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+from models import Appointment, Doctor, Hospital, Treatment, User
+
+DEFAULT_SCHEDULE = {
+    "work_start_time": "09:00",
+    "work_end_time": "17:00",
+    "slot_duration": 30,
+    "break_duration": 0,
+}
+
+# Doctors per range query in multi-doctor searches (keeps IN lists bounded)
+DOCTOR_BATCH_SIZE = 200
+MAX_SEARCH_DAYS = 31
+
+
+def parse_schedule_config(raw: Optional[str]) -> dict:
+    """
+    Parse Doctor.scheduling_config (JSON string) into a validated dict.
+    Falls back to the 09:00-17:00 / 30 min defaults for missing or bad values.
+    """
+    config = dict(DEFAULT_SCHEDULE)
+    if raw:
+        try:
+            loaded = json.loads(raw)
+            if isinstance(loaded, dict):
+                config.update({k: v for k, v in loaded.items() if v not in (None, "")})
+        except (json.JSONDecodeError, TypeError):
+            pass
+
+    try:
+        start = datetime.strptime(str(config["work_start_time"]), "%H:%M").time()
+        end = datetime.strptime(str(config["work_end_time"]), "%H:%M").time()
+        if end <= start: raise ValueError
+    except ValueError:
+        start = datetime.strptime(DEFAULT_SCHEDULE["work_start_time"], "%H:%M").time()
+        end = datetime.strptime(DEFAULT_SCHEDULE["work_end_time"], "%H:%M").time()
+
+    try: slot = int(config["slot_duration"])
+    except (TypeError, ValueError): slot = DEFAULT_SCHEDULE["slot_duration"]
+    try: brk = int(config["break_duration"])
+    except (TypeError, ValueError): brk = 0
+
+    config["work_start_time"] = start.strftime("%H:%M")
+    config["work_end_time"] = end.strftime("%H:%M")
+    config["slot_duration"] = slot if slot > 0 else DEFAULT_SCHEDULE["slot_duration"]
+    config["break_duration"] = max(0, brk)
+    return config
+
+
+class BusyIntervals:
+    """
+    Sorted, merged (non-overlapping) busy intervals for one doctor.
+    Merging up front means a single bisect answers any overlap query, and a
+    forward-only pointer answers a whole sorted run of slots in one pass.
+    """
+
+    def __init__(self, intervals: Iterable[tuple] = ()):
+        merged = []
+        for start, end in sorted(intervals):
+            if end <= start: continue
+            if merged and start <= merged[-1][1]:
+                if end > merged[-1][1]: merged[-1][1] = end
+            else:
+                merged.append([start, end])
+        self.starts = [m[0] for m in merged]
+        self.ends = [m[1] for m in merged]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        # Last interval starting before `end` is the only candidate
+        idx = bisect_left(self.starts, end) - 1
+        return idx >= 0 and self.ends[idx] > start
+
+
+class AvailabilityService:
+    def __init__(self, db: Session, doctor_id: int = None):
+        self.db = db
+        self.doc_id = doctor_id
+
+    # --- LOADING ---
+    def load_busy(self, doctor_ids: List[int], range_start: datetime, range_end: datetime) -> Dict[int, BusyIntervals]:
+        """One range query for all given doctors' non-cancelled intervals."""
+        rows = self.db.query(Appointment.doctor_id, Appointment.start_time, Appointment.end_time).filter(
+            Appointment.doctor_id.in_(doctor_ids),
+            Appointment.start_time < range_end,
+            Appointment.end_time > range_start,
+            Appointment.status != "cancelled"
+        ).all()
+
+        grouped = {doc_id: [] for doc_id in doctor_ids}
+        for doc_id, start, end in rows:
+            if start and end: grouped[doc_id].append((start, end))
+        return {doc_id: BusyIntervals(intervals) for doc_id, intervals in grouped.items()}
+
+    def get_config(self, doctor_id: int) -> dict:
+        raw = self.db.query(Doctor.scheduling_config).filter(Doctor.id == doctor_id).scalar()
+        return parse_schedule_config(raw)
+
+    # --- SWEEP ---
+    @staticmethod
+    def iter_candidates(config: dict, start_date: date, days: int) -> Iterator[tuple]:
+        """Yield (slot_start, slot_end) on the doctor's grid, in time order."""
+        work_start = datetime.strptime(config["work_start_time"], "%H:%M").time()
+        work_end = datetime.strptime(config["work_end_time"], "%H:%M").time()
+        slot = timedelta(minutes=config["slot_duration"])
+        step = slot + timedelta(minutes=config["break_duration"])
+
+        for offset in range(days):
+            day = start_date + timedelta(days=offset)
+            current = datetime.combine(day, work_start)
+            day_end = datetime.combine(day, work_end)
+            while current + slot <= day_end:
+                yield current, current + slot
+                current += step
+
+    @classmethod
+    def iter_free(cls, config: dict, busy: BusyIntervals, start_date: date, days: int, now: datetime = None) -> Iterator[datetime]:
+        """
+        Single forward pass over grid slots and merged busy intervals.
+        Both sequences are sorted, so the busy pointer never moves backwards.
+        """
+        now = now or datetime.now()
+        starts, ends = busy.starts, busy.ends
+        j = 0
+        for slot_start, slot_end in cls.iter_candidates(config, start_date, days):
+            while j < len(ends) and ends[j] <= slot_start:
+                j += 1
+            if j < len(starts) and starts[j] < slot_end:
+                continue
+            if slot_start > now:
+                yield slot_start
+
+    # --- QUERIES ---
+    def free_slots(self, start_date: date, days: int = 1, doctor_id: int = None) -> Dict[str, List[str]]:
+        """
+        Free slots for `days` consecutive days starting at `start_date`.
+        Returns {"YYYY-MM-DD": ["HH:MM", ...]} with an entry for every day.
+        """
+        target = doctor_id or self.doc_id
+        if not target: raise ValueError("Doctor ID required for availability.")
+        days = max(1, days)
+
+        config = self.get_config(target)
+        range_start = datetime.combine(start_date, datetime.min.time())
+        busy = self.load_busy([target], range_start, range_start + timedelta(days=days))[target]
+
+        result = {(start_date + timedelta(days=i)).strftime("%Y-%m-%d"): [] for i in range(days)}
+        for slot in self.iter_free(config, busy, start_date, days):
+            result[slot.strftime("%Y-%m-%d")].append(slot.strftime("%H:%M"))
+        return result
+
+    def occupied_slots(self, day: date, doctor_id: int = None) -> List[datetime]:
+        """Grid slots on `day` that overlap any non-cancelled appointment/block."""
+        target = doctor_id or self.doc_id
+        if not target: raise ValueError("Doctor ID required for availability.")
+
+        config = self.get_config(target)
+        range_start = datetime.combine(day, datetime.min.time())
+        busy = self.load_busy([target], range_start, range_start + timedelta(days=1))[target]
+        return [start for start, end in self.iter_candidates(config, day, 1) if busy.overlaps(start, end)]
+
+    def search(self, treatment: str, start_date: date, end_date: date, hospital_id: int = None, limit: int = 5) -> List[dict]:
+        """
+        Earliest `limit` free slots across every doctor offering `treatment`
+        between start_date and end_date (inclusive), optionally within one hospital.
+        A doctor offers a treatment if it is theirs or a hospital-level one
+        (doctor_id NULL) of their hospital. Busy intervals come from one range
+        query per batch of doctors. Ranges over MAX_SEARCH_DAYS raise ValueError.
+        """
+        days = (end_date - start_date).days + 1
+        if days > MAX_SEARCH_DAYS:
+            raise ValueError(f"Date range too long: search at most {MAX_SEARCH_DAYS} days at a time.")
+        if days < 1 or limit < 1: return []
+
+        query = self.db.query(
+            Doctor.id, Doctor.scheduling_config, User.full_name, Hospital.name, Treatment.name, Treatment.cost
+        ).join(Treatment, or_(
+            Treatment.doctor_id == Doctor.id,
+            and_(Treatment.doctor_id.is_(None), Treatment.hospital_id == Doctor.hospital_id)
+        )).join(User, User.id == Doctor.user_id
+        ).outerjoin(Hospital, Hospital.id == Doctor.hospital_id
+        ).filter(
+            Treatment.name.ilike(f"%{treatment.strip()}%"),
+            Doctor.is_verified == True
+        )
+        if hospital_id:
+            query = query.filter(Doctor.hospital_id == hospital_id)
+
+        doctors = {}
+        # Doctor's own treatments sort before the hospital-level ones
+        rows = query.order_by(Doctor.id, Treatment.doctor_id.is_(None)).all()
+        for doc_id, raw_config, doc_name, hospital_name, treat_name, cost in rows:
+            # One row per doctor, even if several of their treatments match
+            doctors.setdefault(doc_id, {
+                "config": parse_schedule_config(raw_config),
+                "doctor_name": doc_name,
+                "hospital_name": hospital_name or "",
+                "treatment": treat_name,
+                "cost": cost,
+            })
+        if not doctors: return []
+
+        range_start = datetime.combine(start_date, datetime.min.time())
+        range_end = range_start + timedelta(days=days)
+        doc_ids = list(doctors.keys())
+
+        streams = []
+        for i in range(0, len(doc_ids), DOCTOR_BATCH_SIZE):
+            batch = doc_ids[i:i + DOCTOR_BATCH_SIZE]
+            busy_by_doc = self.load_busy(batch, range_start, range_end)
+            for doc_id in batch:
+                free = self.iter_free(doctors[doc_id]["config"], busy_by_doc[doc_id], start_date, days)
+                streams.append(zip(free, repeat(doc_id)))
+
+        # Each stream is already time-ordered, so a k-way merge yields the global earliest first
+        results = []
+        for slot, doc_id in islice(merge(*streams), limit):
+            info = doctors[doc_id]
+            results.append({
+                "doctor_id": doc_id,
+                "doctor_name": info["doctor_name"],
+                "hospital_name": info["hospital_name"],
+                "treatment": info["treatment"],
+                "cost": info["cost"],
+                "date": slot.strftime("%Y-%m-%d"),
+                "time": slot.strftime("%H:%M"),
+            })
+        return results
@@ -19,11 +19,13 @@ class InventoryService:
         
         # Update Quantity
         item.quantity += qty
-        self.db.commit()
         
-        # Check Low Stock Threshold & Notify
+        # Check Low Stock Threshold & Notify (recorded when this change commits)
         if item.quantity <= item.min_threshold:
             self._trigger_low_stock_alert(item)
+        else:
+            self._resolve_low_stock_alert(item)
+        self.db.commit()
             
         return item
 
@@ -35,35 +37,41 @@ class InventoryService:
         if not item: return None
         
         item.quantity = max(0, item.quantity - quantity_used)
-        self.db.commit()
         
         if item.quantity <= item.min_threshold:
             self._trigger_low_stock_alert(item)
+        self.db.commit()
             
         return item
 
     def _trigger_low_stock_alert(self, item: InventoryItem):
-        """Helper to send alert if config matches"""
+        """Add the item to the doctor's next inventory digest (deduped per item + level)"""
         try:
-            from notifications.service import NotificationService
+            from notifications.alert_digest import alert_aggregator, AlertEvent, stock_level
             from models import Doctor, User
             
             # Find the doctor associated with this inventory item's hospital/context
             # Assuming doctor_id passed to service init is the relevant one to notify
             doctor = self.db.query(Doctor).filter(Doctor.id == self.doc_id).first()
             if doctor and doctor.user:
-                notifier = NotificationService()
-                notifier.send_low_stock_notification(
-                    doctor_email=doctor.user.email,
-                    doctor_name=doctor.user.full_name,
+                alert_aggregator.add(self.doc_id, doctor.user.email, doctor.user.full_name, AlertEvent(
+                    kind="low_stock",
+                    item_id=item.id,
                     item_name=item.name,
+                    level=stock_level(item.quantity),
                     current_quantity=item.quantity,
-                    min_threshold=item.min_threshold
-                )
-                print(f"📧 Low stock alert sent for {item.name}")
+                    threshold=item.min_threshold
+                ), db=self.db)
         except Exception as e:
             print(f"Failed to send low stock alert: {e}")
 
+    def _resolve_low_stock_alert(self, item: InventoryItem):
+        try:
+            from notifications.alert_digest import alert_aggregator
+            alert_aggregator.resolve(self.doc_id, item.id, db=self.db)
+        except Exception as e:
+            print(f"Failed to clear low stock alert: {e}")
+
     def create_item(self, name: str, quantity: int, unit: str = "Pcs", threshold: int = 10):
         exists = self.db.query(InventoryItem).filter(InventoryItem.name.ilike(name)).first()
         if exists: return None
@@ -86,11 +94,13 @@ class InventoryService:
         if not item: return None
         item.quantity = new_qty
         item.last_updated = datetime.utcnow()
-        self.db.commit()
         
-        # Check Low Stock Threshold & Notify
+        # Check Low Stock Threshold & Notify (recorded when this change commits)
         if item.quantity <= item.min_threshold:
             self._trigger_low_stock_alert(item)
+        else:
+            self._resolve_low_stock_alert(item)
+        self.db.commit()
             
         return item
 
@@ -258,22 +268,24 @@ class InventoryService:
                 if previous_need <= item.quantity:
                      self._trigger_forecast_alert(item, total_needed, "Next 7 Days")
 
+        # The booking is already committed; this ends the read transaction and records any alerts
+        self.db.commit()
+
     def _trigger_forecast_alert(self, item: InventoryItem, needed: int, horizon: str):
         try:
-             from notifications.service import NotificationService
+             from notifications.alert_digest import alert_aggregator, AlertEvent
              from models import Doctor
              
              doctor = self.db.query(Doctor).filter(Doctor.id == self.doc_id).first()
              if doctor and doctor.user:
-                 notifier = NotificationService()
-                 notifier.send_shortage_forecast_alert(
-                     doctor_email=doctor.user.email,
-                     doctor_name=doctor.user.full_name,
+                 alert_aggregator.add(self.doc_id, doctor.user.email, doctor.user.full_name, AlertEvent(
+                     kind="forecast",
+                     item_id=item.id,
                      item_name=item.name,
+                     level="short",
                      current_quantity=item.quantity,
-                     needed_quantity=needed,
-                     date_range=horizon
-                 )
-                 print(f"📧 Forecast Alert sent for {item.name}")
+                     threshold=needed,
+                     horizon=horizon
+                 ), db=self.db)
         except Exception as e:
              print(f"Failed to send forecast alert: {e}")
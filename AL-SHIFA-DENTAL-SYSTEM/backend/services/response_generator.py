@@ -48,3 +48,28 @@ class ResponseGenerator:
         return {
             "text": "📋 **Standard Procedures & Pricing:**\n\n" + "\n".join(lines)
         }
+
+    @staticmethod
+    def low_stock(alerts):
+        if not alerts:
+            return {"text": "✅ All stock levels are healthy. No upcoming shortages predicted."}
+
+        icons = {"CRITICAL": "🔴", "WARNING": "🟠", "LOW": "🟡"}
+        lines = []
+        for a in alerts:
+            lines.append(f"- {icons.get(a['status'], '•')} **{a['name']}** ({a['qty']} left): {a['message']}")
+
+        return {
+            "text": f"📦 **Stock Alerts** ({len(alerts)} items)\n\n" + "\n".join(lines)
+        }
+
+    @staticmethod
+    def as_text(payload):
+        """Flatten a card payload into plain markdown for chat replies."""
+        text = payload["text"]
+        card = payload.get("schedule_card")
+        if card:
+            text += "\n\n" + "\n".join(
+                f"- {i['time']}: **{i['patient']}** ({i['treatment']}, {i['status']})" for i in card["items"]
+            )
+        return text
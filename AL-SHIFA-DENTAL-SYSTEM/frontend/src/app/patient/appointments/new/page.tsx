@@ -47,7 +47,7 @@ export default function NewBookingPage() {
                const blocked = res.data || [];
                api.get(`/doctors/${selDoc.id}/settings`)
                  .then(s => {
-                     generateTimeSlots(s.data.work_start_time, s.data.work_end_time, s.data.slot_duration, blocked);
+                     generateTimeSlots(s.data.work_start_time, s.data.work_end_time, s.data.slot_duration, blocked, s.data.break_duration || 0);
                      setIsLoadingSlots(false);
                  })
                  .catch(() => {
@@ -63,7 +63,7 @@ export default function NewBookingPage() {
     }
   }, [form.date, selDoc]);
 
-  const generateTimeSlots = (start: string, end: string, duration: number, blocked: string[]) => {
+  const generateTimeSlots = (start: string, end: string, duration: number, blocked: string[], breakDuration: number = 0) => {
       const toMinutes = (time: string) => {
           const [h, m] = time.split(":").map(Number);
           return h * 60 + m;
@@ -84,7 +84,7 @@ export default function NewBookingPage() {
       const normalize = (t: string) => t.replace(/[^a-zA-Z0-9]/g, "").replace(/^0+/, "").toUpperCase();
       const normalizedBlocked = blocked.map(normalize);
 
-      for (let time = startMin; time < endMin; time += duration) {
+      for (let time = startMin; time + duration <= endMin; time += duration + breakDuration) {
           const slotLabel = toTimeStr(time);
           const compareKey = normalize(slotLabel);
           
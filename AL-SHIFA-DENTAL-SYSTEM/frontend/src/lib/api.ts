@@ -89,6 +89,7 @@ export const OrganizationAPI = {
 export const AgentAPI = {
   chat: (query: string) => api.post("/doctor/agent/chat", { query }),
   uploadKnowledge: (d: FormData) => api.post("/doctor/agent/upload", d, { headers: { "Content-Type": "multipart/form-data" } }),
+  getUploadJob: (jobId: string) => api.get(`/doctor/agent/jobs/${jobId}`),
   patientChat: (query: string) => api.post("/patient/agent/chat", { query }),
   getPatientSummary: (id: number) => api.get(`/doctor/agent/summary/${id}`),
 };